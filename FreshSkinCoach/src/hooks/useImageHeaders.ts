@@ -0,0 +1,32 @@
+// src/hooks/useImageHeaders.ts
+import AsyncStorage from "@react-native-async-storage/async-storage";
+import { useEffect, useState } from "react";
+import { BACKEND_URL } from "../config";
+
+type Headers = Record<string, string>;
+
+/**
+ * En-têtes à joindre aux images du backend (/images, /variants) :
+ * ces routes exigent le même jeton Bearer que l'API.
+ * `undefined` tant que le jeton n'est pas lu, pour ne pas charger l'image sans.
+ */
+export function useImageHeaders(): Headers | undefined {
+  const [headers, setHeaders] = useState<Headers | undefined>(undefined);
+
+  useEffect(() => {
+    let isMounted = true;
+    AsyncStorage.getItem("access_token").then(token => {
+      if (isMounted) setHeaders(token ? { Authorization: `Bearer ${token}` } : {});
+    });
+    return () => {
+      isMounted = false;
+    };
+  }, []);
+
+  return headers;
+}
+
+/** Source d'<Image> pour un chemin du backend, avec les en-têtes d'authentification. */
+export function imageSource(path: string, headers: Headers | undefined) {
+  return headers ? { uri: `${BACKEND_URL}${path}`, headers } : undefined;
+}
@@ -23,7 +23,7 @@ import type { NativeStackNavigationProp } from "@react-navigation/native-stack";
 import type { RootStackParamList } from "../navigation/AppNavigator";
 import { useAuth } from "../context/AuthContext";
 import { translateLabel } from "../i18n/labels"; // ← on importe la fonction
-import { BACKEND_URL } from "../config";
+import { imageSource, useImageHeaders } from "../hooks/useImageHeaders";
 
 if (Platform.OS === "android" && UIManager.setLayoutAnimationEnabledExperimental) {
   UIManager.setLayoutAnimationEnabledExperimental(true);
@@ -41,6 +41,7 @@ export default function DashboardScreen({ route, navigation }: Props) {
   const { session } = route.params;
   const { image_url, annotated_image_url, scores, timestamp, annotations } = session;
   const { signOut } = useAuth();
+  const imageHeaders = useImageHeaders();
 
   const [interpretation, setInterpretation] = useState<string>("");
   const [suggestions, setSuggestions] = useState<string[]>([]);
@@ -81,7 +82,7 @@ export default function DashboardScreen({ route, navigation }: Props) {
       {/* HEADER IMAGE */}
       <View style={styles.header}>
         <Image
-          source={{ uri: `${BACKEND_URL}${annotated_image_url}` }}
+          source={imageSource(annotated_image_url, imageHeaders)}
           style={styles.headerImage}
         />
         <View style={styles.headerOverlay} />
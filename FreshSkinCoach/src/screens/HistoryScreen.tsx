@@ -17,7 +17,7 @@ import type { NativeStackNavigationProp } from "@react-navigation/native-stack";
 import type { RootStackParamList } from "../navigation/AppNavigator";
 import { api } from "../api/client";
 import { translateLabel } from "../i18n/labels"; // ← import de la fonction
-import { BACKEND_URL } from "../config";
+import { imageSource, useImageHeaders } from "../hooks/useImageHeaders";
 
 type Annotation = {
   x: number; y: number; width: number; height: number; label: string;
@@ -37,6 +37,7 @@ type HistoryNavProp = NativeStackNavigationProp<RootStackParamList, "History">;
 export default function HistoryScreen() {
   const [sessions, setSessions] = useState<Session[]>([]);
   const navigation = useNavigation<HistoryNavProp>();
+  const imageHeaders = useImageHeaders();
 
   useEffect(() => {
     (async () => {
@@ -82,7 +83,7 @@ export default function HistoryScreen() {
           }
         >
           <Image
-            source={{ uri: `${BACKEND_URL}${item.image_url}` }}
+            source={imageSource(item.image_url, imageHeaders)}
             style={styles.thumbnail}
           />
           <View>
@@ -15,7 +15,7 @@ import type { RootStackParamList } from "../navigation/AppNavigator";
 import { translateLabel } from "../i18n/labels"; // ← Import du translateLabel
 import { useNavigation } from "@react-navigation/native";
 import type { NativeStackNavigationProp } from "@react-navigation/native-stack";
-import { BACKEND_URL } from "../config";
+import { imageSource, useImageHeaders } from "../hooks/useImageHeaders";
 
 type DetailRouteProp = RouteProp<RootStackParamList, "ImageDetail">;
 type NavigationProp = NativeStackNavigationProp<RootStackParamList, "ImageDetail">;
@@ -24,20 +24,24 @@ type Props = { route: DetailRouteProp };
 export default function ImageDetailScreen({ route }: Props) {
   const navigation = useNavigation<NavigationProp>();
   const { image_url, annotations = [] } = route.params;
-  const uri = `${BACKEND_URL}${image_url}`;
+  const imageHeaders = useImageHeaders();
+  const source = imageSource(image_url, imageHeaders);
 
   const [origW, setOrigW] = useState(1);
   const [origH, setOrigH] = useState(1);
   useEffect(() => {
-    Image.getSize(
-      uri,
+    const sized = imageSource(image_url, imageHeaders);
+    if (!sized) return;
+    Image.getSizeWithHeaders(
+      sized.uri,
+      sized.headers,
       (w, h) => {
         setOrigW(w);
         setOrigH(h);
       },
       () => console.warn("Impossible de récupérer la taille native")
     );
-  }, [uri]);
+  }, [image_url, imageHeaders]);
 
   const screenW = Dimensions.get("window").width - 20;
   const screenH = (origH / origW) * screenW;
@@ -46,7 +50,7 @@ export default function ImageDetailScreen({ route }: Props) {
     <ScrollView contentContainerStyle={styles.container}>
       <View style={[styles.wrapper, { width: screenW, height: screenH }]}>
         <Image
-          source={{ uri }}
+          source={source}
           style={{ width: screenW, height: screenH, borderRadius: 15 }}
           resizeMode="contain"
         />
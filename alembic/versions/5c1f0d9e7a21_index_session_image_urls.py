@@ -0,0 +1,31 @@
+"""Index session image urls
+
+Revision ID: 5c1f0d9e7a21
+Revises: ae29d7857e2b
+Create Date: 2026-10-19 11:02:17.403981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1f0d9e7a21'
+down_revision: Union[str, None] = 'ae29d7857e2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # utilisés par le GC pour vérifier qu'un fichier est encore référencé
+    op.create_index(op.f('ix_sessions_image_url'), 'sessions', ['image_url'], unique=False)
+    op.create_index(op.f('ix_sessions_annotated_image_url'), 'sessions', ['annotated_image_url'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sessions_annotated_image_url'), table_name='sessions')
+    op.drop_index(op.f('ix_sessions_image_url'), table_name='sessions')
@@ -0,0 +1,47 @@
+"""Add stored_images refcounts
+
+Revision ID: ae29d7857e2b
+Revises: a46a8ea70784
+Create Date: 2026-10-19 09:12:41.220514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ae29d7857e2b'
+down_revision: Union[str, None] = 'a46a8ea70784'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'stored_images',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    # Backfill : une référence par URL existante (clé = URL sans son préfixe "/images/")
+    op.execute(
+        """
+        INSERT INTO stored_images (key, ref_count, created_at)
+        SELECT regexp_replace(url, '^/[^/]+/', ''), count(*), now()
+        FROM (
+            SELECT image_url AS url FROM sessions
+            UNION ALL
+            SELECT annotated_image_url FROM sessions WHERE annotated_image_url IS NOT NULL
+        ) AS refs
+        GROUP BY 1
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stored_images')
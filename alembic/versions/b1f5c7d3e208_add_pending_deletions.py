@@ -0,0 +1,38 @@
+"""Add pending deletions
+
+Revision ID: b1f5c7d3e208
+Revises: d7e2a4c9f815
+Create Date: 2026-10-19 21:42:17.503126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b1f5c7d3e208'
+down_revision: Union[str, None] = 'd7e2a4c9f815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'pending_deletions',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('requested_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index(op.f('ix_pending_deletions_requested_at'), 'pending_deletions', ['requested_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_pending_deletions_requested_at'), table_name='pending_deletions')
+    op.drop_table('pending_deletions')
@@ -0,0 +1,134 @@
+"""Pack session annotations
+
+Revision ID: b7e4c2a91d03
+Revises: 5c1f0d9e7a21
+Create Date: 2026-10-19 14:21:08.775102
+
+"""
+import json
+import struct
+from typing import Dict, List, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4c2a91d03'
+down_revision: Union[str, None] = '5c1f0d9e7a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# Copie figée du codec (app/services/annotation_codec.py, format 1) et de la
+# table des labels à cette révision : la migration ne doit dépendre ni du code
+# applicatif (ni donc des variables d'environnement de Settings), ni de ses
+# évolutions futures.
+_LABELS = [
+    "Acne", "Dark-Circle", "Dry-Skin", "EyeBags",
+    "Normal-Skin", "Oily-Skin", "Pores", "Spots", "Wrinkles",
+]
+_LABEL_IDS = {label: i for i, label in enumerate(_LABELS)}
+_FORMAT_VERSION = 1
+_BOX = struct.Struct("<4fB")
+
+
+def _pack(annotations: List[Dict]) -> bytes | None:
+    out = bytearray([_FORMAT_VERSION])
+    for ann in annotations:
+        label_id = _LABEL_IDS.get(ann["label"])
+        if label_id is None:
+            return None
+        out += _BOX.pack(ann["x"], ann["y"], ann["width"], ann["height"], label_id)
+    return bytes(out)
+
+
+def _unpack(data: bytes) -> List[Dict]:
+    if not data or data[0] != _FORMAT_VERSION:
+        raise ValueError("Format d'annotations compact inconnu")
+    return [
+        {"x": round(x, 6), "y": round(y, 6), "width": round(w, 6), "height": round(h, 6),
+         "label": _LABELS[label_id]}
+        for x, y, w, h, label_id in _BOX.iter_unpack(memoryview(data)[1:])
+    ]
+
+
+_UPDATE_PACKED = sa.text(
+    "UPDATE sessions AS s SET annotations_packed = v.blob, annotations = NULL "
+    "FROM unnest(:ids, :blobs) AS v(id, blob) WHERE s.id = v.id"
+).bindparams(
+    sa.bindparam("ids", type_=postgresql.ARRAY(sa.Integer())),
+    sa.bindparam("blobs", type_=postgresql.ARRAY(sa.LargeBinary())),
+)
+_UPDATE_UNPACKED = sa.text(
+    "UPDATE sessions AS s SET annotations = v.doc::jsonb, annotations_packed = NULL "
+    "FROM unnest(:ids, :docs) AS v(id, doc) WHERE s.id = v.id"
+).bindparams(
+    sa.bindparam("ids", type_=postgresql.ARRAY(sa.Integer())),
+    sa.bindparam("docs", type_=postgresql.ARRAY(sa.Text())),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # IF NOT EXISTS : une migration interrompue pendant le backfill se relance
+    op.execute("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS annotations_packed BYTEA")
+    op.alter_column('sessions', 'annotations', existing_type=postgresql.JSONB(), nullable=True)
+
+    # Backfill hors de la transaction de migration : un commit par lot (keyset
+    # sur id), verrous de ligne courts et progression conservée en cas d'arrêt
+    # (les lignes déjà compactées ont annotations = NULL).
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                sa.text(
+                    "SELECT id, annotations FROM sessions "
+                    "WHERE id > :last_id AND annotations IS NOT NULL "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            ).all()
+            if not rows:
+                break
+            ids, blobs = [], []
+            for session_id, annotations in rows:
+                if isinstance(annotations, str):
+                    annotations = json.loads(annotations)
+                packed = _pack(annotations or [])
+                if packed is not None:  # labels inconnus : la ligne reste en JSONB
+                    ids.append(session_id)
+                    blobs.append(packed)
+            if ids:
+                # une seule instruction par lot : le lot est validé en entier ou pas du tout
+                conn.execute(_UPDATE_PACKED, {"ids": ids, "blobs": blobs})
+            last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                sa.text(
+                    "SELECT id, annotations_packed FROM sessions "
+                    "WHERE id > :last_id AND annotations_packed IS NOT NULL "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            ).all()
+            if not rows:
+                break
+            conn.execute(_UPDATE_UNPACKED, {
+                "ids": [session_id for session_id, _ in rows],
+                "docs": [json.dumps(_unpack(bytes(packed))) for _, packed in rows],
+            })
+            last_id = rows[-1][0]
+    op.execute("UPDATE sessions SET annotations = '[]'::jsonb WHERE annotations IS NULL")
+    op.alter_column('sessions', 'annotations', existing_type=postgresql.JSONB(), nullable=False)
+    op.drop_column('sessions', 'annotations_packed')
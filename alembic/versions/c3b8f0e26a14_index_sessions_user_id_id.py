@@ -0,0 +1,29 @@
+"""Index sessions by user and id
+
+Revision ID: c3b8f0e26a14
+Revises: a9d3e17c5b42
+Create Date: 2026-10-19 19:41:08.532190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3b8f0e26a14'
+down_revision: Union[str, None] = 'a9d3e17c5b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # pagination keyset des sessions d'un utilisateur (export)
+    op.create_index('ix_sessions_user_id_id', 'sessions', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sessions_user_id_id', table_name='sessions')
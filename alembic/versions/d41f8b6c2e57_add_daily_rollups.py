@@ -0,0 +1,55 @@
+"""Add daily rollups
+
+Revision ID: d41f8b6c2e57
+Revises: b7e4c2a91d03
+Create Date: 2026-10-19 15:48:33.109264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f8b6c2e57'
+down_revision: Union[str, None] = 'b7e4c2a91d03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables vides : les remplir avec `python -m app.services.rollups`
+    op.create_table(
+        'daily_rollups',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('analyses', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('active_users', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('active_premium_users', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('premium_upgrades', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('premium_downgrades', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('day'),
+    )
+    op.create_table(
+        'daily_active_users',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('is_premium', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.PrimaryKeyConstraint('day', 'user_id'),
+    )
+    op.create_table(
+        'daily_label_rollups',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('label', sa.String(), nullable=False),
+        sa.Column('detections', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('score_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('day', 'label'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_label_rollups')
+    op.drop_table('daily_active_users')
+    op.drop_table('daily_rollups')
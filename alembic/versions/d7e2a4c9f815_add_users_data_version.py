@@ -0,0 +1,29 @@
+"""Add users data version
+
+Revision ID: d7e2a4c9f815
+Revises: c3b8f0e26a14
+Create Date: 2026-10-19 20:27:53.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e2a4c9f815'
+down_revision: Union[str, None] = 'c3b8f0e26a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # valeur par défaut côté serveur : pas de réécriture de la table (Postgres >= 11)
+    op.add_column('users', sa.Column('data_version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'data_version')
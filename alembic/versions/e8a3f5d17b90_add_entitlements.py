@@ -0,0 +1,39 @@
+"""Add entitlements
+
+Revision ID: e8a3f5d17b90
+Revises: d41f8b6c2e57
+Create Date: 2026-10-19 17:05:42.518730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a3f5d17b90'
+down_revision: Union[str, None] = 'd41f8b6c2e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'entitlements',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(), nullable=False),
+        sa.Column('receipt_hash', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('verified_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index(op.f('ix_entitlements_expires_at'), 'entitlements', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_entitlements_expires_at'), table_name='entitlements')
+    op.drop_table('entitlements')
@@ -0,0 +1,29 @@
+"""Add session image dhash
+
+Revision ID: f2c6a8e4d913
+Revises: e8a3f5d17b90
+Create Date: 2026-10-19 18:32:10.664081
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a8e4d913'
+down_revision: Union[str, None] = 'e8a3f5d17b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # NULL pour les sessions existantes : elles ne servent pas à la déduplication
+    op.add_column('sessions', sa.Column('image_dhash', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sessions', 'image_dhash')
@@ -0,0 +1,78 @@
+# app/bench/history_json.py
+"""
+Micro-benchmark de sérialisation d'une page d'historique (100 sessions,
+annotations denses) : chemin FastAPI par défaut (validation response_model +
+jsonable_encoder + json) contre FastJSONResponse (orjson), avec la taille
+compressée gzip/brotli.
+
+    python -m app.bench.history_json --rows 100 --boxes 60
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.core.responses import FastJSONResponse, compress, dumps, brotli
+from app.services.skin_analyzer import ALL_CLASSES
+
+
+def make_page(rows: int, boxes: int) -> List[Dict]:
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1, 8, 30)
+    page = []
+    for i in range(rows):
+        page.append({
+            "session_id": i + 1,
+            "image_url": f"/images/ab/cd/{i:064x}.jpg",
+            "annotations": [
+                {"x": rng.uniform(0, 1024), "y": rng.uniform(0, 1024),
+                 "width": rng.uniform(5, 80), "height": rng.uniform(5, 80),
+                 "label": rng.choice(ALL_CLASSES)}
+                for _ in range(boxes)
+            ],
+            "annotated_image_url": f"/images/ef/01/{i:064x}.jpg",
+            "variants": {"image": None, "annotated": None},
+            "scores": {c: rng.uniform(0, 100) for c in ALL_CLASSES},
+            "timestamp": start + timedelta(days=i),
+        })
+    return page
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--boxes", type=int, default=60, help="annotations par session")
+    parser.add_argument("--number", type=int, default=50)
+    args = parser.parse_args()
+
+    page = make_page(args.rows, args.boxes)
+    adapter = TypeAdapter(List[Dict])
+
+    def default_path() -> bytes:
+        return JSONResponse(jsonable_encoder(adapter.validate_python(page))).body
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(page).body
+
+    assert json.loads(default_path()) == json.loads(fast_path())
+    body = fast_path()
+    for name, fn in (("défaut (validation + json)", default_path), ("orjson direct", fast_path)):
+        seconds = min(timeit.repeat(fn, number=args.number, repeat=3)) / args.number
+        print(f"{name:28s} {seconds * 1000:8.2f} ms / page")
+
+    print(f"\ntaille JSON brute : {len(body) / 1024:.0f} Kio")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        seconds = min(timeit.repeat(lambda: compress(body, encoding), number=10, repeat=3)) / 10
+        print(f"{encoding:5s} : {len(compress(body, encoding)) / 1024:6.0f} Kio en {seconds * 1000:.2f} ms")
+    assert dumps(page) == body
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# app/bench/session_writes.py
+"""
+Benchmark des écritures de sessions sous concurrence : un commit par analyse
+(create_session) contre commit groupé (SESSION_GROUP_COMMIT), en sessions et
+commits par seconde.
+
+À lancer sur une base de développement migrée (DATABASE_URL). L'utilisateur
+de test et ses sessions sont supprimés à la fin, et retirés des agrégats du jour.
+
+    python -m app.bench.session_writes --writers 32 --writes 20
+"""
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.crud.user import delete_user_by_id
+from app.db.models import User as DBUser
+from app.db.session import AsyncSessionLocal, engine
+from app.services.session_writer import write_session
+from app.services.skin_analyzer import ALL_CLASSES
+
+_commits = 0
+
+
+def _count_commit(conn) -> None:
+    global _commits
+    _commits += 1
+
+
+async def _writer(user_id: int, writes: int) -> None:
+    scores = {c: 0.5 for c in ALL_CLASSES}
+    annotations = [{"x": 0.5, "y": 0.5, "width": 0.1, "height": 0.1, "label": "Acne"}]
+    for _ in range(writes):
+        async with AsyncSessionLocal() as db:
+            # URLs hors IMAGE_URL_PREFIX : aucune référence d'image comptée
+            await write_session(
+                db, user_id, "bench://image.jpg", "bench://annotated.jpg", scores, annotations
+            )
+
+
+async def run(writers: int, writes: int) -> None:
+    global _commits
+    event.listen(engine.sync_engine, "commit", _count_commit)
+    async with AsyncSessionLocal() as db:
+        user = DBUser(email=f"bench-{uuid4().hex}@example.invalid", hashed_password="!", is_admin=False)
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+    try:
+        for grouped in (False, True):
+            settings.SESSION_GROUP_COMMIT = grouped
+            _commits = 0
+            start = time.perf_counter()
+            await asyncio.gather(*(_writer(user_id, writes) for _ in range(writers)))
+            elapsed = time.perf_counter() - start
+            total = writers * writes
+            name = "commit groupé" if grouped else "commit par session"
+            print(
+                f"{name:20s} {total / elapsed:8.0f} sessions/s  {_commits / elapsed:8.0f} commits/s"
+                f"  ({_commits} commits, {elapsed:.2f} s)"
+            )
+    finally:
+        async with AsyncSessionLocal() as db:
+            await delete_user_by_id(db, user_id)
+        event.remove(engine.sync_engine, "commit", _count_commit)
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=32, help="requêtes concurrentes")
+    parser.add_argument("--writes", type=int, default=20, help="sessions écrites par requête")
+    parser.add_argument("--window-ms", type=float, default=settings.SESSION_GROUP_COMMIT_WINDOW_MS)
+    args = parser.parse_args()
+    settings.SESSION_GROUP_COMMIT_WINDOW_MS = args.window_ms
+    asyncio.run(run(args.writers, args.writes))
+
+
+if __name__ == "__main__":
+    main()
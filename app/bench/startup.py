@@ -0,0 +1,64 @@
+# app/bench/startup.py
+"""
+Benchmark de démarrage d'un worker : temps d'import de app.main et RSS de
+base, mesurés dans des process Python neufs (pas de cache d'import partagé).
+
+    python -m app.bench.startup --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Modules lourds qui ne doivent plus être chargés à l'import de l'application
+HEAVY_MODULES = ["cv2", "numpy", "PIL", "pillow_heif", "openai", "passlib", "jose", "boto3"]
+
+_PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+from app.core.metrics import current_rss_bytes
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "rss_bytes": current_rss_bytes(),
+    "heavy_loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="sortie JSON brute")
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    imports = [r["import_seconds"] for r in results]
+    rss = [r["rss_bytes"] / 2**20 for r in results]
+    summary = {
+        "runs": args.runs,
+        "import_seconds_median": statistics.median(imports),
+        "import_seconds_min": min(imports),
+        "rss_mib_median": statistics.median(rss),
+        "heavy_loaded": results[-1]["heavy_loaded"],
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"import app.main : médiane {summary['import_seconds_median'] * 1000:.0f} ms "
+          f"(min {summary['import_seconds_min'] * 1000:.0f} ms) sur {args.runs} runs")
+    print(f"RSS après import : médiane {summary['rss_mib_median']:.1f} Mio")
+    print(f"modules lourds chargés : {', '.join(summary['heavy_loaded']) or 'aucun'}")
+
+
+if __name__ == "__main__":
+    main()
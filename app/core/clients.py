@@ -0,0 +1,45 @@
+# app/core/clients.py
+"""
+Clients réseau partagés par tout le worker, créés dans le lifespan de
+l'application (et non à l'import des modules) : l'import reste léger et les
+connexions HTTP sont réutilisées d'une requête à l'autre.
+"""
+from app.core.config import settings
+
+_openai_client = None
+_inference_client = None
+
+
+def get_openai_client():
+    """Client OpenAI (synchrone), créé au premier appel puis partagé."""
+    global _openai_client
+    if _openai_client is None:
+        import openai
+        _openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    return _openai_client
+
+
+def get_inference_client():
+    """httpx.AsyncClient pour l'API d'inférence Roboflow (créé dans le lifespan)."""
+    global _inference_client
+    if _inference_client is None:
+        import httpx
+        # le délai par tentative est géré par la couche de résilience
+        _inference_client = httpx.AsyncClient(timeout=settings.INFERENCE_ATTEMPT_TIMEOUT)
+    return _inference_client
+
+
+async def start_clients() -> None:
+    # Le client OpenAI reste créé au premier appel : importer openai coûte
+    # ~0,5 s et de la mémoire à des workers qui ne servent peut-être jamais /interpret.
+    get_inference_client()
+
+
+async def close_clients() -> None:
+    global _openai_client, _inference_client
+    if _inference_client is not None:
+        await _inference_client.aclose()
+        _inference_client = None
+    if _openai_client is not None:
+        _openai_client.close()
+        _openai_client = None
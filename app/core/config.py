@@ -9,12 +9,99 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     DATABASE_URL: str
+    DB_ECHO: bool = False
+    # "strict" : refuse de démarrer si la base n'est pas à la révision Alembic head
+    # "warn"   : log seulement ; "create" : create_all, et une base vierge est
+    # marquée à la head (dev : les migrations ne créent pas les tables de base)
+    SCHEMA_CHECK: str = "warn"
     ROBOFLOW_INFERENCE_API_URL: str
     ROBOFLOW_INFERENCE_API_KEY: str
     ROBOFLOW_INFERENCE_MODEL_ID: str
     IMAGE_SAVE_DIR: str = "./static/images"
     IMAGE_URL_PREFIX: str = "/images"
+    STORAGE_BACKEND: str = "local"          # "local" ou "s3"
+    S3_BUCKET: str = "skincoach-images"
+    S3_ENDPOINT_URL: str | None = None      # ex. http://localhost:9000 pour MinIO
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+    S3_PRESIGN_EXPIRES: int = 900
+    IMAGE_VARIANT_DIR: str = "./static/variants"
+    IMAGE_VARIANT_URL_PREFIX: str = "/variants"
+    IMAGE_VARIANT_WORKERS: int = 2
+    IMAGE_OFFLOAD: str = "off"              # "off", "x-accel" (nginx) ou "x-sendfile" (Apache, lighttpd)
+    IMAGE_ACCEL_PREFIX: str = "/_protected" # location nginx `internal` devant /images et /variants
+    IMAGE_GC_INTERVAL_SECONDS: int = 3600   # 0 = pas de balayage périodique
+    IMAGE_GC_BATCH_SIZE: int = 500
+    IMAGE_GC_MAX_BATCHES: int = 20
+    IMAGE_GC_MIN_AGE_SECONDS: int = 3600    # ne jamais toucher un fichier plus récent
+    INFERENCE_ATTEMPT_TIMEOUT: float = 10.0  # délai max par tentative (s)
+    INFERENCE_MAX_ATTEMPTS: int = 3
+    INFERENCE_TOTAL_TIMEOUT: float = 25.0    # délai max de l'appel complet, retries compris (s)
+    INFERENCE_RETRY_BUDGET_RATIO: float = 0.2 # retries ≤ 20 % des appels (fenêtre 10 s)
+    INFERENCE_HEDGE_ENABLED: bool = False      # 2e requête si la 1re dépasse le p95
+    INFERENCE_HEDGE_MIN_DELAY: float = 0.5
+    INFERENCE_BREAKER_FAILURES: int = 5        # échecs consécutifs avant ouverture
+    INFERENCE_BREAKER_RESET_SECONDS: float = 30.0
+    ANALYSIS_CONCURRENCY_LIMIT: int = 4        # analyses simultanées par worker
+    ANALYSIS_QUEUE_DEPTH: int = 16
+    ANALYSIS_QUEUE_TIMEOUT: float = 20.0
+    ANALYSIS_RETRY_AFTER: int = 5
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024 # en dessous, réponse JSON non compressée
+    RESPONSE_GZIP_LEVEL: int = 5
+    RESPONSE_BROTLI_QUALITY: int = 4           # si le paquet brotli est installé
+    RESPONSE_COMPRESSION_THREADPOOL_BYTES: int = 64 * 1024  # au-delà, compression hors boucle
+    ANNOTATIONS_STORAGE: str = "packed"        # "packed" (bytea compact) ou "jsonb"
+    ANALYTICS_CACHE_SIZE: int = 1024           # matrices de scores gardées (par worker)
+    ANALYTICS_CACHE_TTL: float = 60.0          # retard max des lectures sans data_version (s)
+    ADMIN_BATCH_SIZE: int = 500                # utilisateurs par UPDATE des opérations en masse
+    ACCOUNT_DELETE_BATCH_SIZE: int = 200       # sessions supprimées par transaction
+    ACCOUNT_DELETE_LEASE_SECONDS: int = 900    # au-delà, une suppression interrompue est reprise
+    ACCOUNT_DELETE_POLL_SECONDS: float = 60.0  # relecture des demandes d'autres workers
+    ENTITLEMENT_CACHE_SECONDS: int = 6 * 3600  # un même reçu n'est pas revérifié avant ce délai
+    ENTITLEMENT_SWEEP_INTERVAL_SECONDS: int = 900  # 0 = pas de balayage des droits expirés
+    ENTITLEMENT_SWEEP_BATCH_SIZE: int = 500
+    ENTITLEMENT_GRACE_SECONDS: int = 0         # tolérance après expiration (renouvellement en cours)
+    QUALITY_GATE_ENABLED: bool = True          # contrôle qualité local avant l'inférence
+    QUALITY_MAX_SIDE: int = 512                # taille de la copie réduite analysée
+    QUALITY_MIN_SHARPNESS: float = 60.0        # variance du Laplacien (à QUALITY_MAX_SIDE px)
+    QUALITY_MIN_BRIGHTNESS: float = 45.0       # luminance moyenne 0-255
+    QUALITY_MAX_BRIGHTNESS: float = 215.0
+    QUALITY_MAX_CLIPPED: float = 0.25          # part max de pixels noirs/blancs saturés
+    QUALITY_REQUIRE_FACE: bool = True
+    DEDUP_MODE: str = "shadow"                 # "off", "shadow" (mesure) ou "reuse"
+    DEDUP_MAX_DISTANCE: int = 6                # distance de Hamming max entre dHash 64 bits
+    DEDUP_WINDOW_SECONDS: int = 600            # âge max de l'analyse réutilisée
+    DEDUP_INDEX_TTL: float = 60.0
+    DEDUP_INDEX_SIZE: int = 1024               # index par utilisateur gardés (par worker)
+    INFERENCE_FACE_CROP: bool = False          # n'envoyer que la zone du visage à l'inférence
+    INFERENCE_FACE_MARGIN: float = 0.25        # marge autour du visage (part de sa taille)
+    INFERENCE_TILING: bool = False             # inférence par tuiles sur les grandes photos
+    INFERENCE_TILE_SIZE: int = 1024            # côté d'une tuile (px de l'image d'origine)
+    INFERENCE_TILE_OVERLAP: float = 0.2        # recouvrement minimal entre tuiles voisines
+    INFERENCE_TILE_CONCURRENCY: int = 4        # tuiles envoyées en parallèle (par worker)
+    INFERENCE_NMS_IOU: float = 0.5             # fusion des boîtes de même classe (IoU)
+    INFERENCE_NMS_CONTAINMENT: float = 0.8     # ... ou boîte coupée par un bord de tuile
+    SESSION_GROUP_COMMIT: bool = False         # regroupe les insertions de sessions concurrentes
+    SESSION_GROUP_COMMIT_WINDOW_MS: float = 5.0  # attente max avant l'envoi d'un lot
+    SESSION_GROUP_COMMIT_MAX_BATCH: int = 64
+    EXPORT_BATCH_SIZE: int = 200               # sessions lues par requête SQL pendant l'export
+    EXPORT_CHUNK_SIZE: int = 256 * 1024        # taille des lectures d'images / des morceaux envoyés
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 3600   # durée de rejeu d'une réponse mémorisée
+    IDEMPOTENCY_WAIT_SECONDS: float = 60.0     # attente max d'un doublon en cours (sinon 409)
+    IDEMPOTENCY_POLL_SECONDS: float = 0.25
+    IDEMPOTENCY_PENDING_TIMEOUT: int = 300     # au-delà, une clé "pending" est reprise
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: int = 3600
     OPENAI_API_KEY: str
+    WEB_CONCURRENCY: int = 1                # 0 = un worker par cœur
+    SERVER_LOOP: str = "uvloop"             # "asyncio" sur Windows
+    SERVER_HTTP: str = "httptools"          # "h11" si httptools indisponible
+    SERVER_MAX_REQUESTS: int = 0            # recyclage d'un worker après N requêtes (0 = jamais)
+    SERVER_EXTERNAL_SUPERVISOR: bool = False  # process relancé de l'extérieur (systemd, Railway…)
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    PROFILE_BUFFER_SIZE: int = 50           # profils conservés (par worker)
+    PROFILE_MAX_CONCURRENT: int = 4
+    METRICS_TOKEN: str | None = None        # Bearer du scraper sur /metrics (sinon JWT admin)
 
     class Config:
         env_file = ".env"
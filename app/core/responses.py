@@ -0,0 +1,100 @@
+# app/core/responses.py
+"""
+Réponse JSON rapide : sérialisation orjson (datetime, numpy… natifs) et
+compression gzip/brotli négociée via Accept-Encoding au-delà d'un seuil.
+Les gros corps (RESPONSE_COMPRESSION_THREADPOOL_BYTES) sont compressés dans
+le threadpool pour ne pas bloquer la boucle d'événements.
+
+Utilisée comme `default_response_class` de l'application. Pour les sorties
+ORM de confiance (historiques, analyses), les routes renvoient directement
+`FastJSONResponse(payload)` : FastAPI saute alors la re-validation Pydantic
+du `response_model`, qui ne sert plus qu'à la documentation OpenAPI.
+"""
+import gzip
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+try:  # brotli (requirements.txt) ; absent, on se rabat sur gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type non sérialisable : {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    if brotli is not None and _accepts(accept_encoding, "br"):
+        return "br"
+    if _accepts(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL)
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag.strip().removeprefix("W/")
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match contient-il l'ETag ? (comparaison faible, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _opaque_tag(etag) in (_opaque_tag(tag) for tag in if_none_match.split(","))
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content  # JSON déjà sérialisé (réponse rejouée, cache…)
+        return dumps(content)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # la compression dépend de la requête : négociée au moment de l'envoi
+        if len(self.body) >= settings.RESPONSE_COMPRESSION_MIN_BYTES and "content-encoding" not in self.headers:
+            self.headers.append("Vary", "Accept-Encoding")
+            encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if encoding is not None:
+                if len(self.body) >= settings.RESPONSE_COMPRESSION_THREADPOOL_BYTES:
+                    self.body = await run_in_threadpool(compress, self.body, encoding)
+                else:
+                    self.body = compress(self.body, encoding)
+                self.headers["Content-Encoding"] = encoding
+                self.headers["Content-Length"] = str(len(self.body))
+        await super().__call__(scope, receive, send)
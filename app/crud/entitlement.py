@@ -0,0 +1,71 @@
+# app/crud/entitlement.py
+
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Entitlement, User
+
+
+async def get_entitlement(db: AsyncSession, user_id: int) -> Entitlement | None:
+    result = await db.execute(
+        select(Entitlement).where(Entitlement.user_id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def upsert_entitlement(
+    db: AsyncSession,
+    user_id: int,
+    platform: str,
+    receipt_hash: str,
+    expires_at: datetime,
+    verified_at: datetime
+) -> None:
+    """Enregistre le résultat d'une vérification de reçu. Ne commit pas."""
+    values = {
+        "platform": platform,
+        "receipt_hash": receipt_hash,
+        "expires_at": expires_at,
+        "verified_at": verified_at,
+    }
+    stmt = insert(Entitlement).values(user_id=user_id, **values)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[Entitlement.user_id],
+        set_=values,
+    ))
+
+
+async def clear_entitlements(db: AsyncSession, user_ids: List[int]) -> None:
+    """
+    Oublie les droits in-app (statut premium fixé hors reçu, par un admin) :
+    le balayage ne repasse en gratuit que des premium issus d'un reçu. Ne commit pas.
+    """
+    await db.execute(delete(Entitlement).where(Entitlement.user_id.in_(user_ids)))
+
+
+async def list_expired_premium_user_ids(
+    db: AsyncSession,
+    cutoff: datetime,
+    after_id: int = 0,
+    limit: int = 500
+) -> List[int]:
+    """
+    Utilisateurs encore premium dont le droit a expiré avant `cutoff`
+    (pagination keyset sur user_id).
+    """
+    result = await db.execute(
+        select(Entitlement.user_id)
+        .join(User, User.id == Entitlement.user_id)
+        .where(
+            Entitlement.user_id > after_id,
+            Entitlement.expires_at < cutoff,
+            User.is_premium.is_(True),
+        )
+        .order_by(Entitlement.user_id)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
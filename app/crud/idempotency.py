@@ -0,0 +1,108 @@
+# app/crud/idempotency.py
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import IdempotencyKey
+
+
+async def try_reserve_key(
+    db: AsyncSession,
+    user_id: int,
+    key: str,
+    route: str,
+    ttl_seconds: int
+) -> datetime | None:
+    """
+    Réserve la clé (statut "pending") et commit. Renvoie son created_at,
+    jeton de propriété de la réservation, ou None si elle existe déjà.
+    """
+    now = datetime.utcnow()
+    result = await db.execute(
+        insert(IdempotencyKey)
+        .values(
+            user_id=user_id, key=key, route=route, status="pending",
+            created_at=now, expires_at=now + timedelta(seconds=ttl_seconds),
+        )
+        .on_conflict_do_nothing()
+        .returning(IdempotencyKey.created_at)
+    )
+    reserved = result.scalar_one_or_none()
+    await db.commit()
+    return reserved
+
+
+async def get_key(db: AsyncSession, user_id: int, key: str) -> IdempotencyKey | None:
+    result = await db.execute(
+        select(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
+async def complete_key(
+    db: AsyncSession,
+    user_id: int,
+    key: str,
+    created_at: datetime,
+    status_code: int,
+    media_type: str | None,
+    body: bytes
+) -> bool:
+    """
+    Mémorise la réponse de la réservation `created_at`. False si la clé a été
+    reprise entre-temps (réservation jugée abandonnée) : rien n'est écrit.
+    """
+    result = await db.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+            IdempotencyKey.created_at == created_at, IdempotencyKey.status == "pending",
+        )
+        .values(status="complete", status_code=status_code, media_type=media_type, response_body=body)
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def release_key(
+    db: AsyncSession,
+    user_id: int,
+    key: str,
+    created_at: datetime,
+    status: str = "pending"
+) -> bool:
+    """
+    Libère une clé (échec de la première requête, ou reprise d'une clé expirée
+    ou abandonnée), seulement si elle est encore telle qu'observée
+    (created_at, status) : deux reprises concurrentes ne suppriment pas la
+    nouvelle réservation l'une de l'autre. False si rien n'a été supprimé.
+    """
+    result = await db.execute(
+        delete(IdempotencyKey)
+        .where(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+            IdempotencyKey.created_at == created_at, IdempotencyKey.status == status,
+        )
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+
+async def purge_expired_keys(db: AsyncSession, limit: int = 1000) -> int:
+    """Supprime au plus `limit` clés expirées (transaction courte) ; renvoie le nombre supprimé."""
+    expired = (
+        select(IdempotencyKey.user_id, IdempotencyKey.key)
+        .where(IdempotencyKey.expires_at < datetime.utcnow())
+        .limit(limit)
+    )
+    result = await db.execute(
+        delete(IdempotencyKey)
+        .where(tuple_(IdempotencyKey.user_id, IdempotencyKey.key).in_(expired))
+    )
+    await db.commit()
+    return result.rowcount
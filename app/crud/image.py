@@ -0,0 +1,53 @@
+# app/crud/image.py
+
+from collections import Counter
+from typing import Iterable, List
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import StoredImage
+from app.services.storage import url_to_key
+
+
+def _count_keys(urls: Iterable[str | None]) -> Counter:
+    return Counter(k for k in (url_to_key(u) for u in urls) if k)
+
+
+async def acquire_image_refs(db: AsyncSession, urls: Iterable[str | None]) -> None:
+    """
+    Incrémente le compteur de références des fichiers pointés par ces URLs.
+    Ne commit pas : à appeler dans la transaction qui insère la session.
+    """
+    counts = _count_keys(urls)
+    if not counts:
+        return
+    # clés triées : verrous pris dans le même ordre par toutes les transactions
+    stmt = insert(StoredImage).values([
+        {"key": key, "ref_count": n} for key, n in sorted(counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StoredImage.key],
+        set_={"ref_count": StoredImage.ref_count + stmt.excluded.ref_count},
+    )
+    await db.execute(stmt)
+
+
+async def release_image_refs(db: AsyncSession, urls: Iterable[str | None]) -> List[str]:
+    """
+    Décrémente le compteur de références et renvoie les clés qui ne sont
+    plus référencées (ref_count <= 0). Ne commit pas.
+    """
+    released: List[str] = []
+    for key, n in _count_keys(urls).items():
+        result = await db.execute(
+            update(StoredImage)
+            .where(StoredImage.key == key)
+            .values(ref_count=StoredImage.ref_count - n)
+            .returning(StoredImage.ref_count)
+        )
+        remaining = result.scalar_one_or_none()
+        if remaining is not None and remaining <= 0:
+            released.append(key)
+    return released
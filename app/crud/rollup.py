@@ -0,0 +1,262 @@
+# app/crud/rollup.py
+
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Counter as TypingCounter, Dict, List, Tuple
+
+from sqlalchemy import bindparam, delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import DailyRollup, DailyActiveUser, DailyLabelRollup, Session as DBSession
+from app.services.skin_analyzer import ALL_CLASSES
+
+
+def _bump_day(day: date, **increments: int):
+    stmt = insert(DailyRollup).values(day=day, **{
+        col: increments.get(col, 0) for col in (
+            "analyses", "active_users", "active_premium_users",
+            "premium_upgrades", "premium_downgrades",
+        )
+    })
+    return stmt.on_conflict_do_update(
+        index_elements=[DailyRollup.day],
+        set_={col: getattr(DailyRollup, col) + n for col, n in increments.items()},
+    )
+
+
+async def record_analysis(
+    db: AsyncSession,
+    user_id: int,
+    is_premium: bool,
+    scores: Dict[str, float],
+    when: datetime
+) -> None:
+    """
+    Met à jour les agrégats du jour pour une nouvelle analyse.
+    Ne commit pas : à appeler dans la transaction qui insère la session.
+    """
+    day = when.date()
+    # 1) utilisateur actif : compté une seule fois par jour
+    result = await db.execute(
+        insert(DailyActiveUser)
+        .values(day=day, user_id=user_id, is_premium=is_premium)
+        .on_conflict_do_nothing()
+        .returning(DailyActiveUser.user_id)
+    )
+    first_today = result.first() is not None
+    increments = {"analyses": 1}
+    if first_today:
+        increments["active_users"] = 1
+        if is_premium:
+            increments["active_premium_users"] = 1
+    await db.execute(_bump_day(day, **increments))
+
+    # 2) labels (toujours dans le même ordre : pas d'interblocage entre transactions)
+    stmt = insert(DailyLabelRollup).values([
+        {
+            "day": day,
+            "label": label,
+            "detections": 1 if (scores.get(label) or 0) > 0 else 0,
+            "score_sum": float(scores.get(label) or 0.0),
+        }
+        for label in ALL_CLASSES
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyLabelRollup.day, DailyLabelRollup.label],
+        set_={
+            "detections": DailyLabelRollup.detections + stmt.excluded.detections,
+            "score_sum": DailyLabelRollup.score_sum + stmt.excluded.score_sum,
+        },
+    ))
+
+
+async def forget_analyses(
+    db: AsyncSession,
+    deleted: List[Tuple[int, Dict[str, float], datetime]]
+) -> None:
+    """
+    Retire des agrégats des sessions supprimées (user_id, scores, timestamp),
+    pour qu'ils restent égaux à une reconstruction depuis la table sessions.
+    Un utilisateur ne quitte les actifs du jour que s'il n'y a plus aucune
+    session ce jour-là. Ne commit pas : à appeler dans la transaction qui
+    supprime les sessions, après le DELETE.
+    """
+    if not deleted:
+        return
+    analyses: TypingCounter[date] = Counter()
+    detections: TypingCounter[Tuple[date, str]] = Counter()
+    score_sums: Dict[Tuple[date, str], float] = defaultdict(float)
+    for _, scores, when in deleted:
+        day = when.date()
+        analyses[day] += 1
+        for label in ALL_CLASSES:
+            score = float((scores or {}).get(label) or 0.0)
+            detections[day, label] += 1 if score > 0 else 0
+            score_sums[day, label] += score
+
+    # 1) utilisateurs sans plus aucune session ce jour-là
+    inactive: TypingCounter[date] = Counter()
+    inactive_premium: TypingCounter[date] = Counter()
+    for user_id, day in sorted({(user_id, when.date()) for user_id, _, when in deleted}):
+        start = datetime.combine(day, time.min)
+        remaining = await db.execute(
+            select(DBSession.id)
+            .where(
+                DBSession.user_id == user_id,
+                DBSession.timestamp >= start,
+                DBSession.timestamp < start + timedelta(days=1),
+            )
+            .limit(1)
+        )
+        if remaining.first() is not None:
+            continue
+        result = await db.execute(
+            delete(DailyActiveUser)
+            .where(DailyActiveUser.day == day, DailyActiveUser.user_id == user_id)
+            .returning(DailyActiveUser.is_premium)
+        )
+        row = result.first()
+        if row is not None:
+            inactive[day] += 1
+            inactive_premium[day] += 1 if row.is_premium else 0
+
+    # 2) agrégats du jour puis labels, dans l'ordre de record_analysis
+    for day in sorted(analyses):
+        await db.execute(
+            update(DailyRollup)
+            .where(DailyRollup.day == day)
+            .values(
+                analyses=DailyRollup.analyses - analyses[day],
+                active_users=DailyRollup.active_users - inactive[day],
+                active_premium_users=DailyRollup.active_premium_users - inactive_premium[day],
+            )
+        )
+    labels = DailyLabelRollup.__table__
+    await db.execute(
+        update(labels)
+        .where(labels.c.day == bindparam("b_day"), labels.c.label == bindparam("b_label"))
+        .values(
+            detections=labels.c.detections - bindparam("b_detections"),
+            score_sum=labels.c.score_sum - bindparam("b_score_sum"),
+        ),
+        [
+            {"b_day": day, "b_label": label, "b_detections": detections[day, label],
+             "b_score_sum": score_sums[day, label]}
+            for day, label in sorted(score_sums)
+        ],
+    )
+
+
+async def record_premium_change(
+    db: AsyncSession,
+    is_premium: bool,
+    when: datetime,
+    count: int = 1
+) -> None:
+    """Compte des passages en premium (ou des retours en gratuit). Ne commit pas."""
+    if count <= 0:
+        return
+    column = "premium_upgrades" if is_premium else "premium_downgrades"
+    await db.execute(_bump_day(when.date(), **{column: count}))
+
+
+async def get_daily_rollups(db: AsyncSession, start: date, end: date) -> List[Dict]:
+    """
+    Agrégats des jours [start, end] : ne lit que les tables de rollup
+    (au plus quelques lignes par jour), jamais la table sessions.
+    """
+    days = (await db.execute(
+        select(DailyRollup)
+        .where(DailyRollup.day.between(start, end))
+        .order_by(DailyRollup.day)
+    )).scalars().all()
+    labels = (await db.execute(
+        select(DailyLabelRollup)
+        .where(DailyLabelRollup.day.between(start, end))
+    )).scalars().all()
+
+    by_day: Dict[date, Dict] = {}
+    for r in labels:
+        by_day.setdefault(r.day, {})[r.label] = r
+    report = []
+    for d in days:
+        label_rows = by_day.get(d.day, {})
+        report.append({
+            "day": d.day,
+            "analyses": d.analyses,
+            "active_users": d.active_users,
+            "active_premium_users": d.active_premium_users,
+            "premium_share": round(d.active_premium_users / d.active_users, 4) if d.active_users else 0.0,
+            "premium_upgrades": d.premium_upgrades,
+            "premium_downgrades": d.premium_downgrades,
+            "labels": {
+                label: {
+                    "prevalence": round(r.detections / d.analyses, 4) if d.analyses else 0.0,
+                    "mean_score": round(r.score_sum / d.analyses, 4) if d.analyses else 0.0,
+                }
+                for label, r in label_rows.items()
+            },
+        })
+    return report
+
+
+async def rebuild_rollups(db: AsyncSession, since: date | None = None) -> Dict[str, int]:
+    """
+    Recalcule les agrégats d'analyses depuis la table sessions (à partir de
+    `since`, ou tout l'historique). Les compteurs de changements premium ne
+    peuvent pas être reconstruits (pas d'historique) et sont conservés ; le
+    statut premium des utilisateurs actifs est celui du moment de la reconstruction.
+    """
+    params = {"since": since or date.min, "labels": ALL_CLASSES}
+    # 1) on repart de zéro sur la plage
+    await db.execute(text("DELETE FROM daily_active_users WHERE day >= :since"), params)
+    await db.execute(text("DELETE FROM daily_label_rollups WHERE day >= :since"), params)
+    await db.execute(text(
+        "UPDATE daily_rollups SET analyses = 0, active_users = 0, active_premium_users = 0 "
+        "WHERE day >= :since"
+    ), params)
+    # 2) utilisateurs actifs par jour
+    await db.execute(text(
+        """
+        INSERT INTO daily_active_users (day, user_id, is_premium)
+        SELECT DISTINCT s.timestamp::date, s.user_id, coalesce(u.is_premium, false)
+        FROM sessions s JOIN users u ON u.id = s.user_id
+        WHERE s.timestamp::date >= :since
+        """
+    ), params)
+    # 3) agrégats du jour
+    result = await db.execute(text(
+        """
+        INSERT INTO daily_rollups (day, analyses, active_users, active_premium_users,
+                                   premium_upgrades, premium_downgrades)
+        SELECT a.day, a.analyses, coalesce(u.active, 0), coalesce(u.premium, 0), 0, 0
+        FROM (
+            SELECT timestamp::date AS day, count(*) AS analyses
+            FROM sessions WHERE timestamp::date >= :since GROUP BY 1
+        ) AS a
+        LEFT JOIN (
+            SELECT day, count(*) AS active, count(*) FILTER (WHERE is_premium) AS premium
+            FROM daily_active_users WHERE day >= :since GROUP BY 1
+        ) AS u ON u.day = a.day
+        ON CONFLICT (day) DO UPDATE SET
+            analyses = excluded.analyses,
+            active_users = excluded.active_users,
+            active_premium_users = excluded.active_premium_users
+        """
+    ), params)
+    days = result.rowcount
+    # 4) labels : détections et somme des scores
+    await db.execute(text(
+        """
+        INSERT INTO daily_label_rollups (day, label, detections, score_sum)
+        SELECT s.timestamp::date, kv.key,
+               count(*) FILTER (WHERE kv.value::float > 0),
+               coalesce(sum(kv.value::float), 0)
+        FROM sessions s, jsonb_each_text(s.scores) AS kv
+        WHERE s.timestamp::date >= :since AND kv.key = ANY(:labels)
+        GROUP BY 1, 2
+        """
+    ), params)
+    await db.commit()
+    return {"days": days}
@@ -1,17 +1,81 @@
 # app/crud/session.py
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
-from sqlalchemy import delete, select, func
+from sqlalchemy import delete, insert, select, update, func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.db.models import Session as DBSession
+from app.db.models import Session as DBSession, User as DBUser
+from app.crud.image import acquire_image_refs, release_image_refs
+from app.crud.rollup import forget_analyses, record_analysis
+from app.core.config import settings
+from app.services.annotation_codec import pack_annotations
+from app.services import analytics, dedup
+from app.services.analytics import compute_progress, compute_stats, compute_trend, load_matrix
 from datetime import datetime
-from sqlalchemy import func, cast, extract
-from sqlalchemy.types import Float
-from collections import defaultdict
-from calendar import month_name
+
+def invalidate_user_caches(user_id: int) -> None:
+    """Caches par utilisateur (matrice de scores, index dHash) à jeter après une écriture."""
+    analytics.invalidate_user(user_id)
+    dedup.invalidate_user(user_id)
+
+def session_values(
+    user_id: int,
+    image_url: str,
+    annotated_image_url: str,
+    scores: dict,
+    annotations: list,
+    image_dhash: int | None = None
+) -> dict:
+    """Colonnes d'une nouvelle session (annotations compactées selon ANNOTATIONS_STORAGE)."""
+    packed = pack_annotations(annotations) if settings.ANNOTATIONS_STORAGE == "packed" else None
+    return {
+        "user_id": user_id,
+        "image_url": image_url,
+        "annotated_image_url": annotated_image_url,
+        "scores": scores,
+        "annotations": None if packed is not None else annotations,
+        "annotations_packed": packed,
+        "image_dhash": dedup.to_signed(image_dhash) if image_dhash is not None else None,
+        "timestamp": datetime.utcnow(),
+    }
+
+async def bump_data_version(db: AsyncSession, user_ids) -> None:
+    """
+    Incrémente users.data_version (ETag de l'historique, des stats…).
+    Ne commit pas : à appeler dans la transaction qui modifie les sessions.
+    """
+    ids = sorted(set(user_ids))
+    if ids:
+        await db.execute(
+            update(DBUser)
+            .where(DBUser.id.in_(ids))
+            .values(data_version=DBUser.data_version + 1)
+        )
+
+async def get_data_version(db: AsyncSession, user_id: int) -> int:
+    """Version des données de l'utilisateur : une lecture par clé primaire."""
+    result = await db.execute(select(DBUser.data_version).where(DBUser.id == user_id))
+    return result.scalar_one_or_none() or 0
+
+async def insert_sessions(db: AsyncSession, rows: List[Tuple[dict, bool]]) -> List[DBSession]:
+    """
+    Insère des sessions (colonnes de session_values, is_premium) en un
+    INSERT … RETURNING, avec la référence de l'image annotée et les agrégats
+    du jour. Celle de l'image d'origine est prise avant l'inférence par
+    l'appelant (acquire_image_refs) et passe à la session. Ne commit pas.
+    """
+    result = await db.scalars(
+        insert(DBSession).returning(DBSession, sort_by_parameter_order=True),
+        [values for values, _ in rows]
+    )
+    created = result.all()
+    await acquire_image_refs(db, [values["annotated_image_url"] for values, _ in rows])
+    for values, is_premium in rows:
+        await record_analysis(db, values["user_id"], is_premium, values["scores"], values["timestamp"])
+    await bump_data_version(db, [values["user_id"] for values, _ in rows])
+    return created
 
 async def create_session(
     db: AsyncSession,
@@ -19,19 +83,15 @@ async def create_session(
     image_url: str,
     annotated_image_url: str,
     scores: dict,
-    annotations: list
+    annotations: list,
+    is_premium: bool = False,
+    image_dhash: int | None = None
 ) -> DBSession:
-    new = DBSession(
-        user_id=user_id,
-        image_url=image_url,
-        annotated_image_url=annotated_image_url,
-        scores=scores,
-        annotations=annotations,
-        timestamp=datetime.utcnow()
-    )
-    db.add(new)
+    values = session_values(user_id, image_url, annotated_image_url, scores, annotations, image_dhash)
+    # id et colonnes relus par RETURNING : pas de refresh après le commit
+    [new] = await insert_sessions(db, [(values, is_premium)])
     await db.commit()
-    await db.refresh(new)
+    invalidate_user_caches(user_id)
     return new
 
 async def get_sessions_for_user(
@@ -49,11 +109,42 @@ async def get_sessions_for_user(
     )
     return result.scalars().all()
 
-async def delete_session(db: AsyncSession, session_id: int) -> None:
-    await db.execute(
-        delete(DBSession).where(DBSession.id == session_id)
+async def get_sessions_page(
+    db: AsyncSession,
+    user_id: int,
+    after_id: int = 0,
+    limit: int = 500
+) -> List[DBSession]:
+    """Sessions de l'utilisateur par id croissant, après after_id (pagination keyset)."""
+    result = await db.execute(
+        select(DBSession)
+        .where(DBSession.user_id == user_id, DBSession.id > after_id)
+        .order_by(DBSession.id)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+async def delete_session(db: AsyncSession, session_id: int) -> List[str]:
+    """
+    Supprime la session et libère ses références d'images.
+    Retourne les clés de stockage qui ne sont plus référencées.
+    """
+    result = await db.execute(
+        delete(DBSession)
+        .where(DBSession.id == session_id)
+        .returning(
+            DBSession.user_id, DBSession.image_url, DBSession.annotated_image_url,
+            DBSession.scores, DBSession.timestamp
+        )
     )
+    rows = result.all()
+    released = await release_image_refs(db, [url for r in rows for url in (r.image_url, r.annotated_image_url)])
+    await forget_analyses(db, [(r.user_id, r.scores, r.timestamp) for r in rows])
+    await bump_data_version(db, [r.user_id for r in rows])
     await db.commit()
+    for r in rows:
+        invalidate_user_caches(r.user_id)
+    return released
 
 async def get_session_by_id(db: AsyncSession, session_id: int) -> DBSession | None:
     """
@@ -64,6 +155,18 @@ async def get_session_by_id(db: AsyncSession, session_id: int) -> DBSession | No
     )
     return result.scalar_one_or_none()
 
+async def user_has_image(db: AsyncSession, user_id: int, image_url: str) -> bool:
+    """L'image (originale ou annotée) appartient-elle à une analyse de l'utilisateur ?"""
+    result = await db.execute(
+        select(DBSession.id)
+        .where(
+            DBSession.user_id == user_id,
+            or_(DBSession.image_url == image_url, DBSession.annotated_image_url == image_url)
+        )
+        .limit(1)
+    )
+    return result.first() is not None
+
 async def get_all_sessions(db: AsyncSession) -> List[DBSession]:
     """
     Retourne toutes les sessions en base, triées par date décroissante.
@@ -75,112 +178,31 @@ async def get_all_sessions(db: AsyncSession) -> List[DBSession]:
     )
     return result.scalars().all()
 
-LABELS = [
-    "Acne",
-    "Dark-Circle",
-    "Dry-Skin",
-    "EyeBags",
-    "Normal-Skin",
-    "Oily-Skin",
-    "Pores",
-    "Spots",
-    "Wrinkles",
-]
-
-async def get_stats(db: AsyncSession, user_id: int) -> dict:
+async def get_stats(db: AsyncSession, user_id: int, data_version: int | None = None) -> dict:
     """
     Retourne pour un user donné :
       - total_sessions : int
       - by_label : liste de { label, count, percent }
+    `data_version` (users.data_version lue par l'appelant) invalide une
+    matrice en cache plus ancienne ; voir load_matrix.
     """
-
-    # 1) Total d’analyses
-    total_q = await db.execute(
-        select(func.count(DBSession.id))
-        .where(DBSession.user_id == user_id)
-    )
-    total = total_q.scalar_one()
-
-    # 2) Pour chaque label, compter les sessions où scores[label] > 0
-    stats_by_label = []
-    for label in LABELS:
-        count_q = await db.execute(
-            select(func.count(DBSession.id))
-            .where(DBSession.user_id == user_id)
-            # PostgreSQL JSONB extraction : scores ->> 'label' casté en float
-            .where(
-                cast(
-                    DBSession.scores[label].astext,
-                    Float
-                ) > 0.0
-            )
-        )
-        count = count_q.scalar_one()
-        percent = round((count / total * 100), 1) if total > 0 else 0.0
-        stats_by_label.append({
-            "label":   label,
-            "count":   count,
-            "percent": percent,
-        })
-
-    return {
-        "total_sessions": total,
-        "by_label":       stats_by_label
-    }
+    return compute_stats(await load_matrix(db, user_id, data_version))
 
 async def get_trend(
     db: AsyncSession,
     user_id: int,
-    period: str  # "month" ou "week"
+    period: str,  # "month" ou "week"
+    data_version: int | None = None
 ) -> List[Dict]:
     """
     Retourne la liste de points de tendance, selon 'period':
      - 'month'  ⇒ group by année-mois
      - 'week'   ⇒ group by iso_week
     """
-    if period == "month":
-        # on regroupe par YYYY-MM
-        stmt = (
-          select(
-            func.to_char(DBSession.timestamp, "Mon YYYY").label("month"),
-            func.to_char(DBSession.timestamp, "IYYY\"-\"IW").label("week"),
-            # pour chaque label, moyenne de scores->>'label'
-            *[
-              func.avg((DBSession.scores[label].as_float())).label(label)
-              for label in ["acne","wrinkles","redness","dryness","eyebags"]
-            ]
-          )
-          .where(DBSession.user_id == user_id)
-          .group_by("month","week")
-          .order_by(func.min(DBSession.timestamp))
-        )
-    else:
-        # group by année & semaine ISO
-        stmt = (
-          select(
-            func.to_char(DBSession.timestamp, "Mon YYYY").label("month"),
-            func.to_char(DBSession.timestamp, "IYYY\"-\"IW").label("week"),
-            *[
-              func.avg((DBSession.scores[label].as_float())).label(label)
-              for label in ["acne","wrinkles","redness","dryness","eyebags"]
-            ]
-          )
-          .where(DBSession.user_id == user_id)
-          .group_by("month","week")
-          .order_by(func.min(DBSession.timestamp))
-        )
-    result = await db.execute(stmt)
-    rows = result.all()
-    trend = []
-    for row in rows:
-        month, week, *avgs = row
-        trend.append({
-            "month": month,
-            "week": week,
-            "averages": {
-              label: float(avgs[i] or 0) for i,label in enumerate(
-                ["acne","wrinkles","redness","dryness","eyebags"]
-              )
-            }
-        })
-    return trend
\ No newline at end of file
+    return compute_trend(await load_matrix(db, user_id, data_version), period)
+
+async def get_progress(db: AsyncSession, user_id: int, window: int, data_version: int | None = None) -> dict:
+    """
+    Moyennes glissantes et écarts d'une session à l'autre.
+    """
+    return compute_progress(await load_matrix(db, user_id, data_version), window)
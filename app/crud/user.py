@@ -3,11 +3,17 @@
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from datetime import datetime
-from sqlalchemy import update, delete
-from app.db.models import User as DBUser, Session as DBSession      # votre modèle SQLAlchemy
+from datetime import datetime, timedelta
+from sqlalchemy import update, delete, any_, bindparam, exists, or_
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.types import Integer
+from app.db.models import User as DBUser, Session as DBSession, PendingDeletion, Entitlement      # votre modèle SQLAlchemy
 from app.models.user import UserCreate, UserInDB, UserPublic
 from app.db.models import User
+from app.crud.entitlement import clear_entitlements
+from app.crud.image import release_image_refs
+from app.crud.session import bump_data_version, invalidate_user_caches
+from app.crud.rollup import forget_analyses, record_premium_change
 
 async def get_user_by_email(
     db: AsyncSession,
@@ -105,30 +111,185 @@ async def get_all_users(db: AsyncSession) -> list[UserInDB]:
 async def update_user_is_premium(
     db: AsyncSession,
     user_id: int,
-    is_premium: bool
+    is_premium: bool,
+    from_receipt: bool = False
 ) -> None:
     """
     Active ou désactive le flag is_premium pour l'utilisateur donné.
+    Hors reçu (admin, activation manuelle), le droit in-app éventuel est
+    oublié : le balayage des droits expirés ne touche plus à ce statut.
     """
-    await db.execute(
+    if not from_receipt:
+        await clear_entitlements(db, [user_id])
+    result = await db.execute(
         update(User)
-        .where(User.id == user_id)
+        .where(User.id == user_id, User.is_premium.is_distinct_from(is_premium))
         .values(is_premium=is_premium)
+        .returning(User.id)
     )
+    # seul un vrai changement de statut compte dans les agrégats journaliers
+    if result.first() is not None:
+        await record_premium_change(db, is_premium, datetime.utcnow())
     await db.commit()
 
-async def delete_user_by_id(db: AsyncSession, user_id: int) -> None:
+def _ids_param(user_ids: List[int]):
+    # "= ANY(:ids)" : un seul paramètre tableau, quel que soit le nombre d'ids
+    return any_(bindparam("ids", list(user_ids), type_=ARRAY(Integer)))
+
+async def set_premium_for_ids(
+    db: AsyncSession,
+    user_ids: List[int],
+    is_premium: bool,
+    from_receipt: bool = False,
+    expired_before: Optional[datetime] = None
+) -> int:
     """
-    Supprime les sessions puis l’utilisateur.
+    Met à jour is_premium pour un lot d'utilisateurs en une requête
+    (UPDATE … WHERE id = ANY(…)) et commit. Retourne le nombre de changements.
+    Comme update_user_is_premium, oublie les droits in-app sauf from_receipt.
+    Avec expired_before, seuls les utilisateurs dont le droit in-app a expiré
+    avant cette date sont modifiés, condition vérifiée dans l'UPDATE même :
+    un reçu renouvelé entre la liste et la mise à jour est respecté.
     """
-    # 1) Supprimer toutes les sessions de l’utilisateur
-    await db.execute(
-        delete(DBSession).where(DBSession.user_id == user_id)
+    if not user_ids:
+        return 0
+    if not from_receipt:
+        await clear_entitlements(db, user_ids)
+    conditions = [User.id == _ids_param(user_ids), User.is_premium.is_distinct_from(is_premium)]
+    if expired_before is not None:
+        conditions.append(exists().where(
+            Entitlement.user_id == User.id, Entitlement.expires_at < expired_before
+        ))
+    result = await db.execute(
+        update(User)
+        .where(*conditions)
+        .values(is_premium=is_premium)
+        .returning(User.id)
+    )
+    changed = len(result.all())
+    await record_premium_change(db, is_premium, datetime.utcnow(), changed)
+    await db.commit()
+    return changed
+
+async def list_user_ids(
+    db: AsyncSession,
+    after_id: int = 0,
+    limit: int = 500,
+    email_suffix: Optional[str] = None,
+    is_premium: Optional[bool] = None
+) -> List[int]:
+    """
+    Ids d'utilisateurs correspondant aux filtres, par ordre croissant à
+    partir de after_id (pagination keyset pour les traitements par lots).
+    """
+    stmt = select(DBUser.id).where(DBUser.id > after_id)
+    if email_suffix:
+        # % et _ du suffixe pris littéralement
+        escaped = email_suffix.replace("/", "//").replace("%", "/%").replace("_", "/_")
+        stmt = stmt.where(DBUser.email.ilike(f"%{escaped}", escape="/"))
+    if is_premium is not None:
+        stmt = stmt.where(DBUser.is_premium.is_(is_premium))
+    result = await db.execute(stmt.order_by(DBUser.id).limit(limit))
+    return list(result.scalars().all())
+
+async def schedule_deletions(db: AsyncSession, user_ids: List[int]) -> int:
+    """
+    Enregistre des demandes de suppression de compte (pending_deletions) et
+    commit : elles survivent à un redémarrage. Les ids inconnus ou déjà
+    programmés sont ignorés ; retourne le nombre de demandes ajoutées.
+    """
+    existing = select(DBUser.id, bindparam("now", datetime.utcnow())).where(DBUser.id.in_(user_ids))
+    result = await db.execute(
+        insert(PendingDeletion)
+        .from_select(["user_id", "requested_at"], existing)
+        .on_conflict_do_nothing()
+        .returning(PendingDeletion.user_id)
+    )
+    added = len(result.all())
+    await db.commit()
+    return added
+
+async def claim_pending_deletion(db: AsyncSession, lease_seconds: int) -> int | None:
+    """
+    Prend la plus ancienne demande libre (jamais prise, ou bail expiré) pour
+    `lease_seconds` et commit. SKIP LOCKED : les workers ne se gênent pas.
+    """
+    now = datetime.utcnow()
+    candidate = (
+        select(PendingDeletion.user_id)
+        .where(or_(PendingDeletion.locked_until.is_(None), PendingDeletion.locked_until < now))
+        .order_by(PendingDeletion.requested_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(PendingDeletion)
+        .where(PendingDeletion.user_id == candidate)
+        .values(
+            locked_until=now + timedelta(seconds=lease_seconds),
+            attempts=PendingDeletion.attempts + 1,
+        )
+        .returning(PendingDeletion.user_id)
     )
+    user_id = result.scalar_one_or_none()
+    await db.commit()
+    return user_id
+
+async def delete_user_sessions_batch(
+    db: AsyncSession,
+    user_id: int,
+    limit: int
+) -> tuple[int, List[str]]:
+    """
+    Supprime au plus `limit` sessions de l'utilisateur et commit : les verrous
+    sur sessions ne sont tenus que le temps d'un lot.
+    Retourne (sessions supprimées, clés de stockage plus référencées).
+    """
+    batch = (
+        select(DBSession.id)
+        .where(DBSession.user_id == user_id)
+        .order_by(DBSession.id)
+        .limit(limit)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        delete(DBSession)
+        .where(DBSession.id.in_(batch))
+        .returning(DBSession.image_url, DBSession.annotated_image_url, DBSession.scores, DBSession.timestamp)
+    )
+    rows = result.all()
+    released = await release_image_refs(db, [url for r in rows for url in (r.image_url, r.annotated_image_url)])
+    await forget_analyses(db, [(user_id, r.scores, r.timestamp) for r in rows])
+    if rows:
+        await bump_data_version(db, [user_id])
+    await db.commit()
+    if rows:
+        invalidate_user_caches(user_id)
+    return len(rows), released
+
+async def delete_user_by_id(db: AsyncSession, user_id: int) -> List[str]:
+    """
+    Supprime les sessions puis l’utilisateur, en une transaction.
+    Pour un compte chargé, vider d'abord les sessions par lots
+    (delete_user_sessions_batch) : il ne reste alors que l'utilisateur.
+    Retourne les clés de stockage qui ne sont plus référencées.
+    """
+    # 1) Supprimer toutes les sessions de l’utilisateur (et libérer leurs images)
+    result = await db.execute(
+        delete(DBSession)
+        .where(DBSession.user_id == user_id)
+        .returning(DBSession.image_url, DBSession.annotated_image_url, DBSession.scores, DBSession.timestamp)
+    )
+    rows = result.all()
+    released = await release_image_refs(db, [url for r in rows for url in (r.image_url, r.annotated_image_url)])
+    await forget_analyses(db, [(user_id, r.scores, r.timestamp) for r in rows])
     # 2) (Éventuellement) supprimer d’autres dépendances :
     #    await db.execute(delete(Analyses).where(Analyses.user_id == user_id))
     # 3) Supprimer l’utilisateur
     await db.execute(
         delete(DBUser).where(DBUser.id == user_id)
     )
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+    invalidate_user_caches(user_id)
+    return released
\ No newline at end of file
@@ -1,6 +1,6 @@
 # app/db/models.py
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, BigInteger, Integer, String, Boolean, Date, DateTime, Float, JSON, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import JSONB
@@ -19,6 +19,7 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_admin = Column(Boolean, default=False)
     is_premium = Column(Boolean, default=False)
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0")  # +1 à chaque ajout/suppression de session
     sessions = relationship("Session", back_populates="user", cascade="all, delete")
 
 class Session(Base):
@@ -26,10 +27,105 @@ class Session(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    image_url = Column(String, nullable=False)
-    annotated_image_url = Column(String, nullable=True)
+    image_url = Column(String, nullable=False, index=True)
+    annotated_image_url = Column(String, nullable=True, index=True)
     scores = Column(JSONB, nullable=False)       # stocke le dict {"acne":0.1, …}
-    annotations = Column(JSONB, nullable=False, default=list)
+    annotations = Column(JSONB, nullable=True)   # ancien format, NULL si annotations_packed
+    annotations_packed = Column(LargeBinary, nullable=True)  # cf. app/services/annotation_codec.py
+    image_dhash = Column(BigInteger, nullable=True)  # dHash 64 bits (signé), cf. app/services/dedup.py
     timestamp = Column(DateTime, default=datetime.utcnow)
 
-    user = relationship("User", back_populates="sessions")
\ No newline at end of file
+    user = relationship("User", back_populates="sessions")
+
+    # parcours par utilisateur en pagination keyset (export)
+    __table_args__ = (Index("ix_sessions_user_id_id", "user_id", "id"),)
+
+class StoredImage(Base):
+    """
+    Fichier image du stockage adressé par contenu (clé "ab/cd/<sha256>.jpg").
+    ref_count = nombre de références depuis sessions.image_url /
+    sessions.annotated_image_url, plus les analyses en cours sur cet original ;
+    à 0 le fichier n'est plus utilisé.
+    """
+    __tablename__ = "stored_images"
+
+    key = Column(String, primary_key=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Entitlement(Base):
+    """
+    Droit premium issu d'un achat in-app : expiration et dernière vérification
+    du reçu (sert de cache pour /subscription/validate). Le balayage périodique
+    repasse is_premium à False une fois expires_at dépassé ; la ligne est
+    supprimée quand un admin fixe le statut premium hors reçu.
+    """
+    __tablename__ = "entitlements"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    platform = Column(String, nullable=False)        # "apple" | "google"
+    receipt_hash = Column(String, nullable=False)    # sha256 du reçu (le reçu n'est pas conservé)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    verified_at = Column(DateTime, nullable=False)
+
+class IdempotencyKey(Base):
+    """
+    Réponse mémorisée d'un POST envoyé avec l'en-tête Idempotency-Key :
+    "pending" pendant le traitement, "complete" ensuite (rejouée jusqu'à expires_at).
+    """
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    route = Column(String, nullable=False)           # "POST /skin/analyze"
+    status = Column(String, nullable=False)          # "pending" | "complete"
+    status_code = Column(Integer, nullable=True)
+    media_type = Column(String, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class PendingDeletion(Base):
+    """
+    Compte dont la suppression est demandée : la ligne survit aux redémarrages
+    jusqu'à la suppression de l'utilisateur (ON DELETE CASCADE). locked_until =
+    bail du worker qui la traite ; expiré, un autre worker la reprend.
+    """
+    __tablename__ = "pending_deletions"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    requested_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    locked_until = Column(DateTime, nullable=True)
+
+class DailyRollup(Base):
+    """
+    Agrégats globaux par jour (UTC), tenus à jour à chaque analyse, suppression
+    de session et changement de statut premium ; reconstruits par
+    `python -m app.services.rollups`.
+    """
+    __tablename__ = "daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    analyses = Column(Integer, nullable=False, default=0)
+    active_users = Column(Integer, nullable=False, default=0)
+    active_premium_users = Column(Integer, nullable=False, default=0)
+    premium_upgrades = Column(Integer, nullable=False, default=0)
+    premium_downgrades = Column(Integer, nullable=False, default=0)
+
+class DailyActiveUser(Base):
+    """Utilisateurs ayant fait au moins une analyse ce jour-là (compte distinct incrémental)."""
+    __tablename__ = "daily_active_users"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    is_premium = Column(Boolean, nullable=False, default=False)
+
+class DailyLabelRollup(Base):
+    """Par jour et par label : analyses où il est détecté (score > 0) et somme des scores."""
+    __tablename__ = "daily_label_rollups"
+
+    day = Column(Date, primary_key=True)
+    label = Column(String, primary_key=True)
+    detections = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
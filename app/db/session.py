@@ -1,9 +1,13 @@
 # app/db/session.py
+import logging
+import os
+from sqlalchemy import text
 from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 from app.db.models import Base
+from app.core.metrics import instrument_engine
 
 # 1) On parse la chaîne pour pouvoir la modifier
 url = make_url(settings.DATABASE_URL)
@@ -13,14 +17,76 @@ if url.drivername == "postgresql":
     url = url.set(drivername="postgresql+asyncpg")
 
 # 3) On crée l’engine asynchrone **avec** l’URL corrigée
-engine = create_async_engine(url, echo=True)
+engine = create_async_engine(url, echo=settings.DB_ECHO)
+instrument_engine(engine)
 
 # 4) Session factory
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
-# 5) Création des tables au démarrage
-async def init_models():
+logger = logging.getLogger("db")
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "..", "alembic.ini")
+
+# 5) Création des tables (base de dev vierge : en prod le schéma vient d'Alembic)
+async def init_models() -> None:
+    """
+    create_all puis, si la base était vierge, la marque à la head Alembic
+    (équivalent de `alembic stamp head`) : la chaîne de migrations suppose
+    les tables de base déjà créées et ne peut pas partir de zéro.
+    Une base existante non versionnée n'est pas marquée.
+    """
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        result = await conn.execute(text("SELECT to_regclass('users') IS NULL"))
+        fresh = result.scalar_one()
+        await conn.run_sync(Base.metadata.create_all)
+        if not fresh:
+            return
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS alembic_version ("
+            "version_num VARCHAR(32) NOT NULL, "
+            "CONSTRAINT alembic_version_pkc PRIMARY KEY (version_num))"
+        ))
+        for head in sorted(alembic_heads()):
+            await conn.execute(
+                text("INSERT INTO alembic_version (version_num) VALUES (:v) ON CONFLICT DO NOTHING"),
+                {"v": head}
+            )
+        logger.info("Base vierge créée et marquée à la révision %s", ", ".join(sorted(alembic_heads())))
+
+def alembic_heads() -> set[str]:
+    """Révisions head des migrations livrées avec le code (lecture des fichiers, sans base)."""
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+async def check_schema_revision() -> None:
+    """
+    Au démarrage : une seule requête pour comparer alembic_version à la head
+    du code, au lieu de refléter et créer toutes les tables.
+    Selon SCHEMA_CHECK : "strict" lève une erreur, "warn" se contente de logger,
+    "create" crée d'abord les tables manquantes (init_models) puis vérifie.
+    """
+    if settings.SCHEMA_CHECK == "create":
+        await init_models()
+
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            current = {row[0] for row in result}
+        except Exception:
+            current = set()
+    expected = alembic_heads()
+    if current == expected:
+        return
+    message = (
+        f"Schéma en base {sorted(current) or 'non versionné'} ≠ migrations {sorted(expected)} : "
+        "lancez `alembic upgrade head`"
+    )
+    if settings.SCHEMA_CHECK == "strict":
+        raise RuntimeError(message)
+    logger.warning(message)
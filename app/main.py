@@ -1,27 +1,75 @@
 # app/main.py
 
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from fastapi import Depends, FastAPI, Request, Response
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.db.session import init_models
+from app.db.session import check_schema_revision
 from app.routers import auth, skin  # importez votre module auth
-from fastapi.staticfiles import StaticFiles
 from app.routers import interpret
 from app.routers.subscription import router as subscription_router
 from app.routers.admin import router as admin_router
+from app.routers.variants import router as variants_router
+from app.routers.images import router as images_router
+from app.routers.dependencies import metrics_access
+from app.services.image_variants import shutdown_variant_pool
+from app.services.image_gc import start_image_gc, stop_image_gc
+from app.services.entitlements import start_entitlement_sweeper, stop_entitlement_sweeper
+from app.services.idempotency import start_idempotency_purge, stop_idempotency_purge
+from app.services.account_deletion import start_account_deletion, stop_account_deletion
+from app.services.profiling import profile_request
+from app.core.clients import start_clients, close_clients
+from app.core.responses import FastJSONResponse
+from app.core.metrics import (
+    HTTP_REQUEST_SECONDS, PROCESS_RSS_BYTES, STARTUP_IMPORT_SECONDS,
+    current_rss_bytes, monitor_event_loop_lag, render_prometheus,
+    server_timing_header, start_request_timings,
+)
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+logger = logging.getLogger("app")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Au démarrage, créez les tables si nécessaire
-    await init_models()
+    # Au démarrage, vérifie que la base est à la révision Alembic attendue
+    await check_schema_revision()
+    # Clients réseau partagés (connexions réutilisées entre requêtes)
+    await start_clients()
+    STARTUP_IMPORT_SECONDS.set(IMPORT_SECONDS)
+    PROCESS_RSS_BYTES.set(current_rss_bytes(), phase="startup")
+    logger.info(
+        "Worker prêt : import %.2f s, RSS %.0f Mo",
+        IMPORT_SECONDS, current_rss_bytes() / 2**20
+    )
+    # Suppression différée des images + balayage périodique des orphelines
+    start_image_gc()
+    # Droits premium expirés : repassage en gratuit par lots
+    start_entitlement_sweeper()
+    # Purge des clés Idempotency-Key expirées
+    start_idempotency_purge()
+    # Suppressions de comptes demandées (reprise de celles interrompues)
+    start_account_deletion()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
     yield
-    # (Optionnel) au shutdown : libération de ressources
+    # Au shutdown : libération de ressources
+    lag_monitor.cancel()
+    await stop_account_deletion()
+    await stop_idempotency_purge()
+    await stop_entitlement_sweeper()
+    await stop_image_gc()
+    await close_clients()
+    shutdown_variant_pool()
 
 app = FastAPI(
     title="SkinCoach API",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # --- (Optionnel mais recommandé) CORS pour autoriser le front React Native ---
@@ -33,6 +81,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Mesure de latence : histogramme par route + en-tête Server-Timing ---
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        elapsed,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    timings.append(("total", elapsed))
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+# --- Profilage à la demande (piloté via /admin/profiling) ---
+app.middleware("http")(profile_request)
+
 # --- Montage des routers ---
 app.include_router(
     auth.router,
@@ -47,12 +116,16 @@ app.include_router(subscription_router)
 
 app.include_router(admin_router)
 
-# Sert le dossier ./images sous /images
-app.mount(
-    settings.IMAGE_URL_PREFIX,
-    StaticFiles(directory=settings.IMAGE_SAVE_DIR),
-    name="images"
-)
+app.include_router(variants_router)
+
+# /images/… : accès contrôlé (fichier local, X-Accel-Redirect ou URL présignée S3)
+app.include_router(images_router)
+
+# --- Métriques Prometheus ---
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(metrics_access)])
+async def metrics():
+    PROCESS_RSS_BYTES.set(current_rss_bytes(), phase="current")
+    return Response(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 # --- Vos endpoints de test ---
 @app.get("/")
@@ -69,9 +142,23 @@ if __name__ == "__main__":
 
     # récupère PORT depuis l'env (Railway injecte automatiquement), sinon 8000
     port = int(os.environ.get("PORT", 8000))
+    # WEB_CONCURRENCY=0 : un worker par cœur
+    workers = settings.WEB_CONCURRENCY or os.cpu_count() or 1
     uvicorn.run(
         "app.main:app",            # module:app
         host="0.0.0.0",
         port=port,
+        workers=workers,
+        loop=settings.SERVER_LOOP,
+        http=settings.SERVER_HTTP,
+        # recyclage : le worker s'arrête proprement après N requêtes et le
+        # superviseur uvicorn en relance un neuf (SIGHUP redémarre tous les
+        # workers un par un). Avec un seul worker, rien ne le relancerait :
+        # pas de recyclage, sauf si un superviseur externe relance le process.
+        limit_max_requests=(
+            settings.SERVER_MAX_REQUESTS or None
+            if workers > 1 or settings.SERVER_EXTERNAL_SUPERVISOR else None
+        ),
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
         log_level="info"
     )
\ No newline at end of file
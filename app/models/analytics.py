@@ -0,0 +1,25 @@
+# app/models/analytics.py
+from datetime import date
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+
+class LabelDaily(BaseModel):
+    prevalence: float    # part des analyses où le label est détecté
+    mean_score: float
+
+class DailyAnalytics(BaseModel):
+    day: date
+    analyses: int
+    active_users: int
+    active_premium_users: int
+    premium_share: float          # part des actifs du jour qui sont premium
+    premium_upgrades: int
+    premium_downgrades: int
+    labels: Dict[str, LabelDaily]
+
+class AnalyticsResponse(BaseModel):
+    start: date
+    end: date
+    days: List[DailyAnalytics]
@@ -0,0 +1,22 @@
+# app/models/profiling.py
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class ProfilingConfig(BaseModel):
+    enabled: bool = False
+    sample_rate: float = Field(0.0, ge=0.0, le=1.0)   # part des requêtes profilées
+    route: Optional[str] = None                       # ex. "/skin/analyze" : toujours profilée
+    interval_ms: float = Field(5.0, ge=1.0, le=100.0) # période d'échantillonnage de la pile
+    memory: bool = False                              # pic mémoire (tracemalloc) sur /skin/analyze*
+
+class ProfileSummary(BaseModel):
+    id: int
+    method: str
+    path: str
+    status: int
+    started_at: datetime
+    duration_ms: float
+    samples: int
+    peak_memory_bytes: Optional[int] = None           # vide si d'autres requêtes se sont chevauchées
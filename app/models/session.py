@@ -16,4 +16,5 @@ class SkinAnalysisResponse(BaseModel):
     annotated_image_url: str
     scores: Dict[str, float]
     annotations: List[Annotation]
-    timestamp: str
\ No newline at end of file
+    timestamp: str
+    reused: bool = False   # résultat d'une analyse récente quasi identique (DEDUP_MODE=reuse)
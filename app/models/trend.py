@@ -1,9 +1,22 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 class MonthlyAvg(BaseModel):
     month: str
+    week: Optional[str] = None   # "IYYY-IW" si period=week
+    count: int = 0               # nombre d'analyses de la période
     averages: Dict[str, float]   # label → moyenne %
 
 class TrendResponse(BaseModel):
-    trend: List[MonthlyAvg]
\ No newline at end of file
+    trend: List[MonthlyAvg]
+
+class ProgressPoint(BaseModel):
+    timestamp: str
+    scores: Dict[str, float]
+    moving_average: Dict[str, float]
+    delta: Optional[Dict[str, float]]   # écart avec l'analyse précédente
+
+class ProgressResponse(BaseModel):
+    window: int
+    points: List[ProgressPoint]
+    overall_delta: Optional[Dict[str, float]]   # dernière − première analyse
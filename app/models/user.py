@@ -1,4 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from typing import List, Optional
+
+from pydantic import BaseModel, EmailStr, Field
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -22,4 +24,18 @@ class UserAdmin(UserPublic):
     id: int
     email: str
     is_admin: bool
-    is_premium: bool
\ No newline at end of file
+    is_premium: bool
+
+class BulkPremiumRequest(BaseModel):
+    """Liste d'ids et/ou filtres ; au moins un critère est requis."""
+    make_premium: bool
+    user_ids: Optional[List[int]] = None
+    email_suffix: Optional[str] = None      # ex. "@entreprise.fr"
+    currently_premium: Optional[bool] = None
+
+class BulkPremiumResult(BaseModel):
+    matched: int
+    updated: int
+
+class BulkDeleteRequest(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1, max_length=1000)
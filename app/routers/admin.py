@@ -1,11 +1,20 @@
 # app/routers/admin.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+from datetime import date, datetime, timedelta
 from app.routers.auth import admin_required, get_current_user, get_db
-from app.models.user import UserAdmin
-from app.crud.user import get_all_users, update_user_is_premium
+from app.core.config import settings
+from app.models.user import UserAdmin, BulkPremiumRequest, BulkPremiumResult, BulkDeleteRequest
+from app.models.profiling import ProfilingConfig, ProfileSummary
+from app.models.analytics import AnalyticsResponse
+from app.crud.rollup import get_daily_rollups
+from app.crud.user import get_all_users, update_user_is_premium, set_premium_for_ids, list_user_ids
+from app.services.account_deletion import request_deletions
+from app.services.image_gc import sweep_orphans
+from app.services import profiling
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -28,4 +37,139 @@ async def set_premium(
     Passe l’utilisateur en premium (make_premium=True) ou en free (False).
     """
     # On peut vérifier que l’utilisateur existe…
-    await update_user_is_premium(db, user_id, make_premium)
\ No newline at end of file
+    await update_user_is_premium(db, user_id, make_premium)
+
+@router.post("/users/premium", response_model=BulkPremiumResult, dependencies=[Depends(admin_required)])
+async def set_premium_bulk(
+    body: BulkPremiumRequest = Body(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Passe en premium (ou en free) une liste d'utilisateurs et/ou ceux qui
+    correspondent aux filtres. Traité par lots de ADMIN_BATCH_SIZE
+    (UPDATE … WHERE id = ANY(…)), un commit par lot.
+    """
+    has_filter = body.email_suffix is not None or body.currently_premium is not None
+    if body.user_ids is None and not has_filter:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indiquez user_ids ou au moins un filtre"
+        )
+    batch_size = settings.ADMIN_BATCH_SIZE
+    matched = updated = 0
+    if body.user_ids is not None and not has_filter:
+        ids = sorted(set(body.user_ids))
+        for i in range(0, len(ids), batch_size):
+            chunk = ids[i:i + batch_size]
+            matched += len(chunk)
+            updated += await set_premium_for_ids(db, chunk, body.make_premium)
+        return {"matched": matched, "updated": updated}
+
+    wanted = set(body.user_ids) if body.user_ids is not None else None
+    after_id = 0
+    while True:
+        ids = await list_user_ids(
+            db, after_id, batch_size,
+            email_suffix=body.email_suffix, is_premium=body.currently_premium
+        )
+        if not ids:
+            break
+        after_id = ids[-1]
+        chunk = [i for i in ids if wanted is None or i in wanted]
+        matched += len(chunk)
+        updated += await set_premium_for_ids(db, chunk, body.make_premium)
+    return {"matched": matched, "updated": updated}
+
+@router.post("/users/delete", status_code=status.HTTP_202_ACCEPTED)
+async def delete_users_bulk(
+    body: BulkDeleteRequest = Body(...),
+    current_admin = Depends(admin_required),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Programme la suppression de comptes (demandes enregistrées en base avant
+    la réponse) : sessions supprimées par lots (verrous courts), fichiers
+    libérés envoyés au GC, puis l'utilisateur.
+    """
+    user_ids = sorted(set(body.user_ids))
+    if int(current_admin.id) in user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Un admin ne peut pas supprimer son propre compte ici"
+        )
+    return {"scheduled": await request_deletions(db, user_ids)}
+
+@router.get("/analytics", response_model=AnalyticsResponse, dependencies=[Depends(admin_required)])
+async def analytics(
+    start: date | None = Query(None, description="premier jour (par défaut : end - 29 jours)"),
+    end: date | None = Query(None, description="dernier jour inclus (par défaut : aujourd'hui, UTC)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Tableau de bord global par jour : analyses, utilisateurs actifs, part et
+    passages premium, prévalence et score moyen par label. Servi depuis les
+    tables d'agrégats journaliers (jamais de parcours de la table sessions).
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end or (end - start).days > 366:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Période invalide (366 jours maximum)"
+        )
+    return {"start": start, "end": end, "days": await get_daily_rollups(db, start, end)}
+
+@router.post("/images/gc", dependencies=[Depends(admin_required)])
+async def images_gc(
+    dry_run: bool = Query(True),
+    batch_size: int = Query(500, ge=1, le=5000),
+    max_batches: int = Query(20, ge=1, le=1000),
+    start_after: str | None = Query(None)
+):
+    """
+    Balayage des images orphelines (non référencées par une session).
+    Par défaut en dry-run : renvoie seulement le rapport. Si next_cursor est
+    non nul, relancer avec start_after=next_cursor pour continuer.
+    """
+    return await sweep_orphans(
+        dry_run=dry_run,
+        batch_size=batch_size,
+        max_batches=max_batches,
+        start_after=start_after,
+    )
+
+
+@router.get("/profiling", response_model=ProfilingConfig, dependencies=[Depends(admin_required)])
+async def get_profiling_config():
+    """Configuration courante du profilage (propre à chaque worker)."""
+    return profiling.config
+
+
+@router.put("/profiling", response_model=ProfilingConfig, dependencies=[Depends(admin_required)])
+async def set_profiling_config(body: ProfilingConfig = Body(...)):
+    """
+    Active le profilage CPU pour une part des requêtes (sample_rate) ou pour
+    une route précise, et/ou le pic mémoire tracemalloc sur /skin/analyze.
+    """
+    return profiling.update_config(body)
+
+
+@router.get("/profiling/profiles", response_model=List[ProfileSummary], dependencies=[Depends(admin_required)])
+async def list_profiles():
+    """Derniers profils capturés, du plus récent au plus ancien."""
+    return profiling.list_profiles()
+
+
+@router.get("/profiling/profiles/{profile_id}", dependencies=[Depends(admin_required)])
+async def download_profile(profile_id: int):
+    """
+    Piles repliées (« folded stacks ») : à passer à flamegraph.pl,
+    inferno ou speedscope.
+    """
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profil non trouvé")
+    return PlainTextResponse(
+        profile["folded"],
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
@@ -6,18 +6,19 @@ from fastapi import APIRouter, Depends, HTTPException, status, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from jose import JWTError
 
 from app.models.user import UserCreate, UserPublic
-from app.crud.user import get_user_by_email, create_user as crud_create_user, delete_user_by_id
+from app.crud.user import get_user_by_email, create_user as crud_create_user
 from app.services.auth import (
     hash_password,
     verify_password,
     create_access_token,
     decode_access_token,
+    InvalidTokenError,
 )
 from app.core.config import settings
 from app.db.session import AsyncSessionLocal
+from app.services.account_deletion import request_deletions
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -47,7 +48,7 @@ async def get_current_user(
                 detail="Token invalide",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token invalide",
@@ -138,7 +139,7 @@ async def read_users_me(
 
 @router.delete(
     "/me",
-    status_code=status.HTTP_204_NO_CONTENT,
+    status_code=status.HTTP_202_ACCEPTED,
     summary="Supprimer le compte de l’utilisateur connecté"
 )
 async def delete_current_user(
@@ -146,8 +147,9 @@ async def delete_current_user(
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Supprime d'abord toutes les sessions puis l’utilisateur.
+    Programme la suppression du compte : la demande est enregistrée avant la
+    réponse, puis sessions par lots et l’utilisateur (les fichiers sont
+    supprimés en arrière-plan).
     """
-    # Ici on délègue au CRUD :
-    await delete_user_by_id(db, int(current_user.id))
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    await request_deletions(db, [int(current_user.id)])
+    return Response(status_code=status.HTTP_202_ACCEPTED)
\ No newline at end of file
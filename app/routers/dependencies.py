@@ -1,8 +1,25 @@
 # app/routers/dependencies.py
-from fastapi import Depends, HTTPException, status
+import hmac
+
+from fastapi import Depends, HTTPException, status, Path
 from datetime import datetime
-from app.routers.auth import get_current_user  # votre dépendance existante
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.routers.auth import get_current_user, get_db, oauth2_scheme  # votre dépendance existante
+from app.crud.session import user_has_image
+from app.services.storage import key_to_url
 from app.models.user import UserPublic
+from app.core.config import settings
+from app.services.admission import (
+    AdmissionController, AdmissionRejected, PRIORITY_FREE, PRIORITY_PREMIUM
+)
+
+analysis_admission = AdmissionController(
+    "analysis",
+    limit=settings.ANALYSIS_CONCURRENCY_LIMIT,
+    max_queue=settings.ANALYSIS_QUEUE_DEPTH,
+    queue_timeout=settings.ANALYSIS_QUEUE_TIMEOUT,
+    retry_after=settings.ANALYSIS_RETRY_AFTER,
+)
 
 async def subscription_required(
     current_user = Depends(get_current_user)
@@ -12,4 +29,61 @@ async def subscription_required(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Accès réservé aux utilisateurs Premium"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def metrics_access(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> None:
+    """
+    Accès à /metrics : jeton Bearer METRICS_TOKEN (scraper Prometheus) ou
+    JWT d'un administrateur.
+    """
+    if settings.METRICS_TOKEN and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return
+    current_user = await get_current_user(token, db)
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès réservé à l’administrateur")
+
+async def analysis_slot(
+    current_user = Depends(get_current_user)
+):
+    """
+    Réserve une place d'analyse pour toute la durée de la requête.
+    Les premium passent avant les gratuits ; 429 + Retry-After si la file est pleine.
+
+    FastAPI résout les dépendances après la lecture du corps multipart :
+    l'upload est déjà reçu (en mémoire ou fichier temporaire) quand la place
+    est demandée. L'admission borne la conversion, l'inférence et l'écriture,
+    pas la bande passante des uploads, à limiter en amont (taille max du
+    corps et délais de lecture du proxy).
+    """
+    priority = PRIORITY_PREMIUM if getattr(current_user, "is_premium", False) else PRIORITY_FREE
+    try:
+        await analysis_admission.acquire(priority)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Trop d'analyses en cours, réessayez dans quelques secondes.",
+            headers={"Retry-After": str(int(e.retry_after))}
+        )
+    try:
+        yield
+    finally:
+        analysis_admission.release()
+
+async def owned_image_key(
+    key: str = Path(..., description="Clé de l'image (chemin après /images/)"),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+) -> str:
+    """
+    Clé d'une image que l'utilisateur peut lire : celle d'une de ses analyses
+    (toutes pour un admin). 404 sinon, sans révéler si l'image existe.
+    """
+    not_found = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image non trouvée")
+    if key.startswith("/") or ".." in key.split("/"):
+        raise not_found
+    if not current_user.is_admin and not await user_has_image(db, int(current_user.id), key_to_url(key)):
+        raise not_found
+    return key
@@ -0,0 +1,47 @@
+# app/routers/images.py
+import mimetypes
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import RedirectResponse
+
+from app.core.config import settings
+from app.routers.dependencies import owned_image_key
+from app.services.image_delivery import is_not_modified, not_modified, send_file, strong_etag
+from app.services.storage_backend import LocalStorageBackend, get_storage
+
+router = APIRouter(prefix=settings.IMAGE_URL_PREFIX, tags=["images"])
+
+
+@router.get(
+    "/{key:path}",
+    summary="Image d'une analyse de l'utilisateur (originale ou annotée)"
+)
+async def get_image(
+    request: Request,
+    key: str = Depends(owned_image_key)
+):
+    """
+    Disque local : fichier servi avec ETag fort et cache immuable, ou délégué
+    au serveur frontal (IMAGE_OFFLOAD). Bucket S3 : redirection vers une URL
+    présignée, après le même contrôle d'accès.
+    """
+    etag = strong_etag(key)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    storage = get_storage()
+    if isinstance(storage, LocalStorageBackend):
+        path = storage.path(key)
+        if not await storage.exists(key):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image non trouvée")
+        return send_file(path, storage.root, settings.IMAGE_URL_PREFIX, mimetypes.guess_type(key)[0], etag)
+
+    url = storage.presign_get(key)
+    if url is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image non trouvée")
+    # la redirection ne vaut que tant que l'URL présignée est valide
+    return RedirectResponse(
+        url,
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Cache-Control": f"private, max-age={max(0, settings.S3_PRESIGN_EXPIRES - 60)}"}
+    )
@@ -1,78 +1,231 @@
 # app/routers/skin.py
-import os, traceback, logging
+import asyncio
+import traceback, logging
+from datetime import datetime
 from typing import List, Any, Dict
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, Path
+from pydantic import BaseModel
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Query, Path, Body, Header, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.services.storage import save_image
-from app.services.skin_analyzer import analyze_image
+from app.services.storage import save_image, claim_upload, ensure_blob, upload_key, url_to_key, UPLOAD_KEY_PREFIX
+from app.services.storage_backend import get_storage
+from app.services.skin_analyzer import analyze_image, ensure_inference_available
+from app.services.resilience import CircuitOpenError
+from app.services.image_variants import variant_urls
+from app.services.image_gc import enqueue_deletion
+from app.services.annotation_codec import session_annotations
+from app.services.image_quality import REASONS, check_quality
+from app.services.dedup import compute_dhash, find_recent_duplicate
+from app.services.idempotency import idempotent
+from app.services.export import export_archive
+from app.services.session_writer import write_session
+from app.core.metrics import stage
+from app.core.responses import FastJSONResponse, etag_matches
 from app.models.session import SkinAnalysisResponse
 from app.models.stats import StatsResponse
-from app.models.trend import TrendResponse
+from app.models.trend import TrendResponse, ProgressResponse
+from app.crud.image import acquire_image_refs, release_image_refs
 from app.crud.session import (
-    create_session, get_sessions_for_user, delete_session,
-    get_all_sessions, get_stats, get_trend
+    get_sessions_for_user, delete_session, get_session_by_id,
+    get_all_sessions, get_stats, get_trend, get_progress, get_data_version
 )
 from app.routers.auth import get_current_user, admin_required, get_db
-from app.routers.dependencies import subscription_required
+from app.routers.dependencies import subscription_required, analysis_slot
 
 router = APIRouter(prefix="/skin", tags=["skin"])
 logger = logging.getLogger("skin")
 
 FREE_ANALYSIS_LIMIT = 3
 
-# --- Endpoint gratuit : analyse de base (requiert login) ---
-@router.post(
-    "/analyze",
-    summary="Upload et analyse de l’image de la peau",
-    response_model=SkinAnalysisResponse,
-    dependencies=[Depends(get_current_user)]  # accès gratuit mais login requis
-)
-async def analyze(
-    file: UploadFile = File(...),
-    db: AsyncSession = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    # quota gratuit
-    sessions = await get_sessions_for_user(db, int(current_user.id))
+# vues dérivées des sessions : toujours revalidées (If-None-Match → 304)
+DATA_CACHE_CONTROL = "private, no-cache"
+
+def _session_variants(s) -> Dict[str, Any]:
+    """URLs des miniatures (WebP) de l'image d'origine et de l'image annotée."""
+    return {
+        "image": variant_urls(s.image_url),
+        "annotated": variant_urls(s.annotated_image_url),
+    }
+
+async def _data_etag(request: Request, db: AsyncSession, current_user) -> tuple[str, int, bool]:
+    """
+    (ETag, version, non modifié ?) des vues dérivées des sessions, d'après
+    users.data_version. La version est lue avant les données : une écriture
+    concurrente rend au pire l'ETag plus ancien que le corps, qui sera
+    simplement renvoyé au prochain appel. Les vues calculées sur la matrice
+    en cache reçoivent cette version, pour ne pas servir une matrice plus
+    ancienne (écriture passée par un autre worker) sous un ETag récent.
+    """
+    version = await get_data_version(db, int(current_user.id))
+    etag = f'W/"{current_user.id}-{version}"'
+    return etag, version, etag_matches(request.headers.get("if-none-match"), etag)
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": DATA_CACHE_CONTROL})
+
+def _inference_unavailable(e: CircuitOpenError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Service d'analyse d'images momentanément indisponible, réessayez plus tard.",
+        headers={"Retry-After": str(max(1, int(e.retry_after)))}
+    )
+
+def _fail_fast_if_inference_down() -> None:
+    """Refuse avant l'upload si le disjoncteur d'inférence est ouvert."""
+    try:
+        ensure_inference_available()
+    except CircuitOpenError as e:
+        raise _inference_unavailable(e)
+
+async def _quality_gate(content: bytes) -> None:
+    """Refuse (422) les photos floues, mal exposées ou sans visage, avant stockage et inférence."""
+    if not settings.QUALITY_GATE_ENABLED:
+        return
+    report = await check_quality(content)
+    if not report.ok:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "message": "Photo refusée par le contrôle qualité.",
+                "reasons": [{"code": r, "message": REASONS[r]} for r in report.reasons],
+            }
+        )
+
+class _ReusedAnalysis(Exception):
+    """Upload quasi identique à une analyse récente : on renvoie celle-ci."""
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+
+class _UploadCheck:
+    """
+    Contrôles d'un upload avant stockage (callback `check` du stockage) :
+    qualité, dHash puis recherche d'une analyse récente quasi identique.
+    """
+
+    def __init__(self, db: AsyncSession, current_user):
+        self.db = db
+        self.user_id = int(current_user.id)
+        self.dhash: int | None = None
+
+    async def __call__(self, content: bytes) -> None:
+        await _quality_gate(content)
+        self.dhash = await compute_dhash(content)
+        if self.dhash is None:
+            return
+        session_id = await find_recent_duplicate(self.db, self.user_id, self.dhash)
+        if session_id is None:
+            return
+        s = await get_session_by_id(self.db, session_id)
+        if s is not None and s.user_id == self.user_id:
+            raise _ReusedAnalysis({
+                "session_id": s.id,
+                "image_url": s.image_url,
+                "annotated_image_url": s.annotated_image_url,
+                "scores": s.scores,
+                "annotations": session_annotations(s),
+                "timestamp": s.timestamp.isoformat(),
+                "reused": True,
+            })
+
+async def _store_and_analyze(db: AsyncSession, current_user, store) -> FastJSONResponse:
+    """
+    `store(check)` range l'image (save_image / claim_upload) après `check` ;
+    si une analyse récente quasi identique existe (DEDUP_MODE=reuse), elle est
+    renvoyée sans stockage ni inférence.
+    """
+    check = _UploadCheck(db, current_user)
+    try:
+        content, image_url = await store(check)
+    except _ReusedAnalysis as reused:
+        return FastJSONResponse(reused.payload)
+    return FastJSONResponse(
+        await _analyze_and_record(db, current_user, content, image_url, check.dhash)
+    )
+
+async def _check_free_quota(db: AsyncSession, current_user) -> None:
+    with stage("quota"):
+        sessions = await get_sessions_for_user(db, int(current_user.id))
     if len(sessions) >= FREE_ANALYSIS_LIMIT and not current_user.is_premium:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Limite gratuite ({FREE_ANALYSIS_LIMIT} analyses) atteinte. Passez Premium."
         )
 
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Le fichier doit être une image."
-        )
+async def _hold_original(db: AsyncSession, image_url: str, content: bytes) -> None:
+    """
+    Référence l'original (stored_images) pendant l'analyse ; la session créée
+    la reprend. Si le GC a supprimé le fichier avant le commit, on le réécrit :
+    ensuite il ne le peut plus.
+    """
+    await acquire_image_refs(db, [image_url])
+    await db.commit()
+    await ensure_blob(url_to_key(image_url), content)
+
+async def _release_original(db: AsyncSession, image_url: str) -> None:
+    """Rend la référence de _hold_original quand aucune session ne la reprend."""
+    released = await release_image_refs(db, [image_url])
+    await db.commit()
+    enqueue_deletion(released)
 
-    # Sauvegarde et analyse
-    file_path, image_url = await save_image(file)
-    logger.info(f"Lancement de l’analyse IA pour fichier {file_path!r}")
+async def _analyze_and_record(
+    db: AsyncSession,
+    current_user,
+    content: bytes,
+    image_url: str,
+    image_dhash: int | None = None
+) -> Dict[str, Any]:
+    """
+    Analyse IA d'une image déjà stockée puis enregistrement de la session.
+    Commun à tous les endpoints d'analyse ; le résultat est renvoyé tel quel
+    (FastJSONResponse), sans re-validation par SkinAnalysisResponse.
+    """
+    logger.info(f"Lancement de l’analyse IA pour {image_url!r}")
+    # l'original est référencé pendant l'analyse : une analyse échouée du même
+    # contenu ne peut pas le faire supprimer par le GC
+    await _hold_original(db, image_url, content)
     try:
-        analysis = await analyze_image(file_path)
+        analysis = await analyze_image(content, image_url.rsplit("/", 1)[-1])
         scores = analysis["scores"]
         annotations = analysis["annotations"]
-        annotated_path = analysis["annotated_path"]
-        annotated_filename = os.path.basename(annotated_path)
-        annotated_image_url = f"{settings.IMAGE_URL_PREFIX}/{annotated_filename}"
+        annotated_image_url = analysis["annotated_url"]
+    except CircuitOpenError as e:
+        await _release_original(db, image_url)
+        raise _inference_unavailable(e)
     except Exception as e:
         logger.error(f"Analyse IA échouée : {e}\n{traceback.format_exc()}")
+        await _release_original(db, image_url)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Erreur du service d'analyse d'images : {e}"
         )
+    except BaseException:
+        # requête annulée pendant l'inférence
+        await asyncio.shield(_release_original(db, image_url))
+        raise
 
-    session_record = await create_session(
-        db=db,
-        user_id=int(current_user.id),
-        image_url=image_url,
-        scores=scores,
-        annotations=annotations,
-        annotated_image_url=annotated_image_url
-    )
+    try:
+        with stage("session_commit"):
+            session_record = await write_session(
+                db=db,
+                user_id=int(current_user.id),
+                image_url=image_url,
+                scores=scores,
+                annotations=annotations,
+                annotated_image_url=annotated_image_url,
+                is_premium=bool(current_user.is_premium),
+                image_dhash=image_dhash
+            )
+    except Exception:
+        # aucune session : ni l'original ni l'image annotée ne sont repris
+        await db.rollback()
+        await _release_original(db, image_url)
+        enqueue_deletion([url_to_key(annotated_image_url)])
+        raise
+    # image annotée supprimée par le GC avant le commit de sa référence
+    await ensure_blob(url_to_key(annotated_image_url), analysis["annotated_image"])
 
     return {
         "session_id": session_record.id,
@@ -83,53 +236,124 @@ async def analyze(
         "timestamp": session_record.timestamp.isoformat()
     }
 
+# --- Endpoint gratuit : analyse de base (requiert login) ---
+@router.post(
+    "/analyze",
+    summary="Upload et analyse de l’image de la peau",
+    response_model=SkinAnalysisResponse,
+    dependencies=[Depends(get_current_user), Depends(analysis_slot)]  # accès gratuit mais login requis
+)
+async def analyze(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    async def run():
+        # quota gratuit
+        await _check_free_quota(db, current_user)
+        _fail_fast_if_inference_down()
+
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Le fichier doit être une image."
+            )
+
+        # Sauvegarde et analyse
+        return await _store_and_analyze(db, current_user, lambda check: save_image(file, check=check))
+
+    # une nouvelle tentative avec la même clé rejoue la réponse (quota non consommé)
+    return await idempotent(int(current_user.id), idempotency_key, "POST /skin/analyze", run)
+
 # --- Endpoint premium : accès illimité aux analyses (abonnement requis) ---
 @router.post(
     "/analyze-premium",
     summary="Analyse illimitée (abonnés premium)",
     response_model=SkinAnalysisResponse,
-    dependencies=[Depends(subscription_required)]  # accès premium uniquement
+    dependencies=[Depends(subscription_required), Depends(analysis_slot)]  # accès premium uniquement
 )
 async def analyze_premium(
     file: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
-    current_user = Depends(subscription_required)
+    current_user = Depends(subscription_required),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     # Même logique que /analyze, mais accessible uniquement aux abonnés
-    if not file.content_type.startswith("image/"):
+    async def run():
+        _fail_fast_if_inference_down()
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Le fichier doit être une image."
+            )
+        return await _store_and_analyze(db, current_user, lambda check: save_image(file, check=check))
+
+    return await idempotent(int(current_user.id), idempotency_key, "POST /skin/analyze-premium", run)
+
+class UploadUrlRequest(BaseModel):
+    content_type: str
+    extension: str = "jpg"
+
+class AnalyzeObjectRequest(BaseModel):
+    key: str
+
+# --- Upload direct dans le bucket (backend S3) ---
+@router.post(
+    "/upload-url",
+    summary="URL présignée pour envoyer l'image directement dans le bucket",
+    dependencies=[Depends(get_current_user)]
+)
+async def create_upload_url(
+    body: UploadUrlRequest = Body(...),
+    current_user = Depends(get_current_user)
+):
+    if not body.content_type.startswith("image/"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Le fichier doit être une image."
         )
-    file_path, image_url = await save_image(file)
-    try:
-        analysis = await analyze_image(file_path)
-        scores = analysis["scores"]
-        annotations = analysis["annotations"]
-        annotated_path = analysis["annotated_path"]
-        annotated_filename = os.path.basename(annotated_path)
-        annotated_image_url = f"{settings.IMAGE_URL_PREFIX}/{annotated_filename}"
-    except Exception as e:
+    extension = body.extension.lower().lstrip(".")
+    if not extension.isalnum():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Extension invalide")
+    key = upload_key(int(current_user.id), extension)
+    presigned = get_storage().presign_put(key, body.content_type)
+    if presigned is None:
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Erreur du service d'analyse d'images : {e}"
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Upload direct non supporté par ce backend de stockage"
         )
-    session_record = await create_session(
-        db=db,
-        user_id=int(current_user.id),
-        image_url=image_url,
-        scores=scores,
-        annotations=annotations,
-        annotated_image_url=annotated_image_url
-    )
-    return {
-        "session_id": session_record.id,
-        "image_url": image_url,
-        "annotated_image_url": annotated_image_url,
-        "scores": scores,
-        "annotations": annotations,
-        "timestamp": session_record.timestamp.isoformat()
-    }
+    return {"key": key, **presigned}
+
+@router.post(
+    "/analyze-object",
+    summary="Analyse d'une image déjà envoyée dans le bucket (via /skin/upload-url)",
+    response_model=SkinAnalysisResponse,
+    dependencies=[Depends(get_current_user), Depends(analysis_slot)]
+)
+async def analyze_object(
+    body: AnalyzeObjectRequest = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    # un utilisateur ne peut analyser que ses propres uploads
+    if not body.key.startswith(f"{UPLOAD_KEY_PREFIX}/{current_user.id}/") or ".." in body.key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload non trouvé")
+
+    async def store(check):
+        try:
+            return await claim_upload(body.key, check=check)
+        except FileNotFoundError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload non trouvé")
+
+    async def run():
+        # Mêmes règles de quota que /analyze (illimité pour les premium)
+        await _check_free_quota(db, current_user)
+        _fail_fast_if_inference_down()
+        return await _store_and_analyze(db, current_user, store)
+
+    return await idempotent(int(current_user.id), idempotency_key, "POST /skin/analyze-object", run)
 
 # --- Route ADMIN : historique global (admin requis) ---
 @router.get(
@@ -142,11 +366,13 @@ async def admin_history(
     db: AsyncSession = Depends(get_db)
 ):
     sessions = await get_all_sessions(db)
-    return [
+    # sortie ORM de confiance : pas de re-validation par response_model
+    return FastJSONResponse([
         {"session_id": s.id, "user_id": s.user_id, "image_url": s.image_url,
-         "annotations": s.annotations, "annotated_image_url": s.annotated_image_url,
+         "annotations": session_annotations(s), "annotated_image_url": s.annotated_image_url,
+         "variants": _session_variants(s),
          "scores": s.scores, "timestamp": s.timestamp} for s in sessions
-    ]
+    ])
 
 # --- Historique utilisateur (login requis) ---
 @router.get(
@@ -156,17 +382,21 @@ async def admin_history(
     dependencies=[Depends(get_current_user)]
 )
 async def history(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
+    etag, version, not_modified = await _data_etag(request, db, current_user)
+    if not_modified:
+        return _not_modified(etag)
     sessions = await get_sessions_for_user(db, int(current_user.id), skip, limit)
-    return [
-        {"session_id": s.id, "image_url": s.image_url, "annotations": s.annotations,
-         "annotated_image_url": s.annotated_image_url, "scores": s.scores,
-         "timestamp": s.timestamp} for s in sessions
-    ]
+    return FastJSONResponse([
+        {"session_id": s.id, "image_url": s.image_url, "annotations": session_annotations(s),
+         "annotated_image_url": s.annotated_image_url, "variants": _session_variants(s),
+         "scores": s.scores, "timestamp": s.timestamp} for s in sessions
+    ], headers={"ETag": etag, "Cache-Control": DATA_CACHE_CONTROL})
 
 # --- Supprimer une analyse (login requis) ---
 @router.delete(
@@ -180,11 +410,11 @@ async def delete_history_item(
     db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    from app.crud.session import get_session_by_id
     session_record = await get_session_by_id(db, session_id)
     if not session_record or session_record.user_id != int(current_user.id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session non trouvée")
-    await delete_session(db, session_id)
+    released = await delete_session(db, session_id)
+    enqueue_deletion(released)
     return
 
 # --- Statistiques utilisateur (login requis) ---
@@ -195,10 +425,16 @@ async def delete_history_item(
     dependencies=[Depends(get_current_user)]
 )
 async def stats(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    return await get_stats(db, int(current_user.id))
+    etag, version, not_modified = await _data_etag(request, db, current_user)
+    if not_modified:
+        return _not_modified(etag)
+    response.headers.update({"ETag": etag, "Cache-Control": DATA_CACHE_CONTROL})
+    return await get_stats(db, int(current_user.id), version)
 
 # --- Tendance utilisateur (login requis) ---
 @router.get(
@@ -208,9 +444,51 @@ async def stats(
     dependencies=[Depends(get_current_user)]
 )
 async def trend(
+    request: Request,
+    response: Response,
     period: str = Query("month", regex="^(month|week)$"),
     db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    data = await get_trend(db, int(current_user.id), period)
+    etag, version, not_modified = await _data_etag(request, db, current_user)
+    if not_modified:
+        return _not_modified(etag)
+    response.headers.update({"ETag": etag, "Cache-Control": DATA_CACHE_CONTROL})
+    data = await get_trend(db, int(current_user.id), period, version)
     return {"trend": data}
+
+# --- Progression utilisateur (login requis) ---
+@router.get(
+    "/progress",
+    response_model=ProgressResponse,
+    summary="Moyennes glissantes et écarts d'une analyse à l'autre",
+    dependencies=[Depends(get_current_user)]
+)
+async def progress(
+    request: Request,
+    response: Response,
+    window: int = Query(3, ge=1, le=50),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    etag, version, not_modified = await _data_etag(request, db, current_user)
+    if not_modified:
+        return _not_modified(etag)
+    response.headers.update({"ETag": etag, "Cache-Control": DATA_CACHE_CONTROL})
+    return await get_progress(db, int(current_user.id), window, version)
+
+# --- Export des données utilisateur (login requis) ---
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    summary="Archive ZIP de l'historique (sessions.ndjson) et des images, envoyée en flux",
+    responses={200: {"content": {"application/zip": {}}}}
+)
+async def export(current_user = Depends(get_current_user)):
+    # l'archive est construite pendant l'envoi : pas de Content-Length
+    filename = f"skincoach-export-{datetime.utcnow():%Y%m%d}.zip"
+    return StreamingResponse(
+        export_archive(int(current_user.id)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
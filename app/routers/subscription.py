@@ -1,10 +1,14 @@
 # app/routers/subscription.py
 from typing import Any
+from datetime import datetime
 from pydantic import BaseModel
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.routers.auth import get_current_user, get_db, UserPublic, admin_required
 from app.crud.user import update_user_is_premium
+from app.services.entitlements import validate_receipt
+from app.services.idempotency import idempotent
+from app.core.responses import FastJSONResponse
 
 router = APIRouter(prefix="/subscription", tags=["subscription"])
 
@@ -46,15 +50,32 @@ async def validate_subscription(
     body: ValidateRequest = Body(...),
     db: AsyncSession = Depends(get_db),
     current_user: UserPublic = Depends(get_current_user),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """
     Valide un achat (receipt + platform JSON dans le body)
-    et bascule l’utilisateur en Premium.
+    et bascule l’utilisateur en Premium jusqu'à l'expiration du droit.
+    Un reçu déjà vérifié récemment n'est pas renvoyé au store ; une nouvelle
+    tentative avec la même Idempotency-Key rejoue la réponse.
     """
-    await update_user_is_premium(db, int(current_user.id), True)
-    return UserPublic(
-        id=current_user.id,
-        email=current_user.email,
-        is_admin=current_user.is_admin,
-        is_premium=True
-    )
\ No newline at end of file
+    async def run():
+        try:
+            expires_at, _ = await validate_receipt(db, int(current_user.id), body.platform, body.receipt)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if expires_at <= datetime.utcnow():
+            # droit enregistré mais expiré : pas de premium
+            await update_user_is_premium(db, int(current_user.id), False, from_receipt=True)
+            raise HTTPException(
+                status_code=status.HTTP_402_PAYMENT_REQUIRED,
+                detail="Abonnement expiré"
+            )
+        await update_user_is_premium(db, int(current_user.id), True, from_receipt=True)
+        return FastJSONResponse(UserPublic(
+            id=current_user.id,
+            email=current_user.email,
+            is_admin=current_user.is_admin,
+            is_premium=True
+        ))
+
+    return await idempotent(int(current_user.id), idempotency_key, "POST /subscription/validate", run)
@@ -0,0 +1,38 @@
+# app/routers/variants.py
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Path
+
+from app.core.config import settings
+from app.routers.dependencies import owned_image_key
+from app.services.image_delivery import is_not_modified, not_modified, send_file, strong_etag
+from app.services.image_variants import VARIANT_PRESETS, VARIANT_FORMATS, get_variant
+
+router = APIRouter(prefix=settings.IMAGE_VARIANT_URL_PREFIX, tags=["images"])
+
+
+@router.get(
+    "/{preset}/{fmt}/{key:path}",
+    summary="Variante redimensionnée d'une image (générée au premier appel puis servie depuis le cache)"
+)
+async def image_variant(
+    request: Request,
+    preset: str = Path(..., description=f"Une de : {', '.join(VARIANT_PRESETS)}"),
+    fmt: str = Path(..., description=f"Une de : {', '.join(VARIANT_FORMATS)}"),
+    key: str = Depends(owned_image_key)
+):
+    if preset not in VARIANT_PRESETS or fmt not in VARIANT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variante inconnue")
+
+    # Les sources sont immuables (clé de contenu ou uuid) : la variante aussi.
+    etag = strong_etag(key, preset, fmt)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    try:
+        path = await get_variant(key, preset, fmt)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image non trouvée")
+
+    return send_file(
+        path, settings.IMAGE_VARIANT_DIR, settings.IMAGE_VARIANT_URL_PREFIX,
+        VARIANT_FORMATS[fmt][1], etag
+    )
@@ -0,0 +1,109 @@
+# app/services/account_deletion.py
+"""
+Suppression de comptes en arrière-plan : les sessions sont supprimées par
+lots de ACCOUNT_DELETE_BATCH_SIZE (un commit par lot, donc des verrous courts
+sur `sessions`), les fichiers libérés partent au GC au fil de l'eau, puis
+l'utilisateur est supprimé.
+
+Les demandes sont durables (table pending_deletions, commitée avant la
+réponse 202) : un worker par process les prend sous bail, et celles qu'un
+arrêt ou une erreur a interrompues sont reprises au démarrage ou à
+l'expiration du bail. Chaque étape peut être rejouée sans dommage.
+"""
+import asyncio
+import logging
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.crud.user import (
+    claim_pending_deletion, delete_user_by_id, delete_user_sessions_batch, schedule_deletions
+)
+from app.db.session import AsyncSessionLocal
+from app.services.image_gc import enqueue_deletion
+
+logger = logging.getLogger("account_deletion")
+
+ACCOUNTS_DELETED = Counter(
+    "skincoach_accounts_deleted_total",
+    "Comptes supprimés en arrière-plan, par issue",
+    ("outcome",),
+)
+
+_wakeup: asyncio.Event | None = None
+_task: asyncio.Task | None = None
+
+
+async def delete_account(user_id: int) -> int:
+    """Supprime le compte par lots ; retourne le nombre de sessions supprimées."""
+    total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            deleted, released = await delete_user_sessions_batch(
+                db, user_id, settings.ACCOUNT_DELETE_BATCH_SIZE
+            )
+            enqueue_deletion(released)
+            total += deleted
+            if deleted < settings.ACCOUNT_DELETE_BATCH_SIZE:
+                break
+        # dernière transaction : sessions créées entre-temps + utilisateur
+        enqueue_deletion(await delete_user_by_id(db, user_id))
+    return total
+
+
+async def request_deletions(db: AsyncSession, user_ids: List[int]) -> int:
+    """Enregistre les demandes (commit) puis réveille le worker ; retourne le nombre ajouté."""
+    added = await schedule_deletions(db, user_ids)
+    if _wakeup is not None:
+        _wakeup.set()
+    return added
+
+
+async def _process_next() -> bool:
+    """Traite une demande ; False s'il n'y en a aucune de disponible."""
+    async with AsyncSessionLocal() as db:
+        user_id = await claim_pending_deletion(db, settings.ACCOUNT_DELETE_LEASE_SECONDS)
+    if user_id is None:
+        return False
+    try:
+        sessions = await delete_account(user_id)
+    except Exception:
+        # la demande reste en base : reprise à l'expiration du bail
+        ACCOUNTS_DELETED.inc(outcome="error")
+        logger.exception("Échec de la suppression du compte %s", user_id)
+        return True
+    ACCOUNTS_DELETED.inc(outcome="ok")
+    logger.info("Compte %s supprimé (%d sessions)", user_id, sessions)
+    return True
+
+
+async def _deletion_worker() -> None:
+    while True:
+        try:
+            while await _process_next():
+                pass
+        except Exception:
+            logger.exception("Échec de la lecture des suppressions de comptes en attente")
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.ACCOUNT_DELETE_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_account_deletion() -> None:
+    """À appeler au démarrage de l'application (lifespan) : reprend les demandes en attente."""
+    global _task, _wakeup
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_deletion_worker())
+
+
+async def stop_account_deletion() -> None:
+    global _task, _wakeup
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    _wakeup = None
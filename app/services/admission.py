@@ -0,0 +1,114 @@
+# app/services/admission.py
+"""
+Contrôle d'admission des analyses : au plus `limit` analyses en cours par
+worker, les suivantes attendent dans une file bornée ordonnée par priorité
+(premium avant gratuit). File pleine → refus immédiat (429 côté route).
+"""
+import asyncio
+import heapq
+import itertools
+from typing import List, Tuple
+
+from app.core.metrics import Counter, Gauge
+
+PRIORITY_PREMIUM = 0
+PRIORITY_FREE = 1
+_PRIORITY_NAMES = {PRIORITY_PREMIUM: "premium", PRIORITY_FREE: "free"}
+
+ADMISSION_ACTIVE = Gauge(
+    "skincoach_admission_active", "Analyses en cours", ("name",)
+)
+ADMISSION_QUEUED = Gauge(
+    "skincoach_admission_queued", "Analyses en attente", ("name", "priority")
+)
+ADMISSION_REJECTED = Counter(
+    "skincoach_admission_rejected_total",
+    "Analyses refusées (file pleine, évincées ou attente trop longue)",
+    ("name", "priority", "reason"),
+)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Trop d'analyses en cours")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float, retry_after: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._active = 0
+        self._seq = itertools.count()
+        # tas de (priorité, ordre d'arrivée, future)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+
+    def _update_gauges(self) -> None:
+        ADMISSION_ACTIVE.set(self._active, name=self.name)
+        for priority, label in _PRIORITY_NAMES.items():
+            queued = sum(1 for p, _, f in self._waiters if p == priority and not f.done())
+            ADMISSION_QUEUED.set(queued, name=self.name, priority=label)
+
+    def _reject(self, priority: int, reason: str) -> AdmissionRejected:
+        ADMISSION_REJECTED.inc(name=self.name, priority=_PRIORITY_NAMES[priority], reason=reason)
+        return AdmissionRejected(self.retry_after)
+
+    def _make_room(self, priority: int) -> bool:
+        """File pleine : un premium peut évincer le gratuit arrivé le plus tard."""
+        victims = [w for w in self._waiters if w[0] > priority and not w[2].done()]
+        if not victims:
+            return False
+        victim = max(victims)
+        self._waiters.remove(victim)
+        heapq.heapify(self._waiters)
+        victim[2].set_exception(self._reject(victim[0], "evicted"))
+        return True
+
+    async def acquire(self, priority: int) -> None:
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self._update_gauges()
+            return
+        if len(self._waiters) >= self.max_queue and not self._make_room(priority):
+            raise self._reject(priority, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                return  # la place est arrivée au dernier moment
+            self._discard(entry)
+            raise self._reject(priority, "timeout")
+        except asyncio.CancelledError:
+            # client parti : rendre la place si elle venait d'être accordée
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            else:
+                self._discard(entry)
+            raise
+
+    def _discard(self, entry: Tuple[int, int, asyncio.Future]) -> None:
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        if not entry[2].done():
+            entry[2].cancel()
+        self._update_gauges()
+
+    def release(self) -> None:
+        # la place passe directement au prochain en attente (priorité d'abord)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                self._update_gauges()
+                return
+        self._active -= 1
+        self._update_gauges()
@@ -0,0 +1,192 @@
+# app/services/analytics.py
+"""
+Analytique par utilisateur calculée en NumPy : les sessions d'un utilisateur
+sont chargées une fois (une seule requête) en une matrice colonnes
+(n_sessions × ALL_CLASSES) triée par date, puis gardée en cache.
+Statistiques, tendances, moyennes glissantes et écarts d'une session à
+l'autre sont ensuite calculés sans nouvelle requête.
+
+Le cache est propre au worker : il est invalidé à chaque ajout/suppression
+de session dans ce worker. Chaque matrice garde la users.data_version lue
+avant son chargement ; un appelant qui passe la version courante recharge
+une matrice plus ancienne (écriture passée par un autre worker). Sans
+version, ANALYTICS_CACHE_TTL borne ce retard.
+"""
+import time
+from calendar import month_abbr
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.db.models import Session as DBSession
+from app.services.skin_analyzer import ALL_CLASSES
+
+ANALYTICS_CACHE = Counter(
+    "skincoach_analytics_cache_total",
+    "Accès au cache des matrices de scores (hit, miss)",
+    ("result",),
+)
+
+
+@dataclass
+class ScoreMatrix:
+    timestamps: Any   # np.ndarray datetime64[us], trié croissant
+    scores: Any       # np.ndarray float64, (n_sessions, len(ALL_CLASSES))
+    loaded_at: float
+    data_version: int | None = None   # users.data_version lue avant le chargement
+
+    @property
+    def size(self) -> int:
+        return len(self.timestamps)
+
+
+_cache: "OrderedDict[int, ScoreMatrix]" = OrderedDict()
+# chargements en cours : un chargement invalidé entre-temps n'est pas mis en cache
+_loading: Dict[int, object] = {}
+
+
+def invalidate_user(user_id: int) -> None:
+    _cache.pop(user_id, None)
+    _loading.pop(user_id, None)
+
+
+def _is_fresh(cached: ScoreMatrix, data_version: int | None) -> bool:
+    if data_version is not None:
+        return cached.data_version == data_version
+    return time.monotonic() - cached.loaded_at < settings.ANALYTICS_CACHE_TTL
+
+
+async def load_matrix(db: AsyncSession, user_id: int, data_version: int | None = None) -> ScoreMatrix:
+    """
+    Matrice des scores de l'utilisateur, depuis le cache si elle correspond à
+    `data_version` (users.data_version, lue par l'appelant avant cet appel).
+    """
+    cached = _cache.get(user_id)
+    if cached is not None and _is_fresh(cached, data_version):
+        _cache.move_to_end(user_id)
+        ANALYTICS_CACHE.inc(result="hit")
+        return cached
+    ANALYTICS_CACHE.inc(result="miss")
+
+    token = object()
+    _loading[user_id] = token
+    result = await db.execute(
+        select(DBSession.timestamp, DBSession.scores)
+        .where(DBSession.user_id == user_id)
+        .order_by(DBSession.timestamp)
+    )
+    rows = result.all()
+
+    import numpy as np
+    matrix = ScoreMatrix(
+        timestamps=np.array([ts for ts, _ in rows], dtype="datetime64[us]"),
+        scores=np.array(
+            [[float(scores.get(label) or 0.0) for label in ALL_CLASSES] for _, scores in rows],
+            dtype=np.float64,
+        ).reshape(len(rows), len(ALL_CLASSES)),
+        loaded_at=time.monotonic(),
+        data_version=data_version,
+    )
+    if _loading.get(user_id) is token:
+        del _loading[user_id]
+        _cache[user_id] = matrix
+        while len(_cache) > settings.ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return matrix
+
+
+def _by_label(values) -> Dict[str, float]:
+    return dict(zip(ALL_CLASSES, values.tolist()))
+
+
+def compute_stats(m: ScoreMatrix) -> dict:
+    """Nombre de sessions où chaque label est détecté (score > 0)."""
+    total = m.size
+    counts = (m.scores > 0).sum(axis=0).tolist()
+    return {
+        "total_sessions": total,
+        "by_label": [
+            {
+                "label": label,
+                "count": count,
+                "percent": round(count / total * 100, 1) if total > 0 else 0.0,
+            }
+            for label, count in zip(ALL_CLASSES, counts)
+        ],
+    }
+
+
+def _iso_weeks(mondays) -> List[str]:
+    """Libellés "IYYY-IW" (comme to_char Postgres) à partir des lundis."""
+    import numpy as np
+
+    thursdays = mondays + np.timedelta64(3, "D")   # l'année ISO est celle du jeudi
+    years = thursdays.astype("datetime64[Y]")
+    numbers = (thursdays - years).astype(np.int64) // 7 + 1
+    return [f"{y}-{n:02d}" for y, n in zip((years.astype(np.int64) + 1970).tolist(), numbers.tolist())]
+
+
+def compute_trend(m: ScoreMatrix, period: str) -> List[Dict]:
+    """
+    Moyennes des scores par mois ("Mar 2025") ou par semaine ISO ("2025-14").
+    Les sessions étant triées, chaque période est un bloc contigu de lignes.
+    """
+    if m.size == 0:
+        return []
+    import numpy as np
+
+    days = m.timestamps.astype("datetime64[D]")
+    if period == "week":
+        # 1970-01-01 est un jeudi : (jours + 3) % 7 = 0 le lundi
+        keys = days - (days.astype(np.int64) + 3) % 7
+    else:
+        keys = m.timestamps.astype("datetime64[M]")
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, m.size])
+    means = np.add.reduceat(m.scores, starts, axis=0) / counts[:, None]
+
+    first_months = m.timestamps[starts].astype("datetime64[M]").astype(np.int64)
+    months = [f"{month_abbr[mo % 12 + 1]} {mo // 12 + 1970}" for mo in first_months.tolist()]
+    weeks = _iso_weeks(keys[starts]) if period == "week" else [None] * len(starts)
+    return [
+        {"month": month, "week": week, "count": count, "averages": _by_label(avg)}
+        for month, week, count, avg in zip(months, weeks, counts.tolist(), means)
+    ]
+
+
+def compute_progress(m: ScoreMatrix, window: int) -> dict:
+    """
+    Pour chaque session : scores, moyenne glissante sur les `window`
+    dernières sessions et écart avec la session précédente.
+    """
+    if m.size == 0:
+        return {"window": window, "points": [], "overall_delta": None}
+    import numpy as np
+
+    n = m.size
+    cumulative = np.vstack([np.zeros((1, m.scores.shape[1])), np.cumsum(m.scores, axis=0)])
+    ends = np.arange(1, n + 1)
+    begins = np.maximum(ends - window, 0)
+    moving = (cumulative[ends] - cumulative[begins]) / (ends - begins)[:, None]
+    deltas = np.diff(m.scores, axis=0)
+
+    timestamps = m.timestamps.astype("datetime64[s]").tolist()
+    points = [
+        {
+            "timestamp": timestamps[i].isoformat(),
+            "scores": _by_label(m.scores[i]),
+            "moving_average": _by_label(moving[i]),
+            "delta": _by_label(deltas[i - 1]) if i > 0 else None,
+        }
+        for i in range(n)
+    ]
+    return {
+        "window": window,
+        "points": points,
+        "overall_delta": _by_label(m.scores[-1] - m.scores[0]),
+    }
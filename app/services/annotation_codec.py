@@ -0,0 +1,49 @@
+# app/services/annotation_codec.py
+"""
+Encodage compact des annotations (colonne sessions.annotations_packed) :
+un octet de version puis, par boîte, x/y/width/height en float32 et
+l'indice du label dans ALL_CLASSES en uint8 (17 octets contre ~80 en JSONB).
+
+ALL_CLASSES ne doit donc qu'être complétée en fin de liste : l'indice d'un
+label déjà stocké ne peut plus changer.
+"""
+import struct
+from typing import Dict, List
+
+from app.services.skin_analyzer import ALL_CLASSES
+
+FORMAT_VERSION = 1
+_BOX = struct.Struct("<4fB")
+_LABEL_IDS = {label: i for i, label in enumerate(ALL_CLASSES)}
+
+
+def pack_annotations(annotations: List[Dict]) -> bytes | None:
+    """
+    Retourne la forme compacte, ou None si une annotation n'est pas
+    représentable (label inconnu) : elle reste alors stockée en JSONB.
+    """
+    out = bytearray([FORMAT_VERSION])
+    for ann in annotations:
+        label_id = _LABEL_IDS.get(ann["label"])
+        if label_id is None:
+            return None
+        out += _BOX.pack(ann["x"], ann["y"], ann["width"], ann["height"], label_id)
+    return bytes(out)
+
+
+def unpack_annotations(data: bytes) -> List[Dict]:
+    if not data or data[0] != FORMAT_VERSION:
+        raise ValueError("Format d'annotations compact inconnu")
+    return [
+        # coordonnées normalisées (0-1) : 6 décimales masquent le bruit du float32
+        {"x": round(x, 6), "y": round(y, 6), "width": round(w, 6), "height": round(h, 6),
+         "label": ALL_CLASSES[label_id]}
+        for x, y, w, h, label_id in _BOX.iter_unpack(memoryview(data)[1:])
+    ]
+
+
+def session_annotations(s) -> List[Dict]:
+    """Annotations d'une session, quel que soit leur format de stockage."""
+    if s.annotations_packed is not None:
+        return unpack_annotations(s.annotations_packed)
+    return s.annotations or []
@@ -0,0 +1,160 @@
+# app/services/dedup.py
+"""
+Détection des photos quasi identiques : dHash 64 bits de chaque upload
+(stocké dans sessions.image_dhash) et, par utilisateur, un BK-tree pour
+retrouver les hashs à distance de Hamming <= N sans tout parcourir.
+
+DEDUP_MODE :
+- "off"    : hash stocké, aucune recherche ;
+- "shadow" : recherche et métriques seulement (mesure du taux de doublons) ;
+- "reuse"  : un upload proche d'une analyse récente (DEDUP_MAX_DISTANCE,
+  DEDUP_WINDOW_SECONDS) renvoie le résultat de cette analyse.
+L'index est propre au worker (invalidé à chaque écriture, TTL DEDUP_INDEX_TTL)
+et ne contient que les sessions encore dans la fenêtre pendant sa durée de
+vie : sa taille ne dépend pas de l'historique de l'utilisateur.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import Counter, stage
+from app.db.models import Session as DBSession
+
+DEDUP_LOOKUPS = Counter(
+    "skincoach_dedup_lookups_total",
+    "Recherches de photo quasi identique par mode (shadow, reuse) et résultat (hit, miss)",
+    ("mode", "result"),
+)
+
+_SIGN_BIT = 1 << 63
+
+
+def to_signed(h: int) -> int:
+    """dHash non signé → BIGINT Postgres (signé)."""
+    return h - (1 << 64) if h >= _SIGN_BIT else h
+
+
+def to_unsigned(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def dhash_image(content: bytes) -> Optional[int]:
+    """dHash 64 bits (gradient horizontal sur 9×8 px) ; None si illisible. Synchrone."""
+    import cv2
+    import numpy as np
+
+    gray = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+async def compute_dhash(content: bytes) -> Optional[int]:
+    with stage("dhash"):
+        return await run_in_threadpool(dhash_image, content)
+
+
+class BKTree:
+    """BK-tree sur la distance de Hamming ; chaque nœud garde ses entrées (id, date)."""
+
+    def __init__(self):
+        self._root: Optional[list] = None   # [hash, entrées, enfants {distance: nœud}]
+
+    def add(self, h: int, session_id: int, timestamp: datetime) -> None:
+        if self._root is None:
+            self._root = [h, [(session_id, timestamp)], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append((session_id, timestamp))
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [(session_id, timestamp)], {}]
+                return
+            node = child
+
+    def search(self, h: int, max_distance: int) -> List[Tuple[int, int, datetime]]:
+        """Entrées (distance, session_id, date) à distance <= max_distance."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance:
+                found.extend((d, sid, ts) for sid, ts in node[1])
+            # inégalité triangulaire : seuls ces sous-arbres peuvent contenir un résultat
+            for edge, child in node[2].items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        return found
+
+
+_indexes: "OrderedDict[int, Tuple[BKTree, float]]" = OrderedDict()
+_loading: Dict[int, object] = {}
+
+
+def invalidate_user(user_id: int) -> None:
+    _indexes.pop(user_id, None)
+    _loading.pop(user_id, None)
+
+
+async def _user_index(db: AsyncSession, user_id: int) -> BKTree:
+    cached = _indexes.get(user_id)
+    if cached is not None and time.monotonic() - cached[1] < settings.DEDUP_INDEX_TTL:
+        _indexes.move_to_end(user_id)
+        return cached[0]
+
+    token = object()
+    _loading[user_id] = token
+    # fenêtre + TTL : une session chargée peut encore servir jusqu'à expiration de l'index
+    oldest = datetime.utcnow() - timedelta(seconds=settings.DEDUP_WINDOW_SECONDS + settings.DEDUP_INDEX_TTL)
+    result = await db.execute(
+        select(DBSession.id, DBSession.image_dhash, DBSession.timestamp)
+        .where(
+            DBSession.user_id == user_id,
+            DBSession.image_dhash.is_not(None),
+            DBSession.timestamp >= oldest,
+        )
+    )
+    tree = BKTree()
+    for session_id, h, timestamp in result.all():
+        tree.add(to_unsigned(h), session_id, timestamp)
+    if _loading.get(user_id) is token:
+        del _loading[user_id]
+        _indexes[user_id] = (tree, time.monotonic())
+        while len(_indexes) > settings.DEDUP_INDEX_SIZE:
+            _indexes.popitem(last=False)
+    return tree
+
+
+async def find_recent_duplicate(db: AsyncSession, user_id: int, h: int) -> Optional[int]:
+    """
+    Id de la session récente la plus proche (distance puis date), ou None.
+    En mode "shadow", mesure seulement : renvoie toujours None.
+    """
+    mode = settings.DEDUP_MODE
+    if mode not in ("shadow", "reuse"):
+        return None
+    tree = await _user_index(db, user_id)
+    since = datetime.utcnow() - timedelta(seconds=settings.DEDUP_WINDOW_SECONDS)
+    matches = [m for m in tree.search(h, settings.DEDUP_MAX_DISTANCE) if m[2] >= since]
+    DEDUP_LOOKUPS.inc(mode=mode, result="hit" if matches else "miss")
+    if not matches or mode != "reuse":
+        return None
+    _, session_id, _ = min(matches, key=lambda m: (m[0], -m[2].timestamp()))
+    return session_id
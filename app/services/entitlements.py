@@ -0,0 +1,131 @@
+# app/services/entitlements.py
+"""
+Droits premium issus des achats in-app :
+- /subscription/validate vérifie le reçu auprès du store, sauf si le même
+  reçu a été vérifié il y a moins de ENTITLEMENT_CACHE_SECONDS (table
+  entitlements) ;
+- un balayage périodique repasse en gratuit, par lots, les utilisateurs dont
+  le droit a expiré. Les routes continuent donc de ne lire que users.is_premium.
+  Un statut fixé hors reçu (admin, /subscription/subscribe) efface le droit
+  in-app : le balayage ne le remet pas en cause.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.crud.entitlement import get_entitlement, list_expired_premium_user_ids, upsert_entitlement
+from app.crud.user import set_premium_for_ids
+from app.db.session import AsyncSessionLocal
+from app.services.iap_verifier import verify_apple_receipt, verify_google_receipt
+
+logger = logging.getLogger("entitlements")
+
+RECEIPT_VERIFICATIONS = Counter(
+    "skincoach_receipt_verifications_total",
+    "Validations de reçus in-app (verified = appel au store, cached = résultat réutilisé)",
+    ("platform", "result"),
+)
+PREMIUM_EXPIRED = Counter(
+    "skincoach_premium_expired_total",
+    "Utilisateurs repassés en gratuit par le balayage des droits expirés",
+)
+
+VERIFIERS: Dict[str, Callable[[str], datetime]] = {
+    "apple": verify_apple_receipt,
+    "google": verify_google_receipt,
+}
+_PLATFORM_ALIASES = {"ios": "apple", "android": "google"}
+
+_task: asyncio.Task | None = None
+
+
+def normalize_platform(platform: str) -> str:
+    """Retourne "apple" ou "google" ; ValueError pour une plateforme inconnue."""
+    name = platform.strip().lower()
+    name = _PLATFORM_ALIASES.get(name, name)
+    if name not in VERIFIERS:
+        raise ValueError(f"Plateforme inconnue : {platform}")
+    return name
+
+
+def receipt_hash(receipt: str) -> str:
+    return hashlib.sha256(receipt.encode()).hexdigest()
+
+
+async def validate_receipt(db, user_id: int, platform: str, receipt: str) -> Tuple[datetime, bool]:
+    """
+    Retourne (expires_at, depuis_le_cache). Enregistre le résultat d'une
+    nouvelle vérification sans commit : l'appelant commit avec le statut premium.
+    """
+    platform = normalize_platform(platform)
+    digest = receipt_hash(receipt)
+    now = datetime.utcnow()
+
+    entitlement = await get_entitlement(db, user_id)
+    if (
+        entitlement is not None
+        and entitlement.platform == platform
+        and entitlement.receipt_hash == digest
+        and entitlement.expires_at > now
+        and now - entitlement.verified_at < timedelta(seconds=settings.ENTITLEMENT_CACHE_SECONDS)
+    ):
+        RECEIPT_VERIFICATIONS.inc(platform=platform, result="cached")
+        return entitlement.expires_at, True
+
+    # les vérificateurs des stores sont synchrones (appels HTTP bloquants)
+    expires_at = await run_in_threadpool(VERIFIERS[platform], receipt)
+    RECEIPT_VERIFICATIONS.inc(platform=platform, result="verified")
+    await upsert_entitlement(db, user_id, platform, digest, expires_at, now)
+    return expires_at, False
+
+
+async def sweep_expired(batch_size: int | None = None) -> int:
+    """Repasse en gratuit, par lots, les premium dont le droit a expiré."""
+    batch_size = batch_size or settings.ENTITLEMENT_SWEEP_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.ENTITLEMENT_GRACE_SECONDS)
+    downgraded = 0
+    after_id = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            user_ids: List[int] = await list_expired_premium_user_ids(db, cutoff, after_id, batch_size)
+            if not user_ids:
+                break
+            after_id = user_ids[-1]
+            downgraded += await set_premium_for_ids(
+                db, user_ids, False, from_receipt=True, expired_before=cutoff
+            )
+    if downgraded:
+        PREMIUM_EXPIRED.inc(downgraded)
+    return downgraded
+
+
+async def _periodic_sweeper() -> None:
+    while True:
+        await asyncio.sleep(settings.ENTITLEMENT_SWEEP_INTERVAL_SECONDS)
+        try:
+            downgraded = await sweep_expired()
+            if downgraded:
+                logger.info("Droits premium expirés : %d utilisateur(s) repassé(s) en gratuit", downgraded)
+        except Exception:
+            logger.exception("Échec du balayage des droits premium expirés")
+
+
+def start_entitlement_sweeper() -> None:
+    """À appeler au démarrage de l'application (lifespan)."""
+    global _task
+    if settings.ENTITLEMENT_SWEEP_INTERVAL_SECONDS > 0:
+        _task = asyncio.create_task(_periodic_sweeper())
+
+
+async def stop_entitlement_sweeper() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
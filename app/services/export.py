@@ -0,0 +1,142 @@
+# app/services/export.py
+"""
+Export des données d'un utilisateur : archive ZIP construite à la volée et
+envoyée par morceaux, sans fichier temporaire ni archive en mémoire.
+
+Contenu : les images originales et annotées sous images/<clé>, stockées
+telles quelles (JPEG/PNG déjà compressés) et lues par morceaux depuis le
+backend de stockage, puis sessions.ndjson (une analyse par ligne, compressé).
+Le NDJSON est écrit après les images : une image introuvable y figure à
+null, l'archive ne référence que des entrées qu'elle contient.
+Les sessions sont parcourues deux fois en pagination keyset, une session
+SQL courte par page : la mémoire reste plate quel que soit l'historique.
+"""
+import logging
+import zipfile
+from typing import AsyncIterator, List, Set
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.core.responses import dumps
+from app.crud.session import get_sessions_page
+from app.db.models import Session as DBSession
+from app.db.session import AsyncSessionLocal
+from app.services.annotation_codec import session_annotations
+from app.services.storage import url_to_key
+from app.services.storage_backend import get_storage
+
+logger = logging.getLogger("export")
+
+EXPORTS = Counter(
+    "skincoach_exports_total",
+    "Exports de données utilisateur, par issue",
+    ("outcome",),
+)
+
+
+class _Sink:
+    """
+    Flux d'écriture non positionnable pour zipfile : les octets écrits sont
+    repris par drain(). Sans tell()/seek(), zipfile écrit des descripteurs de
+    données après chaque entrée au lieu de revenir sur l'en-tête.
+    """
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        self.size = 0
+        return data
+
+
+def image_path(key: str) -> str:
+    """Chemin d'une image dans l'archive."""
+    return f"images/{key}"
+
+
+def _session_record(s: DBSession, written: Set[str]) -> dict:
+    """Ligne NDJSON d'une session ; `written` : clés des images présentes dans l'archive."""
+    image_key = url_to_key(s.image_url)
+    annotated_key = url_to_key(s.annotated_image_url)
+    return {
+        "session_id": s.id,
+        "timestamp": s.timestamp,
+        "scores": s.scores,
+        "annotations": session_annotations(s),
+        "image": image_path(image_key) if image_key in written else None,
+        "annotated_image": image_path(annotated_key) if annotated_key in written else None,
+    }
+
+
+async def _iter_pages(user_id: int) -> AsyncIterator[List[DBSession]]:
+    after_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            page = await get_sessions_page(db, user_id, after_id, settings.EXPORT_BATCH_SIZE)
+        if not page:
+            return
+        yield page
+        after_id = page[-1].id
+
+
+async def export_archive(user_id: int) -> AsyncIterator[bytes]:
+    """Octets de l'archive ZIP de l'utilisateur, à passer à une StreamingResponse."""
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+    storage = get_storage()
+    try:
+        # 1) images (une image partagée par plusieurs sessions n'est écrite qu'une fois)
+        seen, written = set(), set()
+        async for page in _iter_pages(user_id):
+            for s in page:
+                for key in (url_to_key(s.image_url), url_to_key(s.annotated_image_url)):
+                    if key is None or key in seen:
+                        continue
+                    seen.add(key)
+                    chunks = storage.iter_chunks(key, settings.EXPORT_CHUNK_SIZE)
+                    try:
+                        first = await anext(chunks, b"")
+                    except FileNotFoundError:
+                        # image supprimée entre-temps (session effacée pendant l'export)
+                        logger.warning("Export %s : image %s introuvable", user_id, key)
+                        continue
+                    info = zipfile.ZipInfo(image_path(key), date_time=s.timestamp.timetuple()[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    with archive.open(info, "w") as entry:
+                        entry.write(first)
+                        async for chunk in chunks:
+                            entry.write(chunk)
+                            if sink.size >= settings.EXPORT_CHUNK_SIZE:
+                                yield sink.drain()
+                    written.add(key)
+                    if sink.size >= settings.EXPORT_CHUNK_SIZE:
+                        yield sink.drain()
+
+        # 2) sessions.ndjson, ligne à ligne
+        info = zipfile.ZipInfo("sessions.ndjson")
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, "w") as entry:
+            async for page in _iter_pages(user_id):
+                for s in page:
+                    entry.write(dumps(_session_record(s, written)) + b"\n")
+                yield sink.drain()
+
+        # 3) répertoire central
+        archive.close()
+        yield sink.drain()
+    except BaseException:
+        # client parti ou erreur : l'archive envoyée est tronquée, rien à nettoyer
+        EXPORTS.inc(outcome="aborted")
+        raise
+    EXPORTS.inc(outcome="ok")
@@ -0,0 +1,181 @@
+# app/services/idempotency.py
+"""
+En-tête Idempotency-Key pour les POST coûteux (analyses, validation d'achat).
+La première requête réserve la clé (user, clé) en base puis mémorise sa
+réponse 2xx pendant IDEMPOTENCY_TTL_SECONDS ; une nouvelle tentative la
+rejoue sans rien recalculer. Un doublon concurrent attend la requête en cours :
+via une future dans le même worker, en interrogeant la base sinon.
+Une requête en échec libère la clé : la tentative suivante s'exécute normalement.
+La réservation est identifiée par son created_at : libération, réponse
+mémorisée et reprise d'une clé abandonnée ne touchent que la réservation
+observée, jamais celle d'une autre requête.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Tuple
+
+from fastapi import HTTPException, status
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.core.responses import FastJSONResponse
+from app.crud.idempotency import (
+    complete_key, get_key, purge_expired_keys, release_key, try_reserve_key
+)
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger("idempotency")
+
+IDEMPOTENCY_REQUESTS = Counter(
+    "skincoach_idempotency_requests_total",
+    "Requêtes avec Idempotency-Key (executed, replayed, waited, conflict)",
+    ("route", "result"),
+)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+StoredResponse = Tuple[int, str | None, bytes]
+
+_inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+_task: asyncio.Task | None = None
+
+
+def _replay(stored: StoredResponse) -> Response:
+    status_code, media_type, body = stored
+    response = FastJSONResponse(body, status_code=status_code, media_type=media_type)
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _conflict(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+async def _execute(
+    user_id: int,
+    key: str,
+    reserved_at: datetime,
+    run: Callable[[], Awaitable[Response]]
+) -> Response:
+    """Exécute la requête pour la réservation `reserved_at` et mémorise sa réponse si 2xx."""
+    future = asyncio.get_running_loop().create_future()
+    _inflight[(user_id, key)] = future
+    try:
+        response = await run()
+    except BaseException as e:
+        # clé libérée avant de réveiller les doublons : l'un d'eux pourra la reprendre
+        _inflight.pop((user_id, key), None)
+        try:
+            async with AsyncSessionLocal() as db:
+                await release_key(db, user_id, key, reserved_at)
+        finally:
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("requête annulée"))
+            future.exception()  # pas d'avertissement si aucun doublon n'attendait
+        raise
+
+    body = getattr(response, "body", None)
+    stored = None
+    try:
+        async with AsyncSessionLocal() as db:
+            if 200 <= response.status_code < 300 and body is not None:
+                stored = (response.status_code, response.media_type, bytes(body))
+                if not await complete_key(db, user_id, key, reserved_at, *stored):
+                    logger.warning("Clé d'idempotence reprise pendant la requête : réponse non mémorisée")
+            else:
+                # réponse non mémorisable (erreur, streaming) : la clé est libérée
+                await release_key(db, user_id, key, reserved_at)
+    finally:
+        _inflight.pop((user_id, key), None)
+        future.set_result(stored)
+    return response
+
+
+async def idempotent(
+    user_id: int,
+    key: str | None,
+    route: str,
+    run: Callable[[], Awaitable[Response]]
+) -> Response:
+    """
+    Exécute `run()` au plus une fois par (utilisateur, Idempotency-Key).
+    Sans clé, exécute simplement `run()`.
+    """
+    if not key:
+        return await run()
+    deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        # 1) doublon dans ce worker : on attend la requête en cours
+        inflight = _inflight.get((user_id, key))
+        if inflight is not None:
+            IDEMPOTENCY_REQUESTS.inc(route=route, result="waited")
+            try:
+                stored = await asyncio.shield(inflight)
+            except Exception:
+                stored = None
+            if stored is not None:
+                return _replay(stored)
+            continue  # échec de la première requête : on retente nous-mêmes
+
+        # 2) réservation en base (partagée entre workers)
+        async with AsyncSessionLocal() as db:
+            reserved_at = await try_reserve_key(db, user_id, key, route, settings.IDEMPOTENCY_TTL_SECONDS)
+            if reserved_at is not None:
+                IDEMPOTENCY_REQUESTS.inc(route=route, result="executed")
+                break
+            row = await get_key(db, user_id, key)
+            now = datetime.utcnow()
+            if row is None:
+                continue  # libérée entre-temps
+            stale = row.status == "pending" and now - row.created_at > timedelta(
+                seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT
+            )
+            if row.expires_at < now or stale:
+                # clé expirée, ou requête abandonnée (worker arrêté) : on la reprend,
+                # à condition qu'une autre tentative ne l'ait pas reprise avant nous
+                await release_key(db, user_id, key, row.created_at, row.status)
+                continue
+            if row.route != route:
+                IDEMPOTENCY_REQUESTS.inc(route=route, result="conflict")
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key déjà utilisée pour une autre requête"
+                )
+            if row.status == "complete":
+                IDEMPOTENCY_REQUESTS.inc(route=route, result="replayed")
+                return _replay((row.status_code, row.media_type, row.response_body))
+
+        # 3) en cours dans un autre worker : on interroge la base
+        if asyncio.get_running_loop().time() >= deadline:
+            IDEMPOTENCY_REQUESTS.inc(route=route, result="conflict")
+            raise _conflict("Une requête avec cette Idempotency-Key est encore en cours")
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
+
+    return await _execute(user_id, key, reserved_at, run)
+
+
+async def _periodic_purge() -> None:
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS)
+        try:
+            async with AsyncSessionLocal() as db:
+                while await purge_expired_keys(db) > 0:
+                    pass
+        except Exception:
+            logger.exception("Échec de la purge des clés d'idempotence expirées")
+
+
+def start_idempotency_purge() -> None:
+    """À appeler au démarrage de l'application (lifespan)."""
+    global _task
+    if settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS > 0:
+        _task = asyncio.create_task(_periodic_purge())
+
+
+async def stop_idempotency_purge() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
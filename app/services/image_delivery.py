@@ -0,0 +1,52 @@
+# app/services/image_delivery.py
+"""
+Envoi des images (originales et variantes) après contrôle d'accès : les
+fichiers sont immuables (clé de contenu ou uuid), d'où un ETag fort tiré de
+la clé, `Cache-Control: private, immutable` et des 304 sur If-None-Match.
+
+IMAGE_OFFLOAD délègue l'envoi des octets au serveur frontal :
+- "x-accel"    : en-tête X-Accel-Redirect vers une location nginx `internal`
+  (IMAGE_ACCEL_PREFIX + chemin relatif au dossier des images) ;
+- "x-sendfile" : en-tête X-Sendfile avec le chemin absolu (Apache, lighttpd) ;
+- "off"        : FileResponse (requêtes Range gérées par Starlette).
+"""
+import os
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from app.core.config import settings
+from app.core.responses import etag_matches
+
+IMMUTABLE = "private, max-age=31536000, immutable"
+
+
+def strong_etag(key: str, *variant: str) -> str:
+    """ETag d'une image : nom de fichier de la clé (sha256 ou uuid), plus la variante."""
+    name = key.rsplit("/", 1)[-1].split(".", 1)[0]
+    return '"' + "-".join((name, *variant)) + '"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    return etag_matches(request.headers.get("if-none-match"), etag)
+
+
+def not_modified(etag: str, cache_control: str = IMMUTABLE) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def send_file(path: str, root: str, accel_location: str, media_type: str | None, etag: str) -> Response:
+    """
+    Réponse pour un fichier local existant ; `root` est le dossier servi par
+    la location nginx `accel_location` (mode "x-accel").
+    """
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+    if settings.IMAGE_OFFLOAD == "x-accel":
+        rel = os.path.relpath(path, root).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = f"{settings.IMAGE_ACCEL_PREFIX}{accel_location}/{quote(rel)}"
+        return Response(media_type=media_type, headers=headers)
+    if settings.IMAGE_OFFLOAD == "x-sendfile":
+        headers["X-Sendfile"] = os.path.abspath(path)
+        return Response(media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
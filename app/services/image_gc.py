@@ -0,0 +1,241 @@
+# app/services/image_gc.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Set
+
+from sqlalchemy import select, delete, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import Session as DBSession, StoredImage
+from app.db.session import AsyncSessionLocal
+from app.services.image_variants import delete_variants
+from app.services.storage import key_to_url, url_to_key
+from app.services.storage_backend import StoredObject, get_storage
+
+logger = logging.getLogger("image_gc")
+
+# File des suppressions demandées par les routes (suppression de session,
+# de compte, analyse échouée) : la route rend la main tout de suite.
+_queue: asyncio.Queue | None = None
+_tasks: List[asyncio.Task] = []
+# Reprise du balayage périodique là où la passe précédente s'est arrêtée
+_cursor: str | None = None
+
+
+def enqueue_deletion(keys: Iterable[str | None]) -> None:
+    """
+    Demande la suppression de fichiers. Le worker revérifie qu'aucune session
+    ni référence (stored_images.ref_count) ne les retient avant de supprimer.
+    Si la file est pleine (ou le GC non démarré), le balayage périodique les
+    rattrapera.
+    """
+    if _queue is None:
+        return
+    for key in keys:
+        if not key:
+            continue
+        try:
+            _queue.put_nowait(key)
+        except asyncio.QueueFull:
+            logger.warning("File de suppression pleine, laissé au balayage périodique")
+            return
+
+
+async def _referenced_keys(db: AsyncSession, keys: List[str]) -> Set[str]:
+    """
+    Clés encore référencées par sessions.image_url / annotated_image_url, ou
+    retenues par stored_images.ref_count (analyse en cours).
+    """
+    urls = [key_to_url(k) for k in keys]
+    result = await db.execute(
+        select(DBSession.image_url, DBSession.annotated_image_url)
+        .where(or_(DBSession.image_url.in_(urls), DBSession.annotated_image_url.in_(urls)))
+    )
+    wanted = set(keys)
+    referenced = {k for row in result.all() for k in map(url_to_key, row) if k in wanted}
+    held = await db.execute(
+        select(StoredImage.key).where(StoredImage.key.in_(keys), StoredImage.ref_count > 0)
+    )
+    return referenced | set(held.scalars().all())
+
+
+async def _delete_keys(db: AsyncSession, keys: List[str]) -> List[str]:
+    """
+    Supprime les fichiers de `keys` dont le compteur de références est nul et
+    renvoie les clés supprimées. Les lignes stored_images restent verrouillées
+    jusqu'au commit, fichiers compris : une analyse qui prend une référence
+    (acquire_image_refs) attend la fin de la suppression, puis réécrit le
+    fichier disparu (ensure_blob).
+    """
+    if not keys:
+        return []
+    keys = sorted(keys)
+    # ligne à 0 pour les fichiers encore jamais référencés : verrouillée aussi
+    await db.execute(
+        insert(StoredImage)
+        .values([{"key": key, "ref_count": 0} for key in keys])
+        .on_conflict_do_nothing(index_elements=[StoredImage.key])
+    )
+    result = await db.execute(
+        delete(StoredImage)
+        .where(StoredImage.key.in_(keys), StoredImage.ref_count <= 0)
+        .returning(StoredImage.key)
+    )
+    deletable = sorted(result.scalars().all())
+    storage = get_storage()
+    try:
+        for key in deletable:
+            await storage.delete(key)
+            delete_variants(key)
+    except BaseException:
+        await db.rollback()
+        raise
+    await db.commit()
+    return deletable
+
+
+async def _deletion_worker() -> None:
+    while True:
+        batch = {await _queue.get()}
+        while len(batch) < settings.IMAGE_GC_BATCH_SIZE and not _queue.empty():
+            batch.add(_queue.get_nowait())
+        try:
+            async with AsyncSessionLocal() as db:
+                keys = sorted(batch)
+                referenced = await _referenced_keys(db, keys)
+                await _delete_keys(db, [k for k in keys if k not in referenced])
+        except Exception:
+            logger.exception("Échec de la suppression de %d fichier(s)", len(batch))
+
+
+async def _sweep_batch(
+    db: AsyncSession,
+    batch: List[StoredObject],
+    cutoff: datetime,
+    dry_run: bool,
+    report: Dict[str, object],
+) -> None:
+    keys = [obj.key for obj in batch]
+    referenced = await _referenced_keys(db, keys)
+    orphans: List[str] = []
+    for obj in batch:
+        if obj.key in referenced:
+            report["referenced"] += 1
+        elif obj.modified > cutoff:
+            # upload ou analyse peut-être encore en cours
+            report["too_recent"] += 1
+        else:
+            orphans.append(obj.key)
+            report["orphan_bytes"] += obj.size
+    report["scanned"] += len(batch)
+    report["orphans"] += len(orphans)
+    sample: List[str] = report["sample"]
+    sample.extend(orphans[: max(0, 100 - len(sample))])
+    if not dry_run:
+        # les fichiers retenus par une référence (analyse en cours) sont épargnés
+        report["deleted"] += len(await _delete_keys(db, orphans))
+
+
+async def sweep_orphans(
+    dry_run: bool = True,
+    batch_size: int | None = None,
+    max_batches: int | None = None,
+    min_age_seconds: int | None = None,
+    start_after: str | None = None,
+) -> Dict[str, object]:
+    """
+    Réconcilie le stockage avec sessions.image_url / annotated_image_url.
+    Passe bornée : au plus max_batches lots de batch_size fichiers ; si elle
+    s'arrête avant la fin, next_cursor permet de reprendre (start_after).
+    En dry_run, rien n'est supprimé : on renvoie seulement le rapport.
+    """
+    batch_size = batch_size or settings.IMAGE_GC_BATCH_SIZE
+    max_batches = max_batches or settings.IMAGE_GC_MAX_BATCHES
+    if min_age_seconds is None:
+        min_age_seconds = settings.IMAGE_GC_MIN_AGE_SECONDS
+    cutoff = datetime.utcnow() - timedelta(seconds=min_age_seconds)
+
+    report: Dict[str, object] = {
+        "dry_run": dry_run,
+        "scanned": 0,
+        "referenced": 0,
+        "too_recent": 0,
+        "orphans": 0,
+        "orphan_bytes": 0,
+        "deleted": 0,
+        "sample": [],
+        "next_cursor": None,
+    }
+    batch: List[StoredObject] = []
+    batches = 0
+    async with AsyncSessionLocal() as db:
+        async for obj in get_storage().iter_keys(start_after):
+            batch.append(obj)
+            if len(batch) < batch_size:
+                continue
+            await _sweep_batch(db, batch, cutoff, dry_run, report)
+            batches += 1
+            if batches >= max_batches:
+                report["next_cursor"] = batch[-1].key
+                break
+            batch = []
+        else:
+            if batch:
+                await _sweep_batch(db, batch, cutoff, dry_run, report)
+    return report
+
+
+async def _periodic_sweeper() -> None:
+    global _cursor
+    while True:
+        await asyncio.sleep(settings.IMAGE_GC_INTERVAL_SECONDS)
+        try:
+            report = await sweep_orphans(dry_run=False, start_after=_cursor)
+            _cursor = report["next_cursor"]
+            logger.info(
+                "Balayage images : %s analysés, %s supprimés",
+                report["scanned"], report["deleted"]
+            )
+        except Exception:
+            logger.exception("Échec du balayage des images orphelines")
+
+
+def start_image_gc() -> None:
+    """À appeler au démarrage de l'application (lifespan)."""
+    global _queue
+    _queue = asyncio.Queue(maxsize=10_000)
+    _tasks.append(asyncio.create_task(_deletion_worker()))
+    if settings.IMAGE_GC_INTERVAL_SECONDS > 0:
+        _tasks.append(asyncio.create_task(_periodic_sweeper()))
+
+
+async def stop_image_gc() -> None:
+    global _queue
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _queue = None
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Balayage des images orphelines")
+    parser.add_argument("--apply", action="store_true", help="supprimer (sinon dry-run)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--start-after", default=None)
+    args = parser.parse_args()
+
+    result = asyncio.run(sweep_orphans(
+        dry_run=not args.apply,
+        batch_size=args.batch_size,
+        max_batches=args.max_batches,
+        start_after=args.start_after,
+    ))
+    print(json.dumps(result, indent=2))
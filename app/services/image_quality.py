@@ -0,0 +1,120 @@
+# app/services/image_quality.py
+"""
+Contrôle qualité local, avant tout stockage ou appel d'inférence : netteté
+(variance du Laplacien), exposition et présence d'un visage (cascade de Haar
+fournie avec OpenCV), mesurées sur une copie réduite de l'image.
+"""
+import logging
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import Counter, stage
+
+logger = logging.getLogger("image_quality")
+
+QUALITY_CHECKS = Counter(
+    "skincoach_quality_checks_total",
+    "Contrôles qualité des photos (accepted, ou motif du refus)",
+    ("result",),
+)
+
+# code → conseil affiché à l'utilisateur
+REASONS: Dict[str, str] = {
+    "unreadable": "Image illisible : envoyez une photo JPEG, PNG ou HEIC.",
+    "blurry": "Photo floue : tenez l'appareil immobile et faites la mise au point sur le visage.",
+    "too_dark": "Photo trop sombre : placez-vous face à une source de lumière.",
+    "too_bright": "Photo surexposée : évitez la lumière directe ou le flash.",
+    "no_face": "Aucun visage détecté : cadrez votre visage de face, en entier.",
+}
+
+
+class QualityReport(NamedTuple):
+    sharpness: float
+    brightness: float
+    clipped: float          # part des pixels quasi noirs ou quasi blancs
+    faces: int              # -1 si la détection de visage est indisponible
+    reasons: List[str]      # codes de REASONS, vide si l'image est acceptée
+
+    @property
+    def ok(self) -> bool:
+        return not self.reasons
+
+
+@lru_cache(maxsize=1)
+def _face_cascade():
+    import cv2
+
+    if not hasattr(cv2, "CascadeClassifier"):
+        # builds d'OpenCV sans le module objdetect historique
+        logger.warning("cv2.CascadeClassifier indisponible : détection de visage désactivée")
+        return None
+    return cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+
+def detect_faces(gray) -> Optional[List[Tuple[int, int, int, int]]]:
+    """
+    Visages (x, y, w, h) d'une image en niveaux de gris, du plus grand au plus
+    petit ; None si la détection est indisponible. Prévoir une image réduite
+    (~512 px) : la cascade est en O(pixels).
+    """
+    cascade = _face_cascade()
+    if cascade is None:
+        return None
+    min_side = max(24, int(min(gray.shape[:2]) * 0.15))
+    faces = cascade.detectMultiScale(
+        gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_side, min_side)
+    )
+    return sorted((tuple(int(v) for v in f) for f in faces), key=lambda f: f[2] * f[3], reverse=True)
+
+
+def downscale(img, max_side: int):
+    """Réduit l'image pour que son plus grand côté fasse au plus max_side ; renvoie (image, facteur)."""
+    import cv2
+
+    h, w = img.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    if scale < 1.0:
+        img = cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+    return img, scale
+
+
+def assess_image(content: bytes) -> QualityReport:
+    """Mesures et motifs de refus (synchrone, CPU : à appeler hors boucle)."""
+    import cv2
+    import numpy as np
+
+    # décodage JPEG directement à mi-résolution (mise à l'échelle DCT) : moins cher
+    img = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if img is None:
+        return QualityReport(0.0, 0.0, 0.0, 0, ["unreadable"])
+    gray, _ = downscale(img, settings.QUALITY_MAX_SIDE)
+
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    brightness = float(gray.mean())
+    clipped = float(np.count_nonzero((gray < 8) | (gray > 247))) / gray.size
+    found = detect_faces(gray) if settings.QUALITY_REQUIRE_FACE else None
+    faces = -1 if found is None else len(found)
+
+    reasons: List[str] = []
+    if sharpness < settings.QUALITY_MIN_SHARPNESS:
+        reasons.append("blurry")
+    if brightness < settings.QUALITY_MIN_BRIGHTNESS:
+        reasons.append("too_dark")
+    elif brightness > settings.QUALITY_MAX_BRIGHTNESS or clipped > settings.QUALITY_MAX_CLIPPED:
+        reasons.append("too_bright")
+    if faces == 0:
+        reasons.append("no_face")
+    return QualityReport(sharpness, brightness, clipped, faces, reasons)
+
+
+async def check_quality(content: bytes) -> QualityReport:
+    with stage("quality"):
+        report = await run_in_threadpool(assess_image, content)
+    if report.ok:
+        QUALITY_CHECKS.inc(result="accepted")
+    for reason in report.reasons:
+        QUALITY_CHECKS.inc(result=reason)
+    return report
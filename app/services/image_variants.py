@@ -0,0 +1,128 @@
+# app/services/image_variants.py
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+from uuid import uuid4
+
+from app.core.config import settings
+from app.services.storage import url_to_key
+from app.services.storage_backend import get_storage
+
+# Tailles autorisées (côté le plus long, en pixels) : liste fermée pour que
+# le cache disque reste borné.
+VARIANT_PRESETS: Dict[str, int] = {
+    "thumb": 160,
+    "small": 320,
+    "medium": 640,
+    "large": 1280,
+}
+
+# format d'URL → (format Pillow, media type)
+VARIANT_FORMATS: Dict[str, tuple[str, str]] = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+_pool: ProcessPoolExecutor | None = None
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+    return _pool
+
+
+def shutdown_variant_pool() -> None:
+    """À appeler au shutdown de l'application."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def variant_path(key: str, preset: str, fmt: str) -> str:
+    """
+    Chemin du cache disque d'une variante. On garde l'extension d'origine dans
+    le nom (h.jpg.webp) pour ne pas mélanger h.jpg et h.png.
+    """
+    return os.path.join(settings.IMAGE_VARIANT_DIR, preset, *key.split("/")) + f".{fmt}"
+
+
+def delete_variants(key: str) -> None:
+    """Supprime toutes les variantes en cache d'une image."""
+    for preset in VARIANT_PRESETS:
+        for fmt in VARIANT_FORMATS:
+            try:
+                os.remove(variant_path(key, preset, fmt))
+            except FileNotFoundError:
+                pass
+
+
+def variant_url(image_url: str | None, preset: str, fmt: str = "webp") -> str | None:
+    key = url_to_key(image_url)
+    if key is None:
+        return None
+    return f"{settings.IMAGE_VARIANT_URL_PREFIX}/{preset}/{fmt}/{key}"
+
+
+def variant_urls(image_url: str | None, fmt: str = "webp") -> Dict[str, str] | None:
+    """URLs de toutes les tailles prédéfinies pour une image (None si pas d'image)."""
+    if url_to_key(image_url) is None:
+        return None
+    return {preset: variant_url(image_url, preset, fmt) for preset in VARIANT_PRESETS}
+
+
+def _render_variant(src: bytes, dst: str, max_side: int, pil_format: str) -> None:
+    """
+    Exécuté dans un process du pool : redimensionne et encode la variante,
+    écrite atomiquement (fichier temporaire + os.replace).
+    """
+    from PIL import Image, ImageOps
+    import pillow_heif
+
+    # les anciens uploads .HEIC non convertis doivent aussi pouvoir s'ouvrir
+    pillow_heif.register_heif_opener()
+    with Image.open(io.BytesIO(src)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side))
+        img = img.convert("RGB")
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.{uuid4().hex}.tmp"
+        try:
+            img.save(tmp, format=pil_format, quality=80)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+async def get_variant(key: str, preset: str, fmt: str) -> str:
+    """
+    Renvoie le chemin de la variante, en la générant au premier appel.
+    Les demandes concurrentes pour la même variante partagent le même calcul.
+    Lève FileNotFoundError si l'image source n'existe pas.
+    """
+    dst = variant_path(key, preset, fmt)
+    if os.path.exists(dst):
+        return dst
+
+    pending = _inflight.get(dst)
+    if pending is None:
+        # la source vient du backend (disque local ou bucket) ; le cache des
+        # variantes, lui, reste toujours sur le disque local
+        src = await get_storage().get(key)
+        pending = _inflight.get(dst)
+    if pending is None:
+        loop = asyncio.get_running_loop()
+        pending = loop.run_in_executor(
+            _get_pool(), _render_variant,
+            src, dst, VARIANT_PRESETS[preset], VARIANT_FORMATS[fmt][0]
+        )
+        _inflight[dst] = pending
+        pending.add_done_callback(lambda _: _inflight.pop(dst, None))
+    await asyncio.shield(pending)
+    return dst
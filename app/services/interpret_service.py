@@ -1,12 +1,8 @@
 # app/services/interpret_service.py
-import openai
-from app.core.config import settings
 from typing import Dict, List
 from fastapi.concurrency import run_in_threadpool
 
-# Initialisation du client OpenAI V1
-# (depuis openai>=1.0, on utilise la classe OpenAI)
-client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+from app.core.clients import get_openai_client
 
 async def interpret_scores(scores: Dict[str, float]) -> Dict[str, object]:
     """
@@ -31,7 +27,7 @@ async def interpret_scores(scores: Dict[str, float]) -> Dict[str, object]:
 
     # Appel bloquant synchronisé dans un thread séparé
     response = await run_in_threadpool(
-        client.chat.completions.create,
+        get_openai_client().chat.completions.create,
         model="gpt-4o",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.7,
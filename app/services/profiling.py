@@ -0,0 +1,162 @@
+# app/services/profiling.py
+"""
+Profilage à la demande, piloté par les admins (/admin/profiling) :
+- CPU : un thread échantillonne la pile du thread de la boucle d'événements
+  pendant la requête et produit des piles « repliées » (format flamegraph.pl /
+  speedscope). La boucle étant partagée, les autres requêtes en cours au même
+  moment apparaissent aussi dans le profil.
+- Mémoire : pic tracemalloc sur /skin/analyze*, actif seulement sur demande
+  (tracemalloc ralentit toutes les allocations du process). Le pic est celui
+  du process : il n'est relevé que si la requête a été seule en cours du
+  début à la fin, sinon peak_memory_bytes reste vide.
+L'état est propre à chaque worker.
+"""
+import itertools
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.profiling import ProfilingConfig, ProfileSummary
+
+MEMORY_ROUTE_PREFIX = "/skin/analyze"
+
+config = ProfilingConfig()
+_profiles: deque = deque(maxlen=settings.PROFILE_BUFFER_SIZE)
+_ids = itertools.count(1)
+_active = 0
+# requêtes en cours (toutes) et compteur de chevauchements, pour savoir si une
+# requête a été seule pendant toute sa durée
+_in_flight = 0
+_overlaps = 0
+
+
+class StackSampler(threading.Thread):
+    """Échantillonne périodiquement la pile d'un autre thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True, name="stack-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_qualname}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def update_config(new: ProfilingConfig) -> ProfilingConfig:
+    global config
+    if new.enabled and new.memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not (new.enabled and new.memory) and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    config = new
+    return config
+
+
+def list_profiles() -> List[ProfileSummary]:
+    return [p["summary"] for p in reversed(_profiles)]
+
+
+def get_profile(profile_id: int) -> Dict[str, object] | None:
+    for p in _profiles:
+        if p["summary"].id == profile_id:
+            return p
+    return None
+
+
+def _wants_cpu(path: str) -> bool:
+    if not config.enabled or _active >= settings.PROFILE_MAX_CONCURRENT:
+        return False
+    if config.route and path == config.route:
+        return True
+    return config.sample_rate > 0 and random.random() < config.sample_rate
+
+
+def _wants_memory(path: str) -> bool:
+    return config.enabled and config.memory and path.startswith(MEMORY_ROUTE_PREFIX)
+
+
+async def profile_request(request: Request, call_next):
+    """Middleware : profile la requête si la configuration le demande."""
+    global _in_flight, _overlaps
+    alone = _in_flight == 0
+    if not alone:
+        _overlaps += 1
+    overlaps = _overlaps
+    _in_flight += 1
+    try:
+        return await _profile(request, call_next, alone, overlaps)
+    finally:
+        _in_flight -= 1
+
+
+async def _profile(request: Request, call_next, alone: bool, overlaps: int):
+    global _active
+    path = request.url.path
+    cpu = _wants_cpu(path)
+    memory = _wants_memory(path) and tracemalloc.is_tracing() and alone
+    if not (cpu or memory):
+        return await call_next(request)
+
+    sampler = None
+    if cpu:
+        sampler = StackSampler(threading.get_ident(), config.interval_ms / 1000)
+        sampler.start()
+    if memory:
+        tracemalloc.reset_peak()
+    _active += 1
+    started_at = datetime.utcnow()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _active -= 1
+        if sampler is not None:
+            # join du thread d'échantillonnage hors de la boucle d'événements
+            await run_in_threadpool(sampler.stop)
+        # pic du process : valable seulement si aucune requête n'a démarré entre-temps
+        exclusive = memory and overlaps == _overlaps and tracemalloc.is_tracing()
+        peak = tracemalloc.get_traced_memory()[1] if exclusive else None
+        profile_id = next(_ids)
+        _profiles.append({
+            "summary": ProfileSummary(
+                id=profile_id,
+                method=request.method,
+                path=path,
+                status=status,
+                started_at=started_at,
+                duration_ms=round(duration_ms, 1),
+                samples=sum(sampler.stacks.values()) if sampler else 0,
+                peak_memory_bytes=peak,
+            ),
+            "folded": sampler.folded() if sampler else "",
+        })
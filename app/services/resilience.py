@@ -0,0 +1,255 @@
+# app/services/resilience.py
+"""
+Briques de résilience pour les appels à un service amont (inférence) :
+délai par tentative, retries avec jitter limités par un budget, requête
+« hedgée » après un délai basé sur le p95, et disjoncteur.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Tuple, TypeVar
+
+from app.core.metrics import Counter, Gauge
+
+T = TypeVar("T")
+
+BREAKER_STATE = Gauge(
+    "skincoach_circuit_breaker_state",
+    "État du disjoncteur (0 = fermé, 1 = ouvert, 2 = semi-ouvert)",
+    ("name",),
+)
+BREAKER_REJECTIONS = Counter(
+    "skincoach_circuit_breaker_rejections_total",
+    "Appels refusés car le disjoncteur est ouvert",
+    ("name",),
+)
+UPSTREAM_ATTEMPTS = Counter(
+    "skincoach_upstream_attempts_total",
+    "Tentatives d'appel amont par type (first, retry, hedge) et issue",
+    ("name", "kind", "outcome"),
+)
+
+
+class CircuitOpenError(Exception):
+    """Le service amont est considéré indisponible : on échoue tout de suite."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Service {name} indisponible (disjoncteur ouvert)")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        BREAKER_STATE.set(self.state, name=name)
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+        BREAKER_STATE.set(state, name=self.name)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def is_open(self) -> bool:
+        """Vrai si un appel serait refusé maintenant (sans consommer de sonde)."""
+        if self.state == self.OPEN:
+            return self.retry_after() > 0
+        return self.state == self.HALF_OPEN and self._probe_in_flight
+
+    def allow(self) -> bool:
+        """
+        Lève CircuitOpenError si l'appel doit être refusé. Vrai si l'appel
+        est la sonde semi-ouverte : il devra enregistrer son issue.
+        """
+        if self.state == self.OPEN and self.retry_after() <= 0:
+            # délai écoulé : une seule requête sonde passe
+            self._set_state(self.HALF_OPEN)
+            self._probe_in_flight = False
+        if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probe_in_flight):
+            BREAKER_REJECTIONS.inc(name=self.name)
+            raise CircuitOpenError(self.name, self.retry_after() or self.reset_timeout)
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+
+class RetryBudget:
+    """
+    Les retries (et requêtes hedgées) ne peuvent dépasser `ratio` des requêtes
+    sur la fenêtre glissante, plus un petit minimum : pendant un incident on
+    n'amplifie pas la charge sur l'amont.
+    """
+
+    def __init__(self, ratio: float, min_per_window: int = 3, window: float = 10.0):
+        self.ratio = ratio
+        self.min_per_window = min_per_window
+        self.window = window
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def _trim(self, now: float) -> None:
+        for q in (self._requests, self._retries):
+            while q and q[0] < now - self.window:
+                q.popleft()
+
+    def record_request(self) -> None:
+        self._requests.append(time.monotonic())
+
+    def try_acquire_retry(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= self.min_per_window + self.ratio * len(self._requests):
+            return False
+        self._retries.append(now)
+        return True
+
+
+class LatencyTracker:
+    """Fenêtre des dernières latences réussies, pour estimer le p95."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> float | None:
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    Enveloppe un appel amont : `await caller.call(lambda: client.post(...))`.
+    `is_retryable(exc)` distingue les pannes amont (timeouts, 5xx…) des
+    erreurs qui ne doivent ni être rejouées ni compter contre le disjoncteur.
+    `total_timeout` borne l'appel complet (tentatives, hedge et backoff) :
+    chaque tentative ne dispose que du temps restant.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        budget: RetryBudget,
+        attempt_timeout: float,
+        max_attempts: int,
+        is_retryable: Callable[[BaseException], bool],
+        total_timeout: float | None = None,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.5,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.budget = budget
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.total_timeout = total_timeout
+        self.is_retryable = is_retryable
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency = LatencyTracker()
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]], kind: str) -> Tuple[T, float]:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(fn(), timeout=self.attempt_timeout)
+        except BaseException as e:
+            outcome = "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+            UPSTREAM_ATTEMPTS.inc(name=self.name, kind=kind, outcome=outcome)
+            raise
+        UPSTREAM_ATTEMPTS.inc(name=self.name, kind=kind, outcome="ok")
+        return result, time.perf_counter() - start
+
+    async def _hedged(self, fn: Callable[[], Awaitable[T]], kind: str) -> Tuple[T, float]:
+        p95 = self.latency.quantile(0.95) if self.hedge else None
+        if p95 is None:
+            return await self._attempt(fn, kind)
+
+        first = asyncio.ensure_future(self._attempt(fn, kind))
+        done, _ = await asyncio.wait({first}, timeout=max(p95, self.hedge_min_delay))
+        if done or not self.budget.try_acquire_retry():
+            return await first
+
+        # la première requête traîne : on en lance une seconde, la plus rapide gagne
+        second = asyncio.ensure_future(self._attempt(fn, "hedge"))
+        pending = {first, second}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        probe = self.breaker.allow()
+        self.budget.record_request()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.total_timeout if self.total_timeout else None
+        attempt = 1
+        while True:
+            try:
+                async with asyncio.timeout_at(deadline):
+                    result, elapsed = await self._hedged(fn, "first" if attempt == 1 else "retry")
+            except Exception as e:
+                retryable = isinstance(e, asyncio.TimeoutError) or self.is_retryable(e)
+                if not retryable:
+                    # erreur « client » : l'amont a répondu, il est donc sain
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                # backoff exponentiel avec « full jitter »
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if deadline is not None and loop.time() + delay >= deadline:
+                    # plus de temps pour une nouvelle tentative
+                    raise
+                if attempt >= self.max_attempts or not self.budget.try_acquire_retry():
+                    raise
+                await asyncio.sleep(delay)
+                probe = self.breaker.allow()
+                attempt += 1
+                continue
+            except BaseException:
+                # appel annulé sans issue : la sonde ne doit pas rester prise,
+                # sinon le disjoncteur refuserait tout jusqu'au redémarrage
+                if probe:
+                    self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            self.latency.observe(elapsed)
+            return result
@@ -0,0 +1,28 @@
+# app/services/rollups.py
+"""
+Reconstruction des agrégats journaliers (tables daily_*) depuis la table
+sessions : à lancer une fois après la migration, puis en cas de doute.
+
+    python -m app.services.rollups [--since 2025-01-01]
+"""
+import asyncio
+from datetime import date
+
+from app.crud.rollup import rebuild_rollups
+from app.db.session import AsyncSessionLocal
+
+
+async def rebuild(since: date | None = None) -> dict:
+    async with AsyncSessionLocal() as db:
+        return await rebuild_rollups(db, since)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Reconstruction des agrégats journaliers")
+    parser.add_argument("--since", type=date.fromisoformat, default=None,
+                        help="premier jour à recalculer (AAAA-MM-JJ), tout l'historique par défaut")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(rebuild(args.since)), indent=2))
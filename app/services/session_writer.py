@@ -0,0 +1,127 @@
+# app/services/session_writer.py
+"""
+Écriture des nouvelles sessions, avec commit groupé optionnel
+(SESSION_GROUP_COMMIT) : les insertions des requêtes concurrentes attendent
+au plus SESSION_GROUP_COMMIT_WINDOW_MS puis partent ensemble, en un seul
+INSERT … RETURNING et une seule transaction (un seul fsync du WAL) au lieu
+d'un commit par analyse. Le lot part aussitôt s'il atteint
+SESSION_GROUP_COMMIT_MAX_BATCH.
+
+Si la transaction du lot échoue, chaque session est réécrite seule : une
+ligne invalide ne fait pas échouer les autres requêtes.
+"""
+import asyncio
+import logging
+from typing import List, NamedTuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+from app.crud.session import create_session, insert_sessions, invalidate_user_caches, session_values
+from app.db.models import Session as DBSession
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger("session_writer")
+
+GROUP_COMMIT_BATCH = Histogram(
+    "skincoach_session_group_commit_batch_size",
+    "Sessions écrites par commit groupé",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+
+class _PendingWrite(NamedTuple):
+    values: dict
+    is_premium: bool
+    future: asyncio.Future
+
+
+_pending: List[_PendingWrite] = []
+_flush_task: asyncio.Task | None = None
+
+
+async def _write_alone(write: _PendingWrite) -> None:
+    values = write.values
+    try:
+        async with AsyncSessionLocal() as db:
+            [new] = await insert_sessions(db, [(values, write.is_premium)])
+            await db.commit()
+    except Exception as e:
+        write.future.set_exception(e)
+        return
+    invalidate_user_caches(values["user_id"])
+    write.future.set_result(new)
+
+
+async def _flush(delay: float) -> None:
+    global _flush_task
+    if delay > 0:
+        await asyncio.sleep(delay)
+    batch = _pending[:settings.SESSION_GROUP_COMMIT_MAX_BATCH]
+    del _pending[:len(batch)]
+    # les écritures arrivées entre-temps partent au lot suivant
+    _flush_task = None
+    if _pending:
+        full = len(_pending) >= settings.SESSION_GROUP_COMMIT_MAX_BATCH
+        _flush_task = asyncio.create_task(_flush(0 if full else settings.SESSION_GROUP_COMMIT_WINDOW_MS / 1000))
+
+    GROUP_COMMIT_BATCH.observe(len(batch))
+    try:
+        await _commit_batch(batch)
+    finally:
+        # flush annulé (arrêt du worker) : les requêtes en attente ne restent pas bloquées
+        for write in batch:
+            if not write.future.done():
+                write.future.set_exception(RuntimeError("Écriture de la session interrompue"))
+
+
+async def _commit_batch(batch: List[_PendingWrite]) -> None:
+    try:
+        async with AsyncSessionLocal() as db:
+            created = await insert_sessions(db, [(w.values, w.is_premium) for w in batch])
+            await db.commit()
+    except Exception as e:
+        if len(batch) == 1:
+            batch[0].future.set_exception(e)
+            return
+        logger.warning("Échec du commit groupé de %d sessions : écriture une par une", len(batch), exc_info=True)
+        await asyncio.gather(*(_write_alone(w) for w in batch))
+        return
+    for user_id in {w.values["user_id"] for w in batch}:
+        invalidate_user_caches(user_id)
+    for write, new in zip(batch, created):
+        write.future.set_result(new)
+
+
+async def write_session(
+    db: AsyncSession,
+    user_id: int,
+    image_url: str,
+    annotated_image_url: str,
+    scores: dict,
+    annotations: list,
+    is_premium: bool = False,
+    image_dhash: int | None = None
+) -> DBSession:
+    """
+    Enregistre une analyse : create_session dans la session de la requête, ou,
+    avec SESSION_GROUP_COMMIT, dans le prochain lot (session SQL du writer).
+    """
+    if not settings.SESSION_GROUP_COMMIT:
+        return await create_session(
+            db, user_id, image_url, annotated_image_url, scores, annotations, is_premium, image_dhash
+        )
+
+    global _flush_task
+    values = session_values(user_id, image_url, annotated_image_url, scores, annotations, image_dhash)
+    write = _PendingWrite(values, is_premium, asyncio.get_running_loop().create_future())
+    _pending.append(write)
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush(settings.SESSION_GROUP_COMMIT_WINDOW_MS / 1000))
+    elif len(_pending) >= settings.SESSION_GROUP_COMMIT_MAX_BATCH:
+        # lot plein : on n'attend pas la fin de la fenêtre
+        _flush_task.cancel()
+        _flush_task = asyncio.create_task(_flush(0))
+    # shield : une requête annulée n'interrompt pas l'écriture de tout le lot
+    return await asyncio.shield(write.future)
@@ -1,12 +1,19 @@
 # app/services/skin_analyzer.py
-import os
-from uuid import uuid4
-from typing import Dict, List, TypedDict
+import asyncio
+import math
+import time
+from typing import Dict, List, Optional, Tuple, TypedDict
 
-import cv2
-import httpx
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
+from app.core.clients import get_inference_client
+from app.services.storage import write_blob, key_to_url
+from app.core.metrics import Histogram, record_stage, stage
+from app.services.image_quality import detect_faces, downscale
+from app.services.resilience import (
+    CircuitBreaker, CircuitOpenError, ResilientCaller, RetryBudget
+)
 
 class Annotation(TypedDict):
     x: float; y: float; width: float; height: float; label: str
@@ -16,34 +23,237 @@ ALL_CLASSES = [
     "Normal-Skin","Oily-Skin","Pores","Spots","Wrinkles",
 ]
 
-async def analyze_image(image_path: str) -> Dict[str, object]:
-    # 1) charge l’image
-    img = cv2.imread(image_path)
+def _is_retryable(exc: BaseException) -> bool:
+    """Pannes amont : réseau, timeouts, 5xx et 429. Les autres 4xx ne sont pas rejoués."""
+    import httpx
+
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500 or exc.response.status_code == 429
+    return isinstance(exc, httpx.TransportError)
+
+inference_breaker = CircuitBreaker(
+    "inference",
+    failure_threshold=settings.INFERENCE_BREAKER_FAILURES,
+    reset_timeout=settings.INFERENCE_BREAKER_RESET_SECONDS,
+)
+inference_caller = ResilientCaller(
+    "inference",
+    breaker=inference_breaker,
+    budget=RetryBudget(settings.INFERENCE_RETRY_BUDGET_RATIO),
+    attempt_timeout=settings.INFERENCE_ATTEMPT_TIMEOUT,
+    max_attempts=settings.INFERENCE_MAX_ATTEMPTS,
+    total_timeout=settings.INFERENCE_TOTAL_TIMEOUT,
+    is_retryable=_is_retryable,
+    hedge=settings.INFERENCE_HEDGE_ENABLED,
+    hedge_min_delay=settings.INFERENCE_HEDGE_MIN_DELAY,
+)
+
+INFERENCE_TILE_SECONDS = Histogram(
+    "skincoach_inference_tile_duration_seconds",
+    "Durée de l'inférence d'une tuile, par taille de tuile",
+    ("tile_size",),
+)
+
+# tuiles en vol, tous appels confondus : borne la charge envoyée à l'inférence
+_tile_slots = asyncio.Semaphore(settings.INFERENCE_TILE_CONCURRENCY)
+
+def ensure_inference_available() -> None:
+    """
+    À appeler avant tout travail coûteux (upload, conversion) : lève
+    CircuitOpenError tout de suite si le service d'inférence est en panne.
+    """
+    if inference_breaker.is_open():
+        raise CircuitOpenError("inference", inference_breaker.retry_after())
+
+async def _post_inference(url: str, params: Dict[str, str], filename: str, image: bytes) -> Dict:
+    resp = await get_inference_client().post(
+        url, params=params, files={"file": (filename, image, "application/octet-stream")}
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+def _face_roi(img) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Zone (x0, y0, x1, y1) du plus grand visage, élargie de INFERENCE_FACE_MARGIN
+    et bornée à l'image ; None si aucun visage. Détection sur une copie réduite.
+    """
+    import cv2
+
+    h, w = img.shape[:2]
+    small, scale = downscale(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), settings.QUALITY_MAX_SIDE)
+    faces = detect_faces(small)
+    if not faces:
+        return None
+    fx, fy, fw, fh = (v / scale for v in faces[0])
+    mx, my = fw * settings.INFERENCE_FACE_MARGIN, fh * settings.INFERENCE_FACE_MARGIN
+    x0, y0 = max(0, int(fx - mx)), max(0, int(fy - my))
+    x1, y1 = min(w, int(fx + fw + mx)), min(h, int(fy + fh + my))
+    if x1 - x0 < 32 or y1 - y0 < 32:
+        return None
+    return x0, y0, x1, y1
+
+def tile_grid(width: int, height: int, size: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """
+    Tuiles (x0, y0, x1, y1) couvrant width × height, de côté size, avec au
+    moins `overlap` (part de size) de recouvrement entre voisines.
+    Le nombre de tuiles d'un axe dépend du dépassement : un côté qui ne
+    dépasse size que d'au plus size × overlap reste en une seule tuile
+    (plus longue) au lieu de deux tuiles presque identiques.
+    """
+    def spans(length: int) -> List[Tuple[int, int]]:
+        overshoot = length - size
+        if overshoot <= size * overlap:
+            return [(0, length)]
+        step = max(1, int(size * (1 - overlap)))
+        n = math.ceil(overshoot / step) + 1
+        # réparties uniformément, la dernière alignée sur le bord
+        starts = (round(i * overshoot / (n - 1)) for i in range(n))
+        return [(start, start + size) for start in starts]
+
+    return [(x0, y0, x1, y1) for y0, y1 in spans(height) for x0, x1 in spans(width)]
+
+def _inference_payloads(img, image: bytes) -> List[Tuple[int, int, bytes]]:
+    """
+    Images à envoyer à l'inférence avec leur décalage (x, y) dans l'image :
+    l'image entière, ou le visage (INFERENCE_FACE_CROP) et/ou ses tuiles
+    (INFERENCE_TILING). Synchrone, CPU : hors boucle d'événements.
+    """
+    import cv2
+
+    h, w = img.shape[:2]
+    x0, y0, x1, y1 = 0, 0, w, h
+    if settings.INFERENCE_FACE_CROP:
+        x0, y0, x1, y1 = _face_roi(img) or (x0, y0, x1, y1)
+    tiles = [(0, 0, x1 - x0, y1 - y0)]
+    if settings.INFERENCE_TILING:
+        tiles = tile_grid(x1 - x0, y1 - y0, settings.INFERENCE_TILE_SIZE, settings.INFERENCE_TILE_OVERLAP)
+    if (x0, y0, x1, y1) == (0, 0, w, h) and len(tiles) == 1:
+        return [(0, 0, image)]  # rien à découper : les octets d'origine
+
+    payloads = []
+    for tx0, ty0, tx1, ty1 in tiles:
+        ok, buf = cv2.imencode(
+            ".jpg", img[y0 + ty0:y0 + ty1, x0 + tx0:x0 + tx1], [cv2.IMWRITE_JPEG_QUALITY, 92]
+        )
+        if not ok:
+            raise RuntimeError("Impossible d'encoder une tuile")
+        payloads.append((x0 + tx0, y0 + ty0, buf.tobytes()))
+    return payloads
+
+def merge_predictions(preds: List[Dict], iou_threshold: float, containment: float) -> List[Dict]:
+    """
+    NMS vectorisée, classe par classe : garde la boîte la plus confiante et
+    supprime celles de même classe qui la recouvrent (IoU > iou_threshold) ou
+    y sont presque contenues (intersection / plus petite aire > containment,
+    cas des boîtes coupées par un bord de tuile).
+    """
+    import numpy as np
+
+    if len(preds) < 2:
+        return list(preds)
+    centers = np.array([(p["x"], p["y"], p["width"], p["height"]) for p in preds], dtype=np.float64)
+    boxes = np.concatenate([centers[:, :2] - centers[:, 2:] / 2, centers[:, :2] + centers[:, 2:] / 2], axis=1)
+    # décalage par classe : deux boîtes de classes différentes ne se recouvrent jamais
+    classes = {c: i for i, c in enumerate(sorted({p["class"] for p in preds}))}
+    span = float(boxes.max() - boxes.min()) + 1.0
+    boxes += (np.array([classes[p["class"]] for p in preds]) * span)[:, None]
+    areas = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1e-9)
+    order = np.argsort([-p["confidence"] for p in preds], kind="stable")
+
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        iw = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        ih = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter)
+        ios = inter / np.minimum(areas[i], areas[rest])
+        order = rest[(iou <= iou_threshold) & (ios <= containment)]
+    return [preds[i] for i in keep]
+
+def _shift(preds: List[Dict], x: int, y: int) -> List[Dict]:
+    """Prédictions d'un recadrage ramenées dans les coordonnées de l'image entière."""
+    if not x and not y:
+        return preds
+    return [{**p, "x": p["x"] + x, "y": p["y"] + y} for p in preds]
+
+async def _infer_tile(url: str, params: Dict[str, str], filename: str, tile: Tuple[int, int, bytes]) -> List[Dict]:
+    x, y, image = tile
+    async with _tile_slots:
+        start = time.perf_counter()
+        data = await inference_caller.call(lambda: _post_inference(url, params, filename, image))
+        elapsed = time.perf_counter() - start
+    INFERENCE_TILE_SECONDS.observe(elapsed, tile_size=str(settings.INFERENCE_TILE_SIZE))
+    record_stage("inference_tile", elapsed)
+    return _shift(data.get("predictions", []), x, y)
+
+async def _infer_tiles(
+    url: str, params: Dict[str, str], filename: str, payloads: List[Tuple[int, int, bytes]]
+) -> List[Dict]:
+    """Inférence des tuiles en parallèle ; prédictions dans les coordonnées de l'image."""
+    results = []
+    if inference_breaker.state != CircuitBreaker.CLOSED:
+        # disjoncteur pas fermé : une seule tuile sonde l'amont avant les autres,
+        # au lieu de N tuiles dont toutes sauf la sonde seraient refusées
+        ensure_inference_available()
+        results.append(await _infer_tile(url, params, filename, payloads[0]))
+        payloads = payloads[1:]
+    tasks = [asyncio.ensure_future(_infer_tile(url, params, filename, p)) for p in payloads]
+    try:
+        results += await asyncio.gather(*tasks)
+    except BaseException:
+        # une tuile en échec fait échouer l'analyse : inutile d'attendre les autres
+        for task in tasks:
+            task.cancel()
+        raise
+    return [p for tile_preds in results for p in tile_preds]
+
+async def analyze_image(image: bytes, filename: str = "image.jpg") -> Dict[str, object]:
+    # import paresseux : OpenCV/NumPy ne sont chargés que par les workers qui analysent
+    import cv2
+    import numpy as np
+
+    # 1) décode l’image (déjà en mémoire, quel que soit le backend de stockage)
+    with stage("decode"):
+        img = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
     if img is None:
         raise RuntimeError("Impossible de lire l'image")
     h, w = img.shape[:2]
 
+    # 1 bis) optionnel : n'envoyer que le visage (moins d'octets, moins de fond)
+    # et/ou des tuiles en pleine résolution (petites lésions : pores, taches)
+    payloads = [(0, 0, image)]
+    if settings.INFERENCE_FACE_CROP or settings.INFERENCE_TILING:
+        with stage("tiling" if settings.INFERENCE_TILING else "face_crop"):
+            payloads = await run_in_threadpool(_inference_payloads, img, image)
+
     # 2) construis l’URL Roboflow (sans "/model" ni "/infer")
     url = f"{settings.ROBOFLOW_INFERENCE_API_URL}/{settings.ROBOFLOW_INFERENCE_MODEL_ID}"
     params = {"api_key": settings.ROBOFLOW_INFERENCE_API_KEY}
 
-    # 3) fais le POST multipart/form-data
-    async with httpx.AsyncClient(timeout=30) as client:
-        with open(image_path, "rb") as f:
-            files = {"file": (os.path.basename(image_path), f, "application/octet-stream")}
-            resp = await client.post(url, params=params, files=files)
-
-        resp.raise_for_status()
-        data = resp.json()
-
-    preds = data.get("predictions", [])
+    # 3) fais le(s) POST multipart/form-data (délai par tentative, retries, disjoncteur)
+    with stage("inference"):
+        if len(payloads) == 1:
+            x, y, payload = payloads[0]
+            data = await inference_caller.call(
+                lambda: _post_inference(url, params, filename, payload)
+            )
+            preds = _shift(data.get("predictions", []), x, y)
+        else:
+            preds = await _infer_tiles(url, params, filename, payloads)
+    if len(payloads) > 1:
+        with stage("merge"):
+            preds = merge_predictions(preds, settings.INFERENCE_NMS_IOU, settings.INFERENCE_NMS_CONTAINMENT)
 
     # 4) calcule scores et annotations
     scores = {cls: 0.0 for cls in ALL_CLASSES}
     annotations: List[Annotation] = []
     for p in preds:
         if p["class"] in scores:
-            scores[p["class"]] = p["confidence"]
+            # score d'une classe : sa détection la plus confiante
+            scores[p["class"]] = max(scores[p["class"]], p["confidence"])
+        # coordonnées dans l'image entière, puis normalisées
         cx, cy, pw, ph = p["x"], p["y"], p["width"], p["height"]
         annotations.append({
             "x": cx / w, "y": cy / h,
@@ -52,20 +262,28 @@ async def analyze_image(image_path: str) -> Dict[str, object]:
         })
 
     # 5) dessine les bounding boxes
-    vis = img.copy()
-    for ann in annotations:
-        cx, cy = int(ann["x"]*w), int(ann["y"]*h)
-        bw, bh = int(ann["width"]*w), int(ann["height"]*h)
-        x1, y1 = cx-bw//2, cy-bh//2
-        x2, y2 = x1+bw, y1+bh
-        cv2.rectangle(vis, (x1,y1),(x2,y2),(232,106,74),2)
-        cv2.putText(vis, ann["label"], (x1, y1-6),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (232,106,74), 2)
-
-    # 6) sauvegarde annotée
-    os.makedirs(settings.IMAGE_SAVE_DIR, exist_ok=True)
-    name = f"{uuid4().hex}_annotated.jpg"
-    out = os.path.join(settings.IMAGE_SAVE_DIR, name)
-    cv2.imwrite(out, vis)
-
-    return {"scores": scores, "annotations": annotations, "annotated_path": out}
\ No newline at end of file
+    with stage("draw"):
+        vis = img.copy()
+        for ann in annotations:
+            cx, cy = int(ann["x"]*w), int(ann["y"]*h)
+            bw, bh = int(ann["width"]*w), int(ann["height"]*h)
+            x1, y1 = cx-bw//2, cy-bh//2
+            x2, y2 = x1+bw, y1+bh
+            cv2.rectangle(vis, (x1,y1),(x2,y2),(232,106,74),2)
+            cv2.putText(vis, ann["label"], (x1, y1-6),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (232,106,74), 2)
+
+    # 6) sauvegarde annotée (stockage adressé par contenu)
+    with stage("encode"):
+        ok, buf = cv2.imencode(".jpg", vis)
+    if not ok:
+        raise RuntimeError("Impossible d'encoder l'image annotée")
+    annotated = buf.tobytes()
+    annotated_key = await write_blob(annotated, "jpg")
+
+    return {
+        "scores": scores,
+        "annotations": annotations,
+        "annotated_url": key_to_url(annotated_key),
+        "annotated_image": annotated,
+    }
\ No newline at end of file
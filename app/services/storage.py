@@ -1,59 +1,145 @@
 # app/services/storage.py
-import os
+import io
+import hashlib
+import mimetypes
+from typing import Awaitable, Callable
 from uuid import uuid4
-import aiofiles
 from fastapi import UploadFile
-
-# 1) Imports pour la conversion HEIC → JPEG
-from PIL import Image
-import pillow_heif
+from fastapi.concurrency import run_in_threadpool
 
 from app.core.config import settings
+from app.services.storage_backend import get_storage
+from app.core.metrics import stage
+
+UPLOAD_KEY_PREFIX = "uploads"
+
+# Vérification appelée sur l'image (déjà convertie) juste avant l'écriture :
+# elle lève une exception pour refuser l'image, qui n'est alors pas stockée.
+ImageCheck = Callable[[bytes], Awaitable[None]]
 
-async def save_image(file: UploadFile) -> tuple[str, str]:
+
+def content_key(data: bytes, ext: str) -> str:
     """
-    Sauvegarde l’UploadFile sur le disque, convertit les HEIC/HEIF en JPEG si besoin,
-    et renvoie un tuple (file_path, image_url).
+    Clé adressée par le contenu : sha256 du fichier, réparti sur deux niveaux
+    de sous-dossiers (ex. "ab/cd/abcdef….jpg") pour garder des dossiers petits.
     """
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
 
-    # 1) Générer un nom unique basé sur l'extension d'origine
-    original_ext = file.filename.rsplit(".", 1)[-1].lower()
-    base_name = uuid4().hex
 
-    # 2) Déterminer le nom de fichier final et si on doit convertir
+def key_to_url(key: str) -> str:
+    """URL publique d'une clé de stockage."""
+    return f"{settings.IMAGE_URL_PREFIX}/{key}"
+
+
+def url_to_key(url: str | None) -> str | None:
+    """
+    Inverse de key_to_url. Fonctionne aussi pour les anciennes URLs « plates »
+    (uuid.jpg), dont la clé est simplement le nom de fichier.
+    """
+    prefix = f"{settings.IMAGE_URL_PREFIX}/"
+    if not url or not url.startswith(prefix):
+        return None
+    return url[len(prefix):]
+
+
+def upload_key(user_id: int, ext: str) -> str:
+    """Clé temporaire d'un upload direct (presigned PUT) d'un utilisateur."""
+    return f"{UPLOAD_KEY_PREFIX}/{user_id}/{uuid4().hex}.{ext}"
+
+
+async def write_blob(data: bytes, ext: str) -> str:
+    """
+    Écrit des octets sous leur clé de contenu et renvoie la clé.
+    Si la clé existe déjà (même contenu), on ne réécrit rien mais on renouvelle
+    sa date de modification : le balayage du GC ne supprime pas un fichier
+    qu'une analyse en cours vient de réutiliser. Sinon le backend écrit de
+    façon atomique.
+    """
+    key = content_key(data, ext)
+    storage = get_storage()
+    with stage("store_write"):
+        if await storage.exists(key):
+            await storage.touch(key)
+        else:
+            await storage.put(key, data, content_type=mimetypes.guess_type(key)[0])
+    return key
+
+
+async def ensure_blob(key: str, data: bytes) -> None:
+    """
+    Réécrit `data` sous `key` si le fichier a disparu. À appeler une fois la
+    référence (stored_images) commitée : le GC a pu supprimer le fichier juste
+    avant, mais ne le peut plus ensuite.
+    """
+    storage = get_storage()
+    if not await storage.exists(key):
+        await storage.put(key, data, content_type=mimetypes.guess_type(key)[0])
+
+
+def _heic_to_jpeg(content: bytes) -> bytes:
+    # Imports pour la conversion HEIC → JPEG (paresseux : seulement si besoin)
+    from PIL import Image
+    import pillow_heif
+
+    # Enregistrer l'opener HEIF pour Pillow
+    pillow_heif.register_heif_opener()
+    with Image.open(io.BytesIO(content)) as img:
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+async def store_original(
+    content: bytes,
+    original_ext: str,
+    check: ImageCheck | None = None
+) -> tuple[bytes, str]:
+    """
+    Convertit les HEIC/HEIF en JPEG si besoin, applique `check`, stocke sous
+    la clé de contenu et renvoie (content, image_url) ; content est l'image
+    effectivement stockée.
+    """
+    # 1) Si HEIC/HEIF, convertir en JPEG (en mémoire, hors boucle d'événements)
     if original_ext in ("heic", "heif"):
-        # on sortira un JPEG
-        filename = f"{base_name}.jpg"
-        needs_conversion = True
+        with stage("heic_convert"):
+            content = await run_in_threadpool(_heic_to_jpeg, content)
+        ext = "jpg"
     else:
-        filename = f"{base_name}.{original_ext}"
-        needs_conversion = False
+        ext = original_ext
+
+    # 2) Contrôle éventuel avant tout stockage
+    if check is not None:
+        await check(content)
 
-    # 3) Chemins : dossier de sauvegarde + temporaire
-    os.makedirs(settings.IMAGE_SAVE_DIR, exist_ok=True)
-    final_path = os.path.join(settings.IMAGE_SAVE_DIR, filename)
-    temp_path = final_path + (".heic" if needs_conversion else "")
+    # 3) Écriture atomique sous la clé de contenu
+    key = await write_blob(content, ext)
 
-    # 4) Écriture asynchrone du fichier brut
-    async with aiofiles.open(temp_path, "wb") as out_file:
+    # 4) Construire l'URL publique pour l'accès
+    return content, key_to_url(key)
+
+
+async def save_image(file: UploadFile, check: ImageCheck | None = None) -> tuple[bytes, str]:
+    """
+    Sauvegarde l’UploadFile dans le stockage adressé par contenu et renvoie
+    un tuple (content, image_url). Deux uploads identiques partagent le même fichier.
+    """
+    original_ext = file.filename.rsplit(".", 1)[-1].lower()
+    with stage("upload_read"):
         content = await file.read()
-        await out_file.write(content)
-
-    # 5) Si HEIC/HEIF, convertir en JPEG
-    if needs_conversion:
-        # Enregistrer l'opener HEIF pour Pillow
-        pillow_heif.register_heif_opener()
-        # Ouvrir et convertir
-        with Image.open(temp_path) as img:
-            rgb = img.convert("RGB")
-            rgb.save(final_path, format="JPEG")
-        # Supprimer le fichier temporaire
-        os.remove(temp_path)
-    else:
-        # Sinon, on renomme simplement le temp en final
-        os.replace(temp_path, final_path)
+    return await store_original(content, original_ext, check)
 
-    # 6) Construire l'URL publique pour l'accès
-    image_url = f"{settings.IMAGE_URL_PREFIX}/{filename}"
 
-    return final_path, image_url
\ No newline at end of file
+async def claim_upload(key: str, check: ImageCheck | None = None) -> tuple[bytes, str]:
+    """
+    Récupère un objet envoyé directement dans le bucket (presigned PUT),
+    le range sous sa clé de contenu puis supprime la clé temporaire, y compris
+    quand `check` refuse l'image (qualité, analyse réutilisée).
+    Lève FileNotFoundError si l'upload n'existe pas.
+    """
+    storage = get_storage()
+    content = await storage.get(key)
+    try:
+        return await store_original(content, key.rsplit(".", 1)[-1].lower(), check)
+    finally:
+        await storage.delete(key)
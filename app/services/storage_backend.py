@@ -0,0 +1,254 @@
+# app/services/storage_backend.py
+import mimetypes
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Dict, NamedTuple
+from uuid import uuid4
+
+import aiofiles
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+class StoredObject(NamedTuple):
+    key: str
+    size: int
+    modified: datetime
+
+
+class StorageBackend(ABC):
+    """
+    Interface commune des stockages d'images. Les clés sont des chemins
+    relatifs avec des "/" (ex. "ab/cd/<sha256>.jpg").
+    """
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes, content_type: str | None = None) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Lève FileNotFoundError si la clé n'existe pas."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Ne lève pas d'erreur si la clé n'existe pas."""
+
+    @abstractmethod
+    async def touch(self, key: str) -> None:
+        """Remet la date de modification à maintenant (le GC épargne les fichiers récents)."""
+
+    @abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        ...
+
+    @abstractmethod
+    def iter_keys(self, start_after: str | None = None) -> AsyncIterator[StoredObject]:
+        """Parcourt tous les objets par ordre de clé, à partir de start_after (exclu)."""
+
+    def presign_put(self, key: str, content_type: str) -> Dict[str, object] | None:
+        """URL d'upload direct (PUT) ; None si le backend ne le supporte pas."""
+        return None
+
+    def presign_get(self, key: str) -> str | None:
+        """URL de lecture directe ; None si le backend ne le supporte pas."""
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """Fichiers sous IMAGE_SAVE_DIR, servis par l'API."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    async def put(self, key: str, data: bytes, content_type: str | None = None) -> None:
+        # Écriture dans un fichier temporaire du même dossier puis os.replace :
+        # un lecteur ne voit jamais de fichier partiel.
+        final_path = self.path(key)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        temp_path = f"{final_path}.{uuid4().hex}.tmp"
+        try:
+            async with aiofiles.open(temp_path, "wb") as out_file:
+                await out_file.write(data)
+            os.replace(temp_path, final_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    async def get(self, key: str) -> bytes:
+        async with aiofiles.open(self.path(key), "rb") as f:
+            return await f.read()
+
+    async def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path(key))
+
+    async def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    async def touch(self, key: str) -> None:
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    async def iter_chunks(self, key: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self.path(key), "rb") as f:
+            while chunk := await f.read(chunk_size):
+                yield chunk
+
+    async def iter_keys(self, start_after: str | None = None) -> AsyncIterator[StoredObject]:
+        # Parcours trié dossier par dossier : chaque shard est petit, et on
+        # saute directement les shards entièrement avant start_after.
+        async def walk(rel_dir: str) -> AsyncIterator[StoredObject]:
+            abs_dir = os.path.join(self.root, *rel_dir.split("/")) if rel_dir else self.root
+            try:
+                entries = sorted(os.scandir(abs_dir), key=lambda e: e.name)
+            except FileNotFoundError:
+                return
+            for entry in entries:
+                key = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if start_after and key < start_after and not start_after.startswith(key + "/"):
+                        continue
+                    async for obj in walk(key):
+                        yield obj
+                elif entry.is_file(follow_symlinks=False):
+                    if start_after and key <= start_after:
+                        continue
+                    st = entry.stat()
+                    yield StoredObject(key, st.st_size, datetime.utcfromtimestamp(st.st_mtime))
+
+        async for obj in walk(""):
+            yield obj
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Bucket S3 ou compatible (MinIO en local via S3_ENDPOINT_URL).
+    boto3 est synchrone : les appels réseau passent par le threadpool.
+    """
+
+    def __init__(self):
+        # import paresseux : boto3 n'est requis que pour ce backend
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    async def put(self, key: str, data: bytes, content_type: str | None = None) -> None:
+        extra = {"ContentType": content_type} if content_type else {}
+        await run_in_threadpool(
+            self.client.put_object, Bucket=self.bucket, Key=key, Body=data, **extra
+        )
+
+    async def get(self, key: str) -> bytes:
+        try:
+            obj = await run_in_threadpool(self.client.get_object, Bucket=self.bucket, Key=key)
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)
+        return await run_in_threadpool(obj["Body"].read)
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            await run_in_threadpool(self.client.head_object, Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            # seul un 404 signifie « absent » : droits, quotas ou pannes remontent
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def touch(self, key: str) -> None:
+        # S3 n'a pas d'utime : une copie sur lui-même renouvelle LastModified
+        content_type = mimetypes.guess_type(key)[0]
+        extra = {"ContentType": content_type} if content_type else {}
+        await run_in_threadpool(
+            self.client.copy_object,
+            Bucket=self.bucket, Key=key,
+            CopySource={"Bucket": self.bucket, "Key": key},
+            MetadataDirective="REPLACE", **extra
+        )
+
+    async def iter_chunks(self, key: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        try:
+            obj = await run_in_threadpool(self.client.get_object, Bucket=self.bucket, Key=key)
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)
+        body = obj["Body"]
+        try:
+            while chunk := await run_in_threadpool(body.read, chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    async def iter_keys(self, start_after: str | None = None) -> AsyncIterator[StoredObject]:
+        kwargs = {"Bucket": self.bucket}
+        if start_after:
+            kwargs["StartAfter"] = start_after
+        while True:
+            page = await run_in_threadpool(self.client.list_objects_v2, **kwargs)
+            for item in page.get("Contents", []):
+                yield StoredObject(
+                    item["Key"], item["Size"], item["LastModified"].replace(tzinfo=None)
+                )
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    def presign_put(self, key: str, content_type: str) -> Dict[str, object]:
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=settings.S3_PRESIGN_EXPIRES,
+        )
+        return {
+            "method": "PUT",
+            "upload_url": url,
+            "headers": {"Content-Type": content_type},
+            "expires_in": settings.S3_PRESIGN_EXPIRES,
+        }
+
+    def presign_get(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=settings.S3_PRESIGN_EXPIRES,
+        )
+
+
+_backend: StorageBackend | None = None
+
+
+def get_storage() -> StorageBackend:
+    """Backend configuré par STORAGE_BACKEND ("local" ou "s3"), créé une seule fois."""
+    global _backend
+    if _backend is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _backend = S3StorageBackend()
+        else:
+            _backend = LocalStorageBackend(settings.IMAGE_SAVE_DIR)
+    return _backend
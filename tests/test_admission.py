@@ -0,0 +1,76 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from app.services.admission import (
+    AdmissionController, AdmissionRejected, PRIORITY_FREE, PRIORITY_PREMIUM
+)
+
+
+def _controller(limit=1, max_queue=2, queue_timeout=1.0) -> AdmissionController:
+    return AdmissionController("test", limit, max_queue, queue_timeout, retry_after=5)
+
+
+def test_premium_waiters_are_admitted_first():
+    async def scenario():
+        admission = _controller(max_queue=10)
+        await admission.acquire(PRIORITY_FREE)
+        order = []
+
+        async def wait(priority, label):
+            await admission.acquire(priority)
+            order.append(label)
+            admission.release()
+
+        tasks = [
+            asyncio.create_task(wait(PRIORITY_FREE, "free-1")),
+            asyncio.create_task(wait(PRIORITY_FREE, "free-2")),
+            asyncio.create_task(wait(PRIORITY_PREMIUM, "premium")),
+        ]
+        await asyncio.sleep(0)
+        admission.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["premium", "free-1", "free-2"]
+
+
+def test_premium_evicts_latest_free_waiter_when_queue_is_full():
+    async def scenario():
+        admission = _controller(max_queue=2)
+        await admission.acquire(PRIORITY_FREE)
+        first = asyncio.create_task(admission.acquire(PRIORITY_FREE))
+        last = asyncio.create_task(admission.acquire(PRIORITY_FREE))
+        await asyncio.sleep(0)
+
+        premium = asyncio.create_task(admission.acquire(PRIORITY_PREMIUM))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await last
+        # une autre demande gratuite ne peut évincer personne
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(PRIORITY_FREE)
+
+        admission.release()
+        await premium
+        admission.release()
+        await first
+        admission.release()
+        assert admission._active == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_rejects_and_frees_the_queue():
+    async def scenario():
+        admission = _controller(queue_timeout=0.05)
+        await admission.acquire(PRIORITY_FREE)
+        with pytest.raises(AdmissionRejected) as exc:
+            await admission.acquire(PRIORITY_PREMIUM)
+        assert exc.value.retry_after == 5
+        assert admission._waiters == []
+        admission.release()
+        assert admission._active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,76 @@
+# tests/test_analytics.py
+import asyncio
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services import analytics
+from app.services.analytics import ScoreMatrix, compute_trend
+from app.services.skin_analyzer import ALL_CLASSES
+
+
+def _matrix(timestamps):
+    scores = np.arange(len(timestamps) * len(ALL_CLASSES), dtype=np.float64).reshape(len(timestamps), len(ALL_CLASSES))
+    return ScoreMatrix(np.array(timestamps, dtype="datetime64[us]"), scores, loaded_at=0.0)
+
+
+def test_weeks_match_iso_calendar_across_year_boundaries():
+    # fin/début d'années dont la semaine 1 ou 53 déborde sur l'année voisine
+    start = datetime(2020, 12, 20, 23, 30)
+    timestamps = [start + timedelta(hours=13 * i) for i in range(1500)]
+    m = _matrix(timestamps)
+
+    expected = defaultdict(list)
+    for i, ts in enumerate(timestamps):
+        year, week, _ = ts.isocalendar()
+        expected[f"{year}-{week:02d}"].append(i)
+
+    trend = compute_trend(m, "week")
+    assert [t["week"] for t in trend] == list(expected)
+    for t, rows in zip(trend, expected.values()):
+        assert t["count"] == len(rows)
+        assert t["averages"][ALL_CLASSES[0]] == pytest.approx(m.scores[rows, 0].mean())
+
+
+def test_months_group_by_calendar_month():
+    timestamps = [datetime(2024, 12, 31, 23, 59), datetime(2025, 1, 1), datetime(2025, 1, 31), datetime(2025, 3, 2)]
+    trend = compute_trend(_matrix(timestamps), "month")
+    assert [(t["month"], t["count"]) for t in trend] == [("Dec 2024", 1), ("Jan 2025", 2), ("Mar 2025", 1)]
+    assert all(t["week"] is None for t in trend)
+
+
+def test_empty_history_has_no_trend():
+    assert compute_trend(_matrix([]), "week") == []
+
+
+class _RowsDB:
+    """Session SQL factice : renvoie les lignes (timestamp, scores) données."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        rows = list(self.rows)
+        return SimpleNamespace(all=lambda: rows)
+
+
+def test_cached_matrix_from_older_version_is_reloaded(monkeypatch):
+    monkeypatch.setattr(analytics, "_cache", OrderedDict())
+    monkeypatch.setattr(analytics, "_loading", {})
+    db = _RowsDB([(datetime(2025, 1, 6), {ALL_CLASSES[0]: 0.5})])
+
+    assert asyncio.run(analytics.load_matrix(db, 1, data_version=1)).size == 1
+    assert asyncio.run(analytics.load_matrix(db, 1, data_version=1)).size == 1
+    assert db.queries == 1
+
+    # analyse enregistrée par un autre worker : version 2, matrice en cache périmée
+    db.rows.append((datetime(2025, 1, 7), {ALL_CLASSES[0]: 0.7}))
+    m = asyncio.run(analytics.load_matrix(db, 1, data_version=2))
+    assert m.size == 2 and m.data_version == 2
+    assert db.queries == 2
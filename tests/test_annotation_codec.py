@@ -0,0 +1,54 @@
+# tests/test_annotation_codec.py
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.annotation_codec import pack_annotations, session_annotations, unpack_annotations
+from app.services.skin_analyzer import ALL_CLASSES
+
+ANNOTATIONS = [
+    {"x": 0.5, "y": 0.25, "width": 0.125, "height": 0.2, "label": "Acne"},
+    {"x": 0.123456, "y": 0.987654, "width": 0.01, "height": 0.333333, "label": "Wrinkles"},
+]
+
+MIGRATION = os.path.join(
+    os.path.dirname(__file__), "..", "alembic", "versions", "b7e4c2a91d03_pack_session_annotations.py"
+)
+
+
+def _migration():
+    spec = importlib.util.spec_from_file_location("pack_session_annotations", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_round_trip():
+    packed = pack_annotations(ANNOTATIONS)
+    assert len(packed) == 1 + 17 * len(ANNOTATIONS)
+    assert unpack_annotations(packed) == ANNOTATIONS
+
+
+def test_unknown_label_stays_jsonb():
+    assert pack_annotations([dict(ANNOTATIONS[0], label="Rosacea")]) is None
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        unpack_annotations(b"\x02")
+
+
+def test_session_annotations_reads_either_column():
+    packed = SimpleNamespace(annotations_packed=pack_annotations(ANNOTATIONS), annotations=None)
+    legacy = SimpleNamespace(annotations_packed=None, annotations=ANNOTATIONS)
+    assert session_annotations(packed) == session_annotations(legacy) == ANNOTATIONS
+
+
+def test_migration_copy_matches_codec():
+    migration = _migration()
+    # la table figée de la migration reste un préfixe de ALL_CLASSES
+    assert ALL_CLASSES[:len(migration._LABELS)] == migration._LABELS
+    assert migration._pack(ANNOTATIONS) == pack_annotations(ANNOTATIONS)
+    assert migration._unpack(pack_annotations(ANNOTATIONS)) == ANNOTATIONS
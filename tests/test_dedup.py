@@ -0,0 +1,35 @@
+# tests/test_dedup.py
+import random
+from datetime import datetime
+
+from app.services.dedup import BKTree, hamming, to_signed, to_unsigned
+
+
+def test_bk_tree_matches_brute_force():
+    rng = random.Random(42)
+    base = [rng.getrandbits(64) for _ in range(40)]
+    # hashs proches (quelques bits inversés) et doublons exacts
+    hashes = base + [h ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for h in base] + base[:5]
+    now = datetime(2026, 1, 1)
+    tree = BKTree()
+    for session_id, h in enumerate(hashes):
+        tree.add(h, session_id, now)
+
+    for query in base[:10] + [rng.getrandbits(64) for _ in range(10)]:
+        for max_distance in (0, 2, 6, 20):
+            expected = sorted(
+                (hamming(query, h), sid, now)
+                for sid, h in enumerate(hashes) if hamming(query, h) <= max_distance
+            )
+            assert sorted(tree.search(query, max_distance)) == expected
+
+
+def test_empty_tree():
+    assert BKTree().search(0, 64) == []
+
+
+def test_signed_round_trip():
+    for h in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        signed = to_signed(h)
+        assert -(1 << 63) <= signed < (1 << 63)
+        assert to_unsigned(signed) == h
@@ -0,0 +1,121 @@
+# tests/test_entitlements.py
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import entitlements, iap_verifier
+
+
+class _StubStore:
+    """Table entitlements en mémoire, à la place de app.crud.entitlement."""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def get(self, db, user_id):
+        return self.rows.get(user_id)
+
+    async def upsert(self, db, user_id, platform, receipt_hash, expires_at, verified_at):
+        self.rows[user_id] = SimpleNamespace(
+            platform=platform, receipt_hash=receipt_hash,
+            expires_at=expires_at, verified_at=verified_at,
+        )
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = _StubStore()
+    monkeypatch.setattr(entitlements, "get_entitlement", store.get)
+    monkeypatch.setattr(entitlements, "upsert_entitlement", store.upsert)
+    calls = []
+
+    def counting(verify):
+        def wrapper(receipt):
+            calls.append(receipt)
+            return verify(receipt)
+        return wrapper
+
+    monkeypatch.setitem(entitlements.VERIFIERS, "apple", counting(iap_verifier.verify_apple_receipt))
+    monkeypatch.setitem(entitlements.VERIFIERS, "google", counting(iap_verifier.verify_google_receipt))
+    store.calls = calls
+    return store
+
+
+def _validate(user_id, platform, receipt):
+    return asyncio.run(entitlements.validate_receipt(None, user_id, platform, receipt))
+
+
+def test_same_receipt_served_from_cache(store):
+    expires_at, cached = _validate(1, "ios", "receipt-a")
+    assert not cached and expires_at > datetime.utcnow()
+    assert _validate(1, "apple", "receipt-a") == (expires_at, True)
+    assert store.calls == ["receipt-a"]
+
+
+def test_new_receipt_or_platform_is_verified(store):
+    _validate(1, "apple", "receipt-a")
+    _validate(1, "apple", "receipt-b")
+    _validate(1, "android", "receipt-b")
+    assert store.calls == ["receipt-a", "receipt-b", "receipt-b"]
+    assert store.rows[1].platform == "google"
+
+
+def test_stale_verification_is_repeated(store):
+    _validate(1, "apple", "receipt-a")
+    store.rows[1].verified_at -= timedelta(seconds=settings.ENTITLEMENT_CACHE_SECONDS + 1)
+    _, cached = _validate(1, "apple", "receipt-a")
+    assert not cached and len(store.calls) == 2
+
+
+def test_unknown_platform_rejected(store):
+    with pytest.raises(ValueError):
+        _validate(1, "windows", "receipt-a")
+    assert store.calls == []
+
+
+class _RecordingDB:
+    def __init__(self):
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return SimpleNamespace(all=lambda: [(1,)])
+
+    async def commit(self):
+        pass
+
+
+def test_sweep_rechecks_expiry_in_the_update(monkeypatch):
+    from sqlalchemy.dialects import postgresql
+
+    from app.crud import user as crud_user
+
+    db = _RecordingDB()
+    pages = [[1, 2], []]
+
+    async def list_expired(db, cutoff, after_id, limit):
+        return pages.pop(0)
+
+    async def record_premium_change(db, is_premium, at, changed):
+        pass
+
+    monkeypatch.setattr(entitlements, "AsyncSessionLocal", lambda: db)
+    monkeypatch.setattr(entitlements, "list_expired_premium_user_ids", list_expired)
+    monkeypatch.setattr(crud_user, "record_premium_change", record_premium_change)
+
+    assert asyncio.run(entitlements.sweep_expired()) == 1
+    [update] = db.statements
+    compiled = update.compile(dialect=postgresql.dialect())
+    # un reçu renouvelé entre la liste et l'UPDATE ne doit pas être rétrogradé
+    assert "EXISTS (SELECT" in str(compiled) and "entitlements.expires_at <" in str(compiled)
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.ENTITLEMENT_GRACE_SECONDS)
+    assert abs(compiled.params["expires_at_1"] - cutoff) < timedelta(seconds=5)
@@ -0,0 +1,89 @@
+# tests/test_export.py
+import asyncio
+import io
+import json
+import zipfile
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import export, storage_backend
+from app.services.storage import key_to_url
+from app.services.storage_backend import LocalStorageBackend
+
+
+class _FakeDB:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _session(session_id, image_key, annotated_key):
+    return SimpleNamespace(
+        id=session_id, timestamp=datetime(2025, 3, session_id, 9, 30),
+        scores={"Acne": 0.5}, annotations=[{"x": 0.5, "y": 0.5, "width": 0.1, "height": 0.1, "label": "Acne"}],
+        annotations_packed=None,
+        image_url=key_to_url(image_key), annotated_image_url=key_to_url(annotated_key),
+    )
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    backend = LocalStorageBackend(str(tmp_path))
+    monkeypatch.setattr(storage_backend, "_backend", backend)
+    monkeypatch.setattr(export, "AsyncSessionLocal", _FakeDB)
+    # petites pages et petits morceaux : plusieurs lots et plusieurs morceaux par image
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 1024)
+
+    images = {"ab/shared.jpg": b"s" * 5000, "cd/a1.jpg": b"1" * 300, "ef/a3.jpg": b"3" * 2500}
+    for key, data in images.items():
+        asyncio.run(backend.put(key, data))
+    sessions = [
+        _session(1, "ab/shared.jpg", "cd/a1.jpg"),
+        _session(2, "ab/shared.jpg", "gh/missing.jpg"),   # annotée supprimée pendant l'export
+        _session(3, "ab/shared.jpg", "ef/a3.jpg"),
+    ]
+
+    async def get_sessions_page(db, user_id, after_id, limit):
+        return [s for s in sessions if s.id > after_id][:limit]
+
+    monkeypatch.setattr(export, "get_sessions_page", get_sessions_page)
+
+    async def collect():
+        return [chunk async for chunk in export.export_archive(1)]
+
+    chunks = asyncio.run(collect())
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks))), images, chunks
+
+
+def test_archive_is_valid_and_streamed(exported):
+    archive, _, chunks = exported
+    assert archive.testzip() is None
+    assert len(chunks) > 3
+
+
+def test_shared_image_written_once(exported):
+    archive, images, _ = exported
+    names = archive.namelist()
+    assert names.count("images/ab/shared.jpg") == 1
+    assert sorted(names) == sorted(["sessions.ndjson"] + [f"images/{k}" for k in images])
+    for key, data in images.items():
+        assert archive.read(f"images/{key}") == data
+
+
+def test_ndjson_only_references_archived_images(exported):
+    archive, _, _ = exported
+    records = [json.loads(line) for line in archive.read("sessions.ndjson").splitlines()]
+    assert [r["session_id"] for r in records] == [1, 2, 3]
+    assert records[0]["annotations"][0]["label"] == "Acne"
+    assert records[1]["image"] == "images/ab/shared.jpg"
+    assert records[1]["annotated_image"] is None
+    names = set(archive.namelist())
+    for r in records:
+        for path in (r["image"], r["annotated_image"]):
+            assert path is None or path in names
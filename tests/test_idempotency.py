@@ -0,0 +1,193 @@
+# tests/test_idempotency.py
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.responses import FastJSONResponse
+from app.services import idempotency
+
+
+class _FakeDB:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _StubStore:
+    """Table idempotency_keys en mémoire, à la place de app.crud.idempotency."""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def try_reserve(self, db, user_id, key, route, ttl_seconds):
+        if (user_id, key) in self.rows:
+            return None
+        now = datetime.utcnow()
+        self.rows[(user_id, key)] = SimpleNamespace(
+            route=route, status="pending", created_at=now,
+            expires_at=now + timedelta(seconds=ttl_seconds),
+            status_code=None, media_type=None, response_body=None,
+        )
+        return now
+
+    def _owned(self, user_id, key, created_at, status):
+        row = self.rows.get((user_id, key))
+        return row is not None and row.created_at == created_at and row.status == status
+
+    async def get(self, db, user_id, key):
+        row = self.rows.get((user_id, key))
+        await asyncio.sleep(0)   # aller-retour base : laisse s'intercaler les autres requêtes
+        return row and SimpleNamespace(**vars(row))
+
+    async def complete(self, db, user_id, key, created_at, status_code, media_type, body):
+        if not self._owned(user_id, key, created_at, "pending"):
+            return False
+        row = self.rows[(user_id, key)]
+        row.status, row.status_code, row.media_type, row.response_body = "complete", status_code, media_type, body
+        return True
+
+    async def release(self, db, user_id, key, created_at, status="pending"):
+        await asyncio.sleep(0)
+        if not self._owned(user_id, key, created_at, status):
+            return False
+        del self.rows[(user_id, key)]
+        return True
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = _StubStore()
+    monkeypatch.setattr(idempotency, "AsyncSessionLocal", _FakeDB)
+    monkeypatch.setattr(idempotency, "try_reserve_key", store.try_reserve)
+    monkeypatch.setattr(idempotency, "get_key", store.get)
+    monkeypatch.setattr(idempotency, "complete_key", store.complete)
+    monkeypatch.setattr(idempotency, "release_key", store.release)
+    monkeypatch.setattr(idempotency, "_inflight", {})
+    monkeypatch.setattr(settings, "IDEMPOTENCY_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 0.1)
+    return store
+
+
+def _handler(delay: float = 0.0, fail: bool = False):
+    calls = []
+
+    async def run():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("inférence indisponible")
+        return FastJSONResponse({"n": len(calls)})
+
+    run.calls = calls
+    return run
+
+
+def test_retry_replays_stored_response(store):
+    run = _handler()
+
+    async def scenario():
+        first = await idempotency.idempotent(1, "k", "analyze", run)
+        second = await idempotency.idempotent(1, "k", "analyze", run)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert len(run.calls) == 1
+    assert second.body == first.body
+    assert second.headers[idempotency.REPLAYED_HEADER] == "true"
+    assert idempotency.REPLAYED_HEADER not in first.headers
+
+
+def test_concurrent_duplicates_wait_for_first_request(store):
+    run = _handler(delay=0.05)
+
+    async def scenario():
+        return await asyncio.gather(*(idempotency.idempotent(1, "k", "analyze", run) for _ in range(3)))
+
+    responses = asyncio.run(scenario())
+    assert len(run.calls) == 1
+    assert {r.body for r in responses} == {responses[0].body}
+
+
+def test_failure_releases_key(store):
+    with pytest.raises(RuntimeError):
+        asyncio.run(idempotency.idempotent(1, "k", "analyze", _handler(fail=True)))
+    assert store.rows == {}
+
+    run = _handler()
+    asyncio.run(idempotency.idempotent(1, "k", "analyze", run))
+    assert len(run.calls) == 1
+
+
+def test_key_reused_on_another_route_is_rejected(store):
+    asyncio.run(idempotency.idempotent(1, "k", "analyze", _handler()))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(idempotency.idempotent(1, "k", "subscription", _handler()))
+    assert exc.value.status_code == 422
+
+
+def test_keys_are_scoped_per_user(store):
+    run = _handler()
+    asyncio.run(idempotency.idempotent(1, "k", "analyze", run))
+    asyncio.run(idempotency.idempotent(2, "k", "analyze", run))
+    assert len(run.calls) == 2
+
+
+def test_pending_key_from_other_worker(store):
+    asyncio.run(store.try_reserve(None, 1, "k", "analyze", 3600))
+    run = _handler()
+
+    # requête encore en cours ailleurs : 409 après IDEMPOTENCY_WAIT_SECONDS
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(idempotency.idempotent(1, "k", "analyze", run))
+    assert exc.value.status_code == 409
+
+    # worker arrêté pendant la requête : la clé est reprise
+    store.rows[(1, "k")].created_at -= timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT + 1)
+    asyncio.run(idempotency.idempotent(1, "k", "analyze", run))
+    assert len(run.calls) == 1 and store.rows[(1, "k")].status == "complete"
+
+
+def _stale_reservation(store):
+    reserved_at = asyncio.run(store.try_reserve(None, 1, "k", "analyze", 3600))
+    store.rows[(1, "k")].created_at = reserved_at - timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT + 1)
+    return store.rows[(1, "k")].created_at
+
+
+class _OtherWorkers(dict):
+    """_inflight jamais partagé : chaque requête se comporte comme dans un worker distinct."""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def test_concurrent_takeovers_run_once(store, monkeypatch):
+    _stale_reservation(store)
+    monkeypatch.setattr(idempotency, "_inflight", _OtherWorkers())
+    run = _handler(delay=0.05)
+
+    async def scenario():
+        # deux workers voient la même réservation abandonnée
+        return await asyncio.gather(*(idempotency.idempotent(1, "k", "analyze", run) for _ in range(2)))
+
+    first, second = asyncio.run(scenario())
+    assert len(run.calls) == 1
+    assert first.body == second.body
+
+
+def test_abandoned_request_cannot_overwrite_new_owner(store):
+    stale_at = _stale_reservation(store)
+    asyncio.run(idempotency.idempotent(1, "k", "analyze", _handler()))
+    stored = store.rows[(1, "k")].response_body
+
+    # la requête d'origine (autre worker), lente mais vivante, finit après la reprise
+    asyncio.run(idempotency._execute(1, "k", stale_at, _handler()))
+    assert store.rows[(1, "k")].response_body == stored
+    with pytest.raises(RuntimeError):
+        asyncio.run(idempotency._execute(1, "k", stale_at, _handler(fail=True)))
+    assert store.rows[(1, "k")].status == "complete"
@@ -0,0 +1,120 @@
+# tests/test_image_access.py
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.routers import dependencies, variants
+from app.routers.auth import get_current_user, get_db
+from app.services import storage_backend
+from app.services.image_delivery import strong_etag
+from app.services.storage import key_to_url
+from app.services.storage_backend import LocalStorageBackend
+
+OWN_KEY = "ab/own.jpg"
+OTHER_KEY = "cd/other.jpg"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    backend = LocalStorageBackend(str(tmp_path))
+    monkeypatch.setattr(storage_backend, "_backend", backend)
+    for key in (OWN_KEY, OTHER_KEY):
+        asyncio.run(backend.put(key, b"jpeg " + key.encode()))
+
+    # images de l'utilisateur 1 ; OTHER_KEY appartient à un autre utilisateur
+    owned = {(1, key_to_url(OWN_KEY))}
+
+    async def user_has_image(db, user_id, url):
+        return (user_id, url) in owned
+
+    async def no_db():
+        yield None
+
+    user = SimpleNamespace(id="1", is_admin=False)
+    monkeypatch.setattr(dependencies, "user_has_image", user_has_image)
+    monkeypatch.setitem(app.dependency_overrides, get_current_user, lambda: user)
+    monkeypatch.setitem(app.dependency_overrides, get_db, no_db)
+    monkeypatch.setattr(settings, "IMAGE_OFFLOAD", "off")
+    client = TestClient(app)
+    client.user, client.root = user, str(tmp_path)
+    return client
+
+
+def test_own_image_is_served(client):
+    response = client.get(f"{settings.IMAGE_URL_PREFIX}/{OWN_KEY}")
+    assert response.status_code == 200
+    assert response.content == b"jpeg " + OWN_KEY.encode()
+    assert response.headers["etag"] == strong_etag(OWN_KEY)
+    assert "immutable" in response.headers["cache-control"]
+
+
+def _variant_path(key: str) -> str:
+    preset, fmt = next(iter(variants.VARIANT_PRESETS)), next(iter(variants.VARIANT_FORMATS))
+    return f"{settings.IMAGE_VARIANT_URL_PREFIX}/{preset}/{fmt}/{key}"
+
+
+def test_other_users_image_is_not_found(client, monkeypatch):
+    async def get_variant(key, preset, fmt):
+        raise AssertionError("variante générée pour l'image d'un autre utilisateur")
+
+    monkeypatch.setattr(variants, "get_variant", get_variant)
+    assert client.get(f"{settings.IMAGE_URL_PREFIX}/{OTHER_KEY}").status_code == 404
+    assert client.get(_variant_path(OTHER_KEY)).status_code == 404
+
+
+def test_admin_reads_any_image(client):
+    client.user.is_admin = True
+    assert client.get(f"{settings.IMAGE_URL_PREFIX}/{OTHER_KEY}").status_code == 200
+
+
+@pytest.mark.parametrize("key", ["../secret.jpg", "ab/../../secret.jpg", "/etc/passwd"])
+def test_traversal_is_rejected_even_for_admins(key):
+    admin = SimpleNamespace(id="1", is_admin=True)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(dependencies.owned_image_key(key, None, admin))
+    assert exc.value.status_code == 404
+
+
+def test_not_modified_only_after_ownership_check(client):
+    own, other = strong_etag(OWN_KEY), strong_etag(OTHER_KEY)
+    response = client.get(f"{settings.IMAGE_URL_PREFIX}/{OWN_KEY}", headers={"If-None-Match": own})
+    assert response.status_code == 304 and response.headers["etag"] == own
+    # un ETag deviné ne révèle pas l'image d'un autre utilisateur
+    response = client.get(f"{settings.IMAGE_URL_PREFIX}/{OTHER_KEY}", headers={"If-None-Match": other})
+    assert response.status_code == 404
+
+
+def test_variant_not_modified_skips_generation(client, monkeypatch):
+    async def get_variant(key, preset, fmt):
+        raise AssertionError("variante régénérée malgré If-None-Match")
+
+    monkeypatch.setattr(variants, "get_variant", get_variant)
+    preset, fmt = next(iter(variants.VARIANT_PRESETS)), next(iter(variants.VARIANT_FORMATS))
+    response = client.get(_variant_path(OWN_KEY), headers={"If-None-Match": strong_etag(OWN_KEY, preset, fmt)})
+    assert response.status_code == 304
+
+
+def test_x_accel_redirect(client, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_OFFLOAD", "x-accel")
+    response = client.get(f"{settings.IMAGE_URL_PREFIX}/{OWN_KEY}")
+    assert response.status_code == 200 and response.content == b""
+    assert response.headers["x-accel-redirect"] == f"{settings.IMAGE_ACCEL_PREFIX}{settings.IMAGE_URL_PREFIX}/{OWN_KEY}"
+    assert response.headers["etag"] == strong_etag(OWN_KEY)
+
+
+def test_x_sendfile(client, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_OFFLOAD", "x-sendfile")
+    response = client.get(f"{settings.IMAGE_URL_PREFIX}/{OWN_KEY}")
+    assert response.status_code == 200 and response.content == b""
+    assert response.headers["x-sendfile"] == os.path.abspath(os.path.join(client.root, *OWN_KEY.split("/")))
+
+
+def test_missing_owned_image_is_not_found(client):
+    os.remove(os.path.join(client.root, *OWN_KEY.split("/")))
+    assert client.get(f"{settings.IMAGE_URL_PREFIX}/{OWN_KEY}").status_code == 404
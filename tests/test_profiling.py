@@ -0,0 +1,54 @@
+# tests/test_profiling.py
+import asyncio
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.profiling import ProfilingConfig
+from app.services import profiling
+
+
+class _Response:
+    status_code = 200
+
+
+def _request(path: str):
+    return SimpleNamespace(method="POST", url=SimpleNamespace(path=path))
+
+
+@pytest.fixture
+def memory_profiling():
+    profiling.update_config(ProfilingConfig(enabled=True, memory=True))
+    profiling._profiles.clear()
+    yield
+    profiling.update_config(ProfilingConfig())
+
+
+def test_peak_recorded_for_a_request_alone(memory_profiling):
+    async def call_next(request):
+        bytearray(1 << 20)
+        return _Response()
+
+    asyncio.run(profiling.profile_request(_request("/skin/analyze"), call_next))
+
+    [profile] = profiling._profiles
+    assert profile["summary"].peak_memory_bytes >= 1 << 20
+
+
+def test_no_peak_when_requests_overlap(memory_profiling):
+    async def call_next(request):
+        await asyncio.sleep(0.01)
+        return _Response()
+
+    async def both():
+        await asyncio.gather(
+            profiling.profile_request(_request("/skin/analyze"), call_next),
+            profiling.profile_request(_request("/skin/analyze"), call_next),
+        )
+
+    asyncio.run(both())
+
+    # le premier a vu démarrer le second, le second n'a jamais été seul
+    assert [p["summary"].peak_memory_bytes for p in profiling._profiles] == [None]
+    assert profiling._in_flight == 0
@@ -0,0 +1,83 @@
+# tests/test_resilience.py
+import asyncio
+import time
+
+import pytest
+
+from app.services.resilience import CircuitBreaker, ResilientCaller, RetryBudget
+
+
+def _caller(**kwargs) -> ResilientCaller:
+    params = dict(
+        breaker=CircuitBreaker("test", failure_threshold=100, reset_timeout=30),
+        budget=RetryBudget(1.0, min_per_window=100),
+        attempt_timeout=0.2,
+        max_attempts=10,
+        is_retryable=lambda e: True,
+        backoff_base=0.001,
+        backoff_max=0.001,
+    )
+    params.update(kwargs)
+    return ResilientCaller("test", **params)
+
+
+def test_total_timeout_bounds_retries():
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(1)
+
+    caller = _caller(total_timeout=0.5)
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(caller.call(slow))
+    # 10 tentatives de 0,2 s auraient pris 2 s
+    assert time.monotonic() - start < 0.8
+    assert calls <= 3
+
+
+def test_retries_until_success_within_budget():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("amont indisponible")
+        return "ok"
+
+    assert asyncio.run(_caller(total_timeout=5).call(flaky)) == "ok"
+    assert len(attempts) == 3
+
+
+def test_cancelled_probe_does_not_wedge_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    caller = _caller(breaker=breaker, max_attempts=1)
+
+    async def failing():
+        raise ConnectionError("amont indisponible")
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await caller.call(failing)
+        assert breaker.state == CircuitBreaker.OPEN
+        await asyncio.sleep(0.06)
+
+        # la sonde semi-ouverte est annulée (requête cliente abandonnée)
+        probe = asyncio.ensure_future(caller.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        await asyncio.sleep(0.06)
+        assert not breaker.is_open()
+        return await caller.call(ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,50 @@
+# tests/test_responses.py
+import gzip
+
+import brotli
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.responses import FastJSONResponse, etag_matches
+
+app = FastAPI(default_response_class=FastJSONResponse)
+PAYLOAD = {"sessions": [{"id": i, "label": "Acne"} for i in range(2000)]}
+
+
+@app.get("/payload")
+async def payload():
+    return FastJSONResponse(PAYLOAD)
+
+
+def _get(accept_encoding: str):
+    client = TestClient(app)
+    # corps brut : pas de décompression automatique par httpx
+    with client.stream("GET", "/payload", headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_brotli_preferred_and_compressed_off_loop(monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_COMPRESSION_THREADPOOL_BYTES", 1)
+    response, body = _get("gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert FastJSONResponse(PAYLOAD).body == brotli.decompress(body)
+
+
+def test_gzip_fallback():
+    response, body = _get("gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert FastJSONResponse(PAYLOAD).body == gzip.decompress(body)
+
+
+def test_identity_when_refused():
+    response, body = _get("br;q=0, identity")
+    assert "content-encoding" not in response.headers
+    assert body == FastJSONResponse(PAYLOAD).body
+
+
+def test_etag_weak_comparison():
+    assert etag_matches('W/"1-2", "3"', '"1-2"')
+    assert etag_matches("*", '"x"')
+    assert not etag_matches('"1-3"', 'W/"1-2"')
@@ -0,0 +1,85 @@
+# tests/test_session_writer.py
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services import session_writer
+
+
+class _FakeDB:
+    commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def commit(self):
+        _FakeDB.commits += 1
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    batches = []
+
+    async def insert_sessions(db, rows):
+        batches.append([values["image_url"] for values, _ in rows])
+        if any(values["image_url"] == "bad" for values, _ in rows):
+            raise ValueError("ligne invalide")
+        return [f"session:{values['image_url']}" for values, _ in rows]
+
+    _FakeDB.commits = 0
+    monkeypatch.setattr(session_writer, "AsyncSessionLocal", _FakeDB)
+    monkeypatch.setattr(session_writer, "insert_sessions", insert_sessions)
+    monkeypatch.setattr(session_writer, "invalidate_user_caches", lambda user_id: None)
+    monkeypatch.setattr(session_writer, "_pending", [])
+    monkeypatch.setattr(session_writer, "_flush_task", None)
+    monkeypatch.setattr(settings, "SESSION_GROUP_COMMIT", True)
+    monkeypatch.setattr(settings, "SESSION_GROUP_COMMIT_WINDOW_MS", 5.0)
+    monkeypatch.setattr(settings, "SESSION_GROUP_COMMIT_MAX_BATCH", 64)
+    return batches
+
+
+def _write(image_url: str):
+    return session_writer.write_session(None, 1, image_url, "annotated", {}, [])
+
+
+def test_concurrent_writes_share_one_commit(writer):
+    async def run():
+        return await asyncio.gather(*(_write(f"img{i}") for i in range(5)))
+
+    assert asyncio.run(run()) == [f"session:img{i}" for i in range(5)]
+    assert writer == [[f"img{i}" for i in range(5)]]
+    assert _FakeDB.commits == 1
+
+
+def test_failed_batch_falls_back_to_single_writes(writer):
+    async def run():
+        return await asyncio.gather(_write("a"), _write("bad"), _write("b"), return_exceptions=True)
+
+    ok_a, failed, ok_b = asyncio.run(run())
+    assert (ok_a, ok_b) == ("session:a", "session:b")
+    assert isinstance(failed, ValueError)
+    # le lot, puis chaque session seule
+    assert writer[0] == ["a", "bad", "b"]
+    assert sorted(writer[1:]) == [["a"], ["b"], ["bad"]]
+
+
+def test_cancelled_flush_fails_pending_writes(writer, monkeypatch):
+    async def stuck(db, rows):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(session_writer, "insert_sessions", stuck)
+
+    async def run():
+        pending = asyncio.ensure_future(_write("a"))
+        await asyncio.sleep(0.02)
+        # arrêt du worker pendant l'écriture du lot
+        [flush] = [t for t in asyncio.all_tasks() if t.get_coro().__name__ == "_flush"]
+        flush.cancel()
+        return await asyncio.wait_for(pending, 1)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
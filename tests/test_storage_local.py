@@ -0,0 +1,49 @@
+# tests/test_storage_local.py
+import asyncio
+import os
+
+import pytest
+
+from app.services import storage_backend
+from app.services.storage import claim_upload, content_key, ensure_blob, write_blob
+from app.services.storage_backend import LocalStorageBackend
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    backend = LocalStorageBackend(str(tmp_path))
+    monkeypatch.setattr(storage_backend, "_backend", backend)
+    return backend
+
+
+def test_write_blob_refreshes_existing_key(local_storage):
+    key = asyncio.run(write_blob(b"image", "jpg"))
+    path = local_storage.path(key)
+    os.utime(path, (0, 0))
+
+    assert asyncio.run(write_blob(b"image", "jpg")) == key
+    # même contenu : pas de réécriture, mais le GC doit le voir comme récent
+    assert os.path.getmtime(path) > 0
+
+
+def test_ensure_blob_rewrites_missing_file(local_storage):
+    key = content_key(b"image", "jpg")
+    asyncio.run(ensure_blob(key, b"image"))
+    assert asyncio.run(local_storage.get(key)) == b"image"
+
+    os.utime(local_storage.path(key), (0, 0))
+    asyncio.run(ensure_blob(key, b"image"))
+    # fichier présent : laissé tel quel
+    assert os.path.getmtime(local_storage.path(key)) == 0
+
+
+def test_claim_upload_removes_temporary_key_when_rejected(local_storage):
+    key = "uploads/1/abc.jpg"
+    asyncio.run(local_storage.put(key, b"image"))
+
+    async def reject(content: bytes) -> None:
+        raise ValueError("refusée")
+
+    with pytest.raises(ValueError):
+        asyncio.run(claim_upload(key, check=reject))
+    assert not asyncio.run(local_storage.exists(key))
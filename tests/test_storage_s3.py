@@ -0,0 +1,74 @@
+# tests/test_storage_s3.py
+"""
+Backend S3. Les tests d'intégration tournent contre un MinIO local
+(docker-compose.minio.yml) et sont ignorés sans S3_TEST_ENDPOINT_URL.
+"""
+import asyncio
+import os
+from uuid import uuid4
+
+import pytest
+
+from app.core.config import settings
+from app.services.storage_backend import S3StorageBackend
+
+botocore_exceptions = pytest.importorskip("botocore.exceptions")
+
+
+class _HeadClient:
+    def __init__(self, code: str):
+        self.code = code
+
+    def head_object(self, Bucket, Key):
+        raise botocore_exceptions.ClientError({"Error": {"Code": self.code}}, "HeadObject")
+
+
+def _backend_with(client) -> S3StorageBackend:
+    backend = S3StorageBackend.__new__(S3StorageBackend)
+    backend.bucket = "test"
+    backend.client = client
+    return backend
+
+
+@pytest.mark.parametrize("code", ["404", "NoSuchKey", "NotFound"])
+def test_exists_false_only_for_missing_object(code):
+    assert asyncio.run(_backend_with(_HeadClient(code)).exists("a/b.jpg")) is False
+
+
+@pytest.mark.parametrize("code", ["403", "AccessDenied", "SlowDown", "500"])
+def test_exists_raises_other_client_errors(code):
+    with pytest.raises(botocore_exceptions.ClientError):
+        asyncio.run(_backend_with(_HeadClient(code)).exists("a/b.jpg"))
+
+
+@pytest.fixture
+def minio_backend(monkeypatch):
+    endpoint = os.environ.get("S3_TEST_ENDPOINT_URL")
+    if not endpoint:
+        pytest.skip("S3_TEST_ENDPOINT_URL non défini (docker-compose.minio.yml)")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", endpoint)
+    monkeypatch.setattr(settings, "S3_ACCESS_KEY_ID", os.environ.get("S3_TEST_ACCESS_KEY_ID", "minioadmin"))
+    monkeypatch.setattr(settings, "S3_SECRET_ACCESS_KEY", os.environ.get("S3_TEST_SECRET_ACCESS_KEY", "minioadmin"))
+    return S3StorageBackend()
+
+
+def test_minio_round_trip(minio_backend):
+    prefix = f"tests/{uuid4().hex}"
+    key = f"{prefix}/image.jpg"
+    data = os.urandom(200_000)
+
+    async def scenario():
+        assert not await minio_backend.exists(key)
+        await minio_backend.put(key, data, content_type="image/jpeg")
+        assert await minio_backend.exists(key)
+        assert await minio_backend.get(key) == data
+        chunks = [c async for c in minio_backend.iter_chunks(key, chunk_size=64 * 1024)]
+        assert b"".join(chunks) == data and len(chunks) > 1
+        keys = [o.key async for o in minio_backend.iter_keys(start_after=prefix)]
+        assert key in keys
+        await minio_backend.delete(key)
+        assert not await minio_backend.exists(key)
+        with pytest.raises(FileNotFoundError):
+            await minio_backend.get(key)
+
+    asyncio.run(scenario())
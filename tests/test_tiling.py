@@ -0,0 +1,84 @@
+# tests/test_tiling.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.services.skin_analyzer import merge_predictions, tile_grid
+
+
+def _box(x, y, size, confidence, label="Acne"):
+    return {"x": x, "y": y, "width": size, "height": size, "confidence": confidence, "class": label}
+
+
+def _covers(tiles, width, height) -> bool:
+    covered = [[False] * width for _ in range(height)]
+    for x0, y0, x1, y1 in tiles:
+        for y in range(y0, y1):
+            covered[y][x0:x1] = [True] * (x1 - x0)
+    return all(all(row) for row in covered)
+
+
+def test_small_image_is_one_tile():
+    assert tile_grid(800, 600, 1024, 0.2) == [(0, 0, 800, 600)]
+
+
+def test_slight_overshoot_keeps_one_tile_per_axis():
+    # 1100 × 1030 : pas quatre tuiles presque identiques
+    assert tile_grid(1100, 1030, 1024, 0.2) == [(0, 0, 1100, 1030)]
+
+
+@pytest.mark.parametrize("width,height", [(2000, 1500), (3000, 1024), (1300, 4000)])
+def test_tiles_cover_image_with_overlap(width, height):
+    size, overlap = 256, 0.2
+    tiles = tile_grid(width // 4, height // 4, size, overlap)
+    assert _covers(tiles, width // 4, height // 4)
+    xs = sorted({t[0] for t in tiles})
+    for a, b in zip(xs, xs[1:]):
+        assert a + size - b >= size * overlap
+    assert all(t[2] - t[0] <= size * (1 + overlap) for t in tiles)
+
+
+def test_nms_keeps_most_confident_box():
+    preds = [_box(100, 100, 50, 0.6), _box(102, 101, 50, 0.9), _box(400, 400, 50, 0.5)]
+    kept = merge_predictions(preds, iou_threshold=0.5, containment=0.8)
+    assert [p["confidence"] for p in kept] == [0.9, 0.5]
+
+
+def test_nms_never_merges_different_classes():
+    preds = [_box(100, 100, 50, 0.9, "Acne"), _box(100, 100, 50, 0.8, "Redness")]
+    assert len(merge_predictions(preds, iou_threshold=0.5, containment=0.8)) == 2
+
+
+def test_nms_drops_box_cut_by_tile_edge():
+    # moitié d'une lésion vue par la tuile voisine : contenue dans la boîte entière
+    preds = [_box(100, 100, 60, 0.9), {**_box(85, 100, 30, 0.7), "height": 60}]
+    assert merge_predictions(preds, iou_threshold=0.5, containment=0.8) == [preds[0]]
+
+
+def test_half_open_breaker_probes_with_one_tile(monkeypatch):
+    from app.services import skin_analyzer
+    from app.services.resilience import CircuitBreaker
+
+    breaker = skin_analyzer.inference_breaker
+    monkeypatch.setattr(breaker, "state", CircuitBreaker.OPEN)
+    monkeypatch.setattr(breaker, "opened_at", 0.0)   # délai de réarmement écoulé
+    in_flight, peak = 0, 0
+
+    async def post(url, params, filename, image):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"predictions": [_box(10, 10, 5, 0.9)]}
+
+    monkeypatch.setattr(skin_analyzer, "_post_inference", post)
+    payloads = [(0, 0, b"a"), (100, 0, b"b"), (0, 100, b"c")]
+    preds = asyncio.run(skin_analyzer._infer_tiles("u", {}, "f.jpg", payloads))
+
+    # la sonde passe seule, referme le disjoncteur, puis les autres tuiles partent
+    assert [(p["x"], p["y"]) for p in preds] == [(10, 10), (110, 10), (10, 110)]
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert peak == 2
@@ -0,0 +1,31 @@
+# tests/test_user_filters.py
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+
+from app.crud.user import list_user_ids
+
+
+class _CapturingDB:
+    def __init__(self):
+        self.statement = None
+
+    async def execute(self, statement):
+        self.statement = statement
+
+        class _Result:
+            def scalars(self):
+                return self
+
+            def all(self):
+                return []
+
+        return _Result()
+
+
+def test_email_suffix_wildcards_are_literal():
+    db = _CapturingDB()
+    asyncio.run(list_user_ids(db, email_suffix="_te%st/.com"))
+    compiled = db.statement.compile(dialect=postgresql.dialect())
+    assert "ESCAPE '/'" in str(compiled)
+    assert "%/_te/%st//.com" in compiled.params.values()